@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify
+# it under the terms of the MIT License; see LICENSE file for more details.
+
+"""Benchmark of the Piwik stats exporter, against a local fake Piwik endpoint.
+
+The local search cluster is seeded with synthetic record view and file download
+events (or with events recorded in a JSON lines fixture), in a time range of the
+past, that is not used by real events. The exporter is then run on that range,
+with the Piwik URL pointing to a fake endpoint served by this script, which can
+simulate latency and errors.
+
+The events/s, the number of requests received by the fake endpoint and the
+correctness of the bookmark (i.e. all the events up to the bookmark were received)
+are reported, matching the events by their timestamp and visitor ID, together with
+the events received more than once (e.g. on retried requests). The seeded events
+are deleted, and the bookmark is restored, afterwards.
+
+Run it on a local instance, with records in the database, e.g.::
+
+    python benchmark/piwik_export.py --events 100000 --latency 0.2 --error-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from invenio_app.factory import create_ui
+from invenio_cache import current_cache
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_search import current_search_client
+from invenio_search.utils import build_alias_name
+from opensearchpy.helpers import bulk
+from zenodo_rdm.stats.exporters import BOOKMARK_KEY, PiwikExporter
+
+START = datetime(2000, 1, 1)
+"""Start of the time range of the seeded events."""
+
+INDICES = {
+    "record-view": "events-stats-record-view-benchmark",
+    "file-download": "events-stats-file-download-benchmark",
+}
+
+
+class FakePiwik(ThreadingHTTPServer):
+    """Fake Piwik bulk tracking endpoint, recording the tracked events."""
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, error_rate=0.0):
+        """Constructor."""
+        super().__init__(("127.0.0.1", 0), FakePiwikHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.received = []
+        """Timestamp and visitor ID of the received events."""
+
+    @property
+    def url(self):
+        """URL of the endpoint."""
+        host, port = self.server_address
+        return f"http://{host}:{port}/piwik.php"
+
+    def track(self, payload):
+        """Handle a bulk tracking request, returning its status and response."""
+        time.sleep(self.latency)
+        with self.lock:
+            self.requests += 1
+            if random.random() < self.error_rate:
+                self.errors += 1
+                return 503, {"status": "error"}
+            for query_string in payload["requests"]:
+                params = parse_qs(urlsplit(query_string).query)
+                self.received.append((params["cdt"][0], params["_id"][0]))
+        tracked = len(payload["requests"])
+        return 200, {"status": "success", "tracked": tracked, "invalid": 0}
+
+
+class FakePiwikHandler(BaseHTTPRequestHandler):
+    """Request handler of the fake Piwik endpoint."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        """Track a bulk request."""
+        length = int(self.headers.get("Content-Length", 0))
+        status, response = self.server.track(json.loads(self.rfile.read(length)))
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Do not log the requests."""
+
+
+def registered_recids(limit):
+    """Recids of records with a registered PID, to reference in the events."""
+    rows = (
+        db.session.query(PersistentIdentifier.pid_value)
+        .filter(
+            PersistentIdentifier.pid_type == "recid",
+            PersistentIdentifier.status == PIDStatus.REGISTERED,
+        )
+        .limit(limit)
+    )
+    return [pid_value for (pid_value,) in rows]
+
+
+def synthetic_events(count, minutes, recids):
+    """Synthetic record view and file download events, spread over a time range."""
+    step = timedelta(minutes=minutes) / count
+    for i in range(count):
+        event_type = random.choice(list(INDICES))
+        recid = random.choice(recids)
+        event = {
+            "timestamp": (START + i * step).replace(microsecond=0).isoformat(),
+            "unique_id": str(uuid.uuid4()),
+            "visitor_id": uuid.uuid4().hex,
+            "unique_session_id": uuid.uuid4().hex,
+            "recid": recid,
+            "parent_recid": recid,
+            "country": random.choice(["CH", "FR", "DE", "GR", None]),
+            "referrer": random.choice([None, "https://www.example.org/search?q=x"]),
+            "via_api": False,
+            "is_robot": False,
+            "is_machine": False,
+        }
+        if event_type == "file-download":
+            event.update(
+                bucket_id=str(uuid.uuid4()),
+                file_id=str(uuid.uuid4()),
+                file_key="data.csv",
+                size=1024,
+            )
+        yield event_type, event
+
+
+def fixture_events(path):
+    """Events recorded in a JSON lines fixture.
+
+    Each line is an event, with its ``type`` (i.e. ``record-view`` or
+    ``file-download``), referencing records with a registered PID.
+    """
+    with open(path) as fp:
+        for line in fp:
+            if line.strip():
+                event = json.loads(line)
+                yield event.pop("type"), event
+
+
+def seed(events):
+    """Index the events, returning their timestamp and visitor ID.
+
+    The visitor ID is truncated as sent by the exporter.
+    """
+    seeded = []
+
+    def _actions():
+        for event_type, event in events:
+            seeded.append((event["timestamp"], event["visitor_id"][0:16]))
+            yield {
+                "_index": build_alias_name(INDICES[event_type]),
+                "_id": event["unique_id"],
+                "_source": event,
+            }
+
+    bulk(current_search_client, _actions(), chunk_size=5000, request_timeout=120)
+    current_search_client.indices.refresh(index=build_alias_name("events-stats-*"))
+    return seeded
+
+
+def cleanup():
+    """Delete the indices of the seeded events."""
+    for index in INDICES.values():
+        current_search_client.indices.delete(
+            index=build_alias_name(index), ignore_unavailable=True
+        )
+
+
+def report(fake, seeded, bookmark, elapsed):
+    """Print the results of a run.
+
+    Events are matched by their timestamp and visitor ID, and counted, as several
+    events may share them.
+    """
+    last = max(ts for ts, _ in seeded)
+    received = Counter(fake.received)
+    exported = Counter(event for event in seeded if bookmark and event[0] <= bookmark)
+    missing = exported - received
+    duplicated = received - Counter(seeded)
+    print(f"events seeded:     {len(seeded)}")
+    print(f"events received:   {len(fake.received)}")
+    print(f"events duplicated: {sum(duplicated.values())}")
+    print(f"elapsed:           {elapsed:.2f}s")
+    print(f"events/s:          {len(fake.received) / elapsed:.0f}")
+    print(f"requests:          {fake.requests} ({fake.errors} errors)")
+    print(f"bookmark:          {bookmark} (last event: {last})")
+    if missing:
+        print(f"bookmark correct:  NO, {sum(missing.values())} events not received")
+    elif bookmark != last:
+        print("bookmark correct:  yes, but the export did not complete")
+    else:
+        print("bookmark correct:  yes")
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--minutes", type=int, default=24 * 60)
+    parser.add_argument("--fixture", help="JSON lines file of recorded events.")
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int)
+    parser.add_argument("--chunk-size", type=int)
+    parser.add_argument("--readers", type=int)
+    args = parser.parse_args()
+
+    app = create_ui()
+    fake = FakePiwik(latency=args.latency, error_rate=args.error_rate)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+
+    config = dict(app.config["STATS_PIWIK_EXPORTER"], url=fake.url)
+    for key in ("concurrency", "chunk_size", "readers"):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+    app.config["STATS_PIWIK_EXPORTER"] = config
+
+    with app.app_context():
+        if args.fixture:
+            events = fixture_events(args.fixture)
+        else:
+            recids = registered_recids(args.records)
+            if not recids:
+                parser.exit(1, "No records with a registered PID to reference.\n")
+            events = synthetic_events(args.events, args.minutes, recids)
+        previous_bookmark = current_cache.get(BOOKMARK_KEY)
+        try:
+            seeded = seed(events)
+            timestamps = [ts for ts, _ in seeded]
+            current_cache.delete(BOOKMARK_KEY)
+            start = time.perf_counter()
+            try:
+                PiwikExporter().run(
+                    start_date=datetime.fromisoformat(min(timestamps)),
+                    end_date=datetime.fromisoformat(max(timestamps)),
+                )
+            except Exception as exc:
+                print(f"export failed: {exc!r}")
+            elapsed = time.perf_counter() - start
+            report(fake, seeded, current_cache.get(BOOKMARK_KEY), elapsed)
+        finally:
+            cleanup()
+            if previous_bookmark is None:
+                current_cache.delete(BOOKMARK_KEY)
+            else:
+                current_cache.set(BOOKMARK_KEY, previous_bookmark, timeout=-1)
+            fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Test the signature based action lookup."""
+
+import gzip
+from pathlib import Path
+
+import orjson
+import pytest
+from invenio_rdm_migrator.extract import Tx
+from invenio_rdm_migrator.load.postgresql.transactions.operations import OperationType
+from invenio_rdm_migrator.transform.errors import MultipleActionMatches, NoActionMatch
+
+from zenodo_rdm_migrator.actions.transform.files import FileDeleteAction
+from zenodo_rdm_migrator.actions.transform.signatures import ops_signature
+from zenodo_rdm_migrator.actions.transform.users import UserDeactivationAction
+from zenodo_rdm_migrator.transform.transactions import ZenodoTxTransform
+
+TESTDATA = [
+    *sorted((Path(__file__).parent).glob("*/testdata/**/*.jsonl")),
+    Path(__file__).parent.parent / "extract" / "testdata" / "ops.jsonl.gz",
+]
+
+
+def _recorded_txs():
+    """Transactions of the recorded test data, grouped by transaction ID."""
+    txs = {}
+    for datafile in TESTDATA:
+        opener = gzip.open if datafile.suffix == ".gz" else open
+        with opener(datafile, "rb") as reader:
+            for line in reader:
+                data = orjson.loads(line) if line.strip() else {}
+                if not data.get("value"):  # blank lines and tombstones
+                    continue
+                op = {"key": data["key"], **data["value"]}
+                op["op"] = OperationType(op["op"].upper())
+                op["key"].pop("__dbz__physicalTableIdentifier", None)
+                txs.setdefault((datafile, op["source"]["txId"]), []).append(op)
+    return [Tx(id=tx_id, operations=ops) for (_, tx_id), ops in txs.items()]
+
+
+def _tx(*ops, after=None):
+    """Transaction with the given ``(table, op type)`` operations."""
+    return Tx(
+        id=1,
+        operations=[
+            {
+                "op": op,
+                "source": {"table": table, "ts_ms": 1},
+                "key": {"id": 1},
+                "before": {"id": 1, **{k: None for k in after or {}}},
+                "after": {"id": 1, **(after or {})},
+            }
+            for table, op in ops
+        ],
+    )
+
+
+def _slow_detect(transform, tx):
+    """Detect the action checking every action's ``matches_action``."""
+    matches = [a for a in transform.actions if a.matches_action(tx)]
+    if len(matches) == 0:
+        raise NoActionMatch(tx)
+    elif len(matches) > 1:
+        raise MultipleActionMatches(tx, matches)
+    return matches[0]
+
+
+def _detect(detect, transform, tx):
+    """Detected action, or the type of the raised error."""
+    try:
+        return detect(transform, tx)
+    except (NoActionMatch, MultipleActionMatches) as exc:
+        return type(exc)
+
+
+def test_ops_signature():
+    ops = [
+        ("files_bucket", OperationType.UPDATE),
+        ("oauth2server_token", "u"),
+        ("files_bucket", "U"),
+    ]
+    assert ops_signature(ops) == (
+        frozenset({("files_bucket", "U"), ("oauth2server_token", "U")}),
+        False,
+    )
+    assert ops_signature(ops[:2], exclude=("oauth2server_token",)) == (
+        frozenset({("files_bucket", "U")}),
+        True,
+    )
+
+
+@pytest.mark.parametrize(
+    "ops",
+    [
+        (),
+        (("oauth2server_token", "U"),),
+        (("oauth2server_token", "U"), ("oauth2server_token", "U")),
+        (("oauth2server_client", "C"), ("oauth2server_token", "C")),
+        (("oauth2server_client", "C"), ("oauth2server_client", "C")),
+        (("oauth2server_client", "U"),),
+        (("oauth2server_client", "D"), ("oauth2server_token", "D")),
+        (("oauthclient_remoteaccount", "D"), ("oauthclient_remotetoken", "D")),
+        (("oauthclient_remoteaccount", "D"), ("oauthclient_remotetoken", "D")) * 2,
+        (
+            ("oauthclient_remoteaccount", "C"),
+            ("oauthclient_remotetoken", "C"),
+            ("oauthclient_useridentity", "C"),
+            ("oauthclient_remoteaccount", "U"),
+            ("oauthclient_remoteaccount", "U"),
+        ),
+        (("userprofiles_userprofile", "C"), ("accounts_user", "C")),
+        (("accounts_user", "U"), ("accounts_user", "U")),
+        (("accounts_user", "U"), ("accounts_user_session_activity", "D")),
+        (("accounts_user_session_activity", "D"),),
+        (("accounts_user", "U"), ("accounts_user_session_activity", "C")),
+        (("accounts_user", "U"), ("oauthclient_remotetoken", "U")),
+        (("oauthclient_remoteaccount", "U"),),
+        (("oauth2server_token", "U"), ("files_bucket", "U"), ("files_object", "D")),
+    ],
+)
+def test_fast_path_matches_slow_path(ops):
+    transform = ZenodoTxTransform()
+    for after in ({"active": True}, {"active": False}):
+        tx = _tx(*ops, after=after)
+        assert _detect(ZenodoTxTransform._detect_action, transform, tx) == _detect(
+            _slow_detect, transform, tx
+        )
+
+
+def test_fast_path_matches_slow_path_testdata():
+    transform = ZenodoTxTransform()
+    for tx in _recorded_txs():
+        assert _detect(ZenodoTxTransform._detect_action, transform, tx) == _detect(
+            _slow_detect, transform, tx
+        )
+
+
+def test_exclude_rules():
+    transform = ZenodoTxTransform()
+    ops = [("files_bucket", "U"), ("files_object", "D")]
+    assert transform._detect_action(_tx(*ops)) == FileDeleteAction
+    tx = _tx(("oauth2server_token", "U"), *ops)
+    assert transform._detect_action(tx) == FileDeleteAction
+
+
+def test_data_checks_are_kept():
+    transform = ZenodoTxTransform()
+    ops = [("accounts_user", "U"), ("accounts_user_session_activity", "D")]
+    tx = _tx(*ops, after={"active": False})
+    assert transform._detect_action(tx) == UserDeactivationAction
+    tx = _tx(*ops, after={"active": True})
+    assert transform._detect_action(tx) != UserDeactivationAction
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Test the validation-only dry-run of the migration streams."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from zenodo_rdm_migrator.dry_run import (
+    DryRunReport,
+    DryRunStream,
+    SchemaStore,
+    _error_fields,
+)
+from zenodo_rdm_migrator.errors import UnknownSchema
+from zenodo_rdm_migrator.transform.requests import ZenodoRequestTransform
+
+
+class ListExtract:
+    """Extract entries from a list."""
+
+    def __init__(self, entries):
+        """Constructor."""
+        self.entries = entries
+
+    def run(self):
+        """Yield one element at a time."""
+        yield from self.entries
+
+
+@pytest.fixture(scope="function")
+def schemas(tmp_dir):
+    """Schema store with a minimal request schema."""
+    schemas_dir = Path(tmp_dir.name)
+    (schemas_dir / "requests").mkdir()
+    (schemas_dir / "definitions-v1.0.0.json").write_text(
+        json.dumps({"title": {"type": "string", "minLength": 3}})
+    )
+    (schemas_dir / "requests" / "request-v1.0.0.json").write_text(
+        json.dumps(
+            {
+                "$schema": "http://json-schema.org/draft-07/schema#",
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["title", "type", "topic"],
+                "properties": {
+                    "$schema": {"type": "string"},
+                    "type": {"type": "string"},
+                    "status": {"type": "string"},
+                    "title": {"$ref": "local://definitions-v1.0.0.json#/title"},
+                    "topic": {"type": "object"},
+                    "receiver": {"type": "object"},
+                    "created_by": {"type": "object"},
+                },
+            }
+        )
+    )
+    return SchemaStore(schemas_dirs=[schemas_dir])
+
+
+def _request(recid, **kwargs):
+    """Extracted Zenodo request."""
+    return {
+        "created": "2023-01-01 12:00:00.00000",
+        "updated": "2023-01-31 12:00:00.00000",
+        "id_community": "comm",
+        "recid": recid,
+        "title": "Test title",
+        "owners": "3",
+        **kwargs,
+    }
+
+
+def test_schema_store(schemas):
+    validator = schemas.validator("local://requests/request-v1.0.0.json")
+    assert validator is schemas.validator("local://requests/request-v1.0.0.json")
+    assert validator.is_valid({"title": "Test", "type": "t", "topic": {}})
+    assert not validator.is_valid({"title": "T", "type": "t", "topic": {}})
+
+    errors = {
+        (field, error.validator)
+        for error in validator.iter_errors({"title": "Test", "topic": [], "x": 1})
+        for field in _error_fields(error)
+    }
+    assert errors == {
+        ("type", "required"),
+        ("topic", "type"),
+        ("x", "additionalProperties"),
+    }
+
+    with pytest.raises(UnknownSchema):
+        schemas.load("local://records/record-v6.0.0.json")
+
+
+def test_report():
+    report = DryRunReport(sample_size=2)
+    report.add("1", {("record", "metadata.title", "required")})
+    report.add("2", set())
+    report.add("3", {("record", "metadata.title", "required")})
+    report.add("4", {("record", "metadata.title", "required"), ("x", "", "y")})
+
+    assert report.to_dict() == {
+        "entries": 4,
+        "failed": 3,
+        "errors": [
+            {
+                "document": "record",
+                "field": "metadata.title",
+                "type": "required",
+                "count": 3,
+                "samples": ["1", "3"],
+            },
+            {"document": "x", "field": "", "type": "y", "count": 1, "samples": ["4"]},
+        ],
+    }
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_dry_run_stream(schemas, workers):
+    entries = [
+        _request("1"),
+        _request("2", title="T"),
+        _request("3", title="T"),
+        {"recid": "4"},  # fails on transform
+    ]
+    stream = DryRunStream(
+        "requests",
+        ListExtract(entries),
+        ZenodoRequestTransform(),
+        schemas,
+        workers=workers,
+    )
+    report = stream.run().to_dict()
+
+    assert report["entries"] == 4
+    assert report["failed"] == 3
+    errors = {(e["document"], e["field"], e["type"]): e for e in report["errors"]}
+    assert errors.keys() == {
+        ("requests", "title", "minLength"),
+        ("transform", "", "KeyError"),
+    }
+    assert errors[("requests", "title", "minLength")]["count"] == 2
+    assert sorted(errors[("requests", "title", "minLength")]["samples"]) == ["2", "3"]
+    assert errors[("transform", "", "KeyError")]["samples"] == ["4"]
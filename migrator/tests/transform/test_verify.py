@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Test the hash-based verification of migrated records."""
+
+from uuid import uuid4
+
+import psycopg
+
+from zenodo_rdm_migrator.verify import (
+    QUERIES,
+    ExpectedHashes,
+    ShardVerifier,
+    diff_hashes,
+    merge_results,
+    parent_hash,
+    pids_hash,
+    record_hash,
+    shard_ranges,
+    split_shards,
+)
+
+
+def test_diff_hashes():
+    expected = {k: f"hash-{k}" for k in range(0, 1000, 3)}
+    actual = dict(expected)
+
+    assert list(diff_hashes(expected, actual)) == []
+
+    del actual[3]
+    actual[4] = "hash-4"
+    actual[999] = "other"
+    diff = list(diff_hashes(expected, actual))
+    assert diff == [(3, "missing"), (4, "unexpected"), (999, "different")]
+
+
+def test_record_hash():
+    record = {"id": "1234", "metadata": {"title": "Test"}, "pids": {}}
+    loaded = {**record, "pid": {"pk": 1, "status": "R"}}
+    assert record_hash(record, 1) == record_hash(loaded, 1)
+    assert record_hash(record, 1) != record_hash(loaded, 2)
+    assert record_hash(record, 1) != record_hash(
+        {**loaded, "metadata": {"title": "Other"}}, 1
+    )
+
+
+def test_parent_hash():
+    parent = {"id": "1233", "communities": {"ids": ["zenodo", "other"]}}
+    loaded = {
+        "id": "1233",
+        "pid": {"pk": 2, "status": "R"},
+        "communities": {"ids": ["9d2c...", "1e5f..."]},
+    }
+    assert parent_hash(parent) == parent_hash(loaded)
+    assert parent_hash(parent) != parent_hash({**loaded, "communities": {}})
+
+
+def test_pids_hash():
+    assert pids_hash([("recid", "1"), ("doi", "10.5281/zenodo.1")]) == pids_hash(
+        [("doi", "10.5281/zenodo.1"), ("recid", "1"), ("recid", "1")]
+    )
+
+
+def test_shard_ranges():
+    assert shard_ranges(0, 10, 3) == [(0, 4), (4, 8), (8, 10)]
+    assert shard_ranges(5, 7, 4) == [(5, 6), (6, 7)]
+    assert shard_ranges(5, 5, 4) == []
+
+
+def test_split_shards():
+    uuids = {recid: uuid4() for recid in (1, 6, 11)}
+    expected = {
+        "records": {1: "r1", 6: "r6", 12: "r12"},
+        "parents": {0: "p0"},
+        "pids": {},
+    }
+    shards = split_shards(expected, uuids, 3)
+
+    # each shard only holds its own slice, of [0, 5), [5, 10) and [10, 13)
+    assert [shard["recids"] for shard in shards] == [
+        {1: uuids[1]},
+        {6: uuids[6]},
+        {11: uuids[11]},
+    ]
+    assert [shard["expected"]["records"] for shard in shards] == [
+        {1: "r1"},
+        {6: "r6"},
+        {12: "r12"},
+    ]
+    assert shards[0]["expected"]["parents"] == {0: "p0"}
+    assert split_shards({"records": {}, "parents": {}, "pids": {}}, {}, 3) == []
+
+
+class _Transform:
+    """Transform returning the entries as they are."""
+
+    def _transform(self, entry):
+        if entry.get("fail"):
+            raise ValueError("Failed transformation.")
+        return entry
+
+
+def _entry(recid, parent_recid, title, doi=None):
+    pids = {"doi": {"identifier": doi}} if doi else {}
+    return {
+        "record": {
+            "json": {"id": recid, "pids": pids, "metadata": {"title": title}},
+            "index": 1,
+        },
+        "parent": {"json": {"id": parent_recid, "title": title}},
+    }
+
+
+def test_expected_hashes():
+    expected = ExpectedHashes()
+    expected.add(
+        [
+            _entry("2", "1", "First", doi="10.5281/zenodo.2"),
+            {"fail": True},
+            _entry("3", "1", "Second"),
+            _entry("abc", "def", "Not numeric"),
+        ],
+        _Transform(),
+    )
+
+    assert expected.failed == 1
+    assert set(expected.hashes["records"]) == {2, 3}
+    first = _entry("2", "1", "First", doi="10.5281/zenodo.2")
+    assert expected.hashes["records"][2] == record_hash(first["record"]["json"], 1)
+    # parents are hashed from the first version
+    assert expected.hashes["parents"] == {1: parent_hash({"id": "1", "title": "First"})}
+    assert expected.hashes["pids"] == {
+        1: pids_hash([("recid", "1")]),
+        2: pids_hash([("recid", "2"), ("doi", "10.5281/zenodo.2")]),
+        3: pids_hash([("recid", "3")]),
+    }
+
+
+class _Connection:
+    """Connection returning fixed rows per query, recording the parameters."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.params = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params):
+        table = next(table for table, q in QUERIES.items() if q == query)
+        self.params[table] = params
+        return iter(self.rows[table])
+
+
+def test_shard_verifier(monkeypatch):
+    record, parent, draft = uuid4(), uuid4(), uuid4()
+    conn = _Connection(
+        {
+            "records": [(record, {"id": "2", "title": "Other"}, 1)],
+            "parents": [(parent, {"id": "1", "communities": {}})],
+            "pids": [
+                (record, "recid", "2"),
+                (record, "doi", "10.5281/zenodo.2"),
+                (parent, "recid", "1"),
+            ],
+        }
+    )
+    monkeypatch.setattr(psycopg, "connect", lambda db_uri: conn)
+
+    shard = {
+        "recids": {1: parent, 2: record, 3: draft},
+        "expected": {
+            "records": {2: record_hash({"id": "2", "title": "Test"}, 1), 4: "x"},
+            "parents": {1: parent_hash({"id": "1"})},
+            "pids": {
+                1: pids_hash([("recid", "1")]),
+                2: pids_hash([("recid", "2"), ("doi", "10.5281/zenodo.2")]),
+            },
+        },
+    }
+    result = ShardVerifier("postgresql://", sample_size=1).verify(shard)
+
+    assert result["records"] == {
+        "expected": 2,
+        "actual": 1,
+        "mismatches": {"different": 1, "missing": 1},
+        "samples": [{"recid": 2, "status": "different"}],
+    }
+    assert result["parents"]["mismatches"] == {}
+    assert result["pids"]["mismatches"] == {}
+    # the PIDs of the draft (i.e. without record or parent) are not read
+    assert set(conn.params["pids"]["ids"]) == {record, parent}
+
+
+def test_merge_results():
+    def _result(expected, actual, mismatches, samples):
+        table = {
+            "expected": expected,
+            "actual": actual,
+            "mismatches": mismatches,
+            "samples": samples,
+        }
+        return {"records": table, "parents": table, "pids": table}
+
+    merged = merge_results(
+        [
+            _result(2, 1, {"missing": 1}, [{"recid": 1, "status": "missing"}]),
+            _result(3, 3, {}, []),
+            _result(1, 1, {"missing": 1, "different": 1}, [{"recid": 9}, {"r": 10}]),
+        ],
+        sample_size=2,
+    )
+    assert merged["records"] == {
+        "expected": 6,
+        "actual": 5,
+        "mismatches": {"missing": 2, "different": 1},
+        "samples": [{"recid": 1, "status": "missing"}, {"recid": 9}],
+    }
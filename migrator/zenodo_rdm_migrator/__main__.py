@@ -10,6 +10,7 @@ import sys
 
 from invenio_rdm_migrator.streams import Runner
 
+from .dry_run import DryRunner
 from .stream import (
     ActionStreamDefinition,
     AffiliationsStreamDefinition,
@@ -31,10 +32,35 @@ from .stream import (
     VersionStateStreamDefinition,
     WebhookEventsStreamDefinition,
 )
+from .verify import Verifier
 
 if __name__ == "__main__":
     if len(sys.argv) == 1 or sys.argv[1].lower() in ("--help", "-h"):
         print(f"Usage: {sys.argv[0]} CONFIG_FILE")
+        print(f"       {sys.argv[0]} --dry-run CONFIG_FILE [STREAM ...]")
+        print(f"       {sys.argv[0]} --verify CONFIG_FILE")
+        exit(0)
+
+    if sys.argv[1] == "--dry-run":
+        # Only transform and validate the entries, nothing is loaded
+        dry_runner = DryRunner(
+            stream_definitions=[
+                UserStreamDefinition,
+                CommunitiesStreamDefinition,
+                RecordStreamDefinition,
+                DraftStreamDefinition,
+                RequestStreamDefinition,
+            ],
+            config_filepath=sys.argv[2],
+            streams=sys.argv[3:],
+        )
+        dry_runner.run()
+        exit(0)
+
+    if sys.argv[1] == "--verify":
+        # Compare the migrated records with the legacy dumps, nothing is loaded
+        verifier = Verifier(config_filepath=sys.argv[2])
+        verifier.run()
         exit(0)
 
     runner = Runner(
@@ -7,46 +7,45 @@
 
 """Invenio RDM migration files actions module."""
 
-
 from invenio_rdm_migrator.actions import TransformAction
 from invenio_rdm_migrator.load.postgresql.transactions.operations import OperationType
 from invenio_rdm_migrator.streams.actions import load
 
+from .signatures import SignatureMatchMixin
+
 
-class FileUploadAction(TransformAction):
+class FileUploadAction(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM file upload action."""
 
     name = "file-upload"
     load_cls = load.FileUploadAction
 
+    add_file_ops = [
+        ("files_bucket", OperationType.UPDATE),
+        ("files_object", OperationType.INSERT),
+        ("files_files", OperationType.INSERT),
+        ("files_object", OperationType.UPDATE),
+        ("files_files", OperationType.UPDATE),
+        ("files_bucket", OperationType.UPDATE),
+    ]
+    replace_file_ops = [
+        ("files_bucket", OperationType.UPDATE),
+        ("files_object", OperationType.UPDATE),  # Set old OV's is_head = False
+        ("files_object", OperationType.INSERT),
+        ("files_files", OperationType.INSERT),
+        ("files_object", OperationType.UPDATE),
+        ("files_files", OperationType.UPDATE),
+        ("files_bucket", OperationType.UPDATE),
+    ]
+    signatures = [add_file_ops, replace_file_ops]
+    # when using a REST API Auth token, it receives an update
+    signatures_exclude = ("oauth2server_token",)
+
     @classmethod
     def matches_action(cls, tx):
         """Checks if the data corresponds with that required by the action."""
-        add_file_ops = [
-            ("files_bucket", OperationType.UPDATE),
-            ("files_object", OperationType.INSERT),
-            ("files_files", OperationType.INSERT),
-            ("files_object", OperationType.UPDATE),
-            ("files_files", OperationType.UPDATE),
-            ("files_bucket", OperationType.UPDATE),
-        ]
-        replace_file_ops = [
-            ("files_bucket", OperationType.UPDATE),
-            ("files_object", OperationType.UPDATE),  # Set old OV's is_head = False
-            ("files_object", OperationType.INSERT),
-            ("files_files", OperationType.INSERT),
-            ("files_object", OperationType.UPDATE),
-            ("files_files", OperationType.UPDATE),
-            ("files_bucket", OperationType.UPDATE),
-        ]
-
-        ops = tx.as_ops_tuples(
-            exclude=(
-                # when using a REST API Auth token, it receives an update
-                "oauth2server_token",
-            ),
-        )
-        return ops in (add_file_ops, replace_file_ops)
+        ops = tx.as_ops_tuples(exclude=cls.signatures_exclude)
+        return ops in (cls.add_file_ops, cls.replace_file_ops)
 
     def _transform_data(self):
         """Transforms the data and returns an instance of the mapped_cls."""
@@ -89,33 +88,30 @@ class FileUploadAction(TransformAction):
         )
 
 
-class FileDeleteAction(TransformAction):
+class FileDeleteAction(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM file upload action."""
 
     name = "file-delete"
     load_cls = load.FileDeleteAction
 
+    hard_delete_ops = [
+        ("files_bucket", OperationType.UPDATE),
+        ("files_object", OperationType.DELETE),
+    ]
+    soft_delete_ops = [
+        ("files_bucket", OperationType.UPDATE),
+        ("files_object", OperationType.UPDATE),
+        ("files_object", OperationType.INSERT),  # delete marker
+    ]
+    signatures = [hard_delete_ops, soft_delete_ops]
+    # when using a REST API Auth token, it receives an update
+    signatures_exclude = ("oauth2server_token",)
+
     @classmethod
     def matches_action(cls, tx):
         """Checks if the data corresponds with that required by the action."""
-        hard_delete_ops = [
-            ("files_bucket", OperationType.UPDATE),
-            ("files_object", OperationType.DELETE),
-        ]
-
-        soft_delete_ops = [
-            ("files_bucket", OperationType.UPDATE),
-            ("files_object", OperationType.UPDATE),
-            ("files_object", OperationType.INSERT),  # delete marker
-        ]
-
-        ops = tx.as_ops_tuples(
-            exclude=(
-                # when using a REST API Auth token, it receives an update
-                "oauth2server_token",
-            ),
-        )
-        return ops in (hard_delete_ops, soft_delete_ops)
+        ops = tx.as_ops_tuples(exclude=cls.signatures_exclude)
+        return ops in (cls.hard_delete_ops, cls.soft_delete_ops)
 
     def _transform_data(self):
         """Transforms the data and returns an instance of the mapped_cls."""
@@ -144,41 +140,42 @@ class FileDeleteAction(TransformAction):
         )
 
 
-class MediaFileUploadAction(TransformAction):
+class MediaFileUploadAction(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM media file upload action."""
 
     name = "media-file-upload"
     load_cls = load.MediaFileUploadAction
 
+    add_file_ops = [
+        # NOTE: Extra formats (media files) are only accessible via REST API using
+        # tokens, so we take advantage of this for the fingerpinting
+        ("oauth2server_token", OperationType.UPDATE),
+        ("files_bucket", OperationType.UPDATE),
+        ("files_object", OperationType.INSERT),
+        ("files_files", OperationType.INSERT),
+        ("files_object", OperationType.UPDATE),
+        ("files_files", OperationType.UPDATE),
+        ("files_bucket", OperationType.UPDATE),
+    ]
+    replace_file_ops = [
+        # NOTE: Extra formats (media files) are only accessible via REST API using
+        # tokens, so we take advantage of this for the fingerpinting
+        ("oauth2server_token", OperationType.UPDATE),
+        ("files_bucket", OperationType.UPDATE),
+        ("files_object", OperationType.UPDATE),  # Set old OV's is_head = False
+        ("files_object", OperationType.INSERT),
+        ("files_files", OperationType.INSERT),
+        ("files_object", OperationType.UPDATE),
+        ("files_files", OperationType.UPDATE),
+        ("files_bucket", OperationType.UPDATE),
+    ]
+    signatures = [add_file_ops, replace_file_ops]
+
     @classmethod
     def matches_action(cls, tx):
         """Checks if the data corresponds with that required by the action."""
-        add_file_ops = [
-            # NOTE: Extra formats (media files) are only accessible via REST API using
-            # tokens, so we take advantage of this for the fingerpinting
-            ("oauth2server_token", OperationType.UPDATE),
-            ("files_bucket", OperationType.UPDATE),
-            ("files_object", OperationType.INSERT),
-            ("files_files", OperationType.INSERT),
-            ("files_object", OperationType.UPDATE),
-            ("files_files", OperationType.UPDATE),
-            ("files_bucket", OperationType.UPDATE),
-        ]
-        replace_file_ops = [
-            # NOTE: Extra formats (media files) are only accessible via REST API using
-            # tokens, so we take advantage of this for the fingerpinting
-            ("oauth2server_token", OperationType.UPDATE),
-            ("files_bucket", OperationType.UPDATE),
-            ("files_object", OperationType.UPDATE),  # Set old OV's is_head = False
-            ("files_object", OperationType.INSERT),
-            ("files_files", OperationType.INSERT),
-            ("files_object", OperationType.UPDATE),
-            ("files_files", OperationType.UPDATE),
-            ("files_bucket", OperationType.UPDATE),
-        ]
-
         ops = tx.as_ops_tuples()
-        return ops in (add_file_ops, replace_file_ops)
+        return ops in (cls.add_file_ops, cls.replace_file_ops)
 
     def _transform_data(self):
         """Transforms the data and returns an instance of the mapped_cls."""
@@ -7,13 +7,14 @@
 
 """ZenodoRDM migration ignored actions module."""
 
-
 from invenio_rdm_migrator.actions import TransformAction
 from invenio_rdm_migrator.load.postgresql.transactions.operations import OperationType
 from invenio_rdm_migrator.streams.actions import load
 
 from zenodo_rdm_migrator.transform.records import ZENODO_DATACITE_PREFIXES
 
+from .signatures import SignatureMatchMixin
+
 
 class IgnoredTransformAction(TransformAction):
     """Transform ignored actions."""
@@ -40,10 +41,19 @@ class FileChecksumAction(IgnoredTransformAction):
         return False
 
 
-class UserSessionAction(IgnoredTransformAction):
+class UserSessionAction(SignatureMatchMixin, IgnoredTransformAction):
     """Zenodo to RDM for user session."""
 
     name = "user-session"
+    # any session activity op types, with an optional user update
+    signatures = [
+        [
+            *(("accounts_user_session_activity", op) for op in session_ops),
+            *user_ops,
+        ]
+        for session_ops in ("C", "U", "D", "CU", "CD", "UD", "CUD")
+        for user_ops in ((), (("accounts_user", OperationType.UPDATE),))
+    ]
 
     @classmethod
     def matches_action(cls, tx):
@@ -68,10 +78,14 @@ class UserSessionAction(IgnoredTransformAction):
         )
 
 
-class GitHubSyncAction(IgnoredTransformAction):
+class GitHubSyncAction(SignatureMatchMixin, IgnoredTransformAction):
     """Zenodo to RDM for GitHub sync."""
 
     name = "gh-sync"
+    signatures = [
+        [("oauthclient_remoteaccount", OperationType.UPDATE)],
+    ]
+    exact_signatures = True
 
     @classmethod
     def matches_action(cls, tx):
@@ -96,10 +110,16 @@ class GitHubPingAction(IgnoredTransformAction):
         return False
 
 
-class OAuthReLoginAction(IgnoredTransformAction):
+class OAuthReLoginAction(SignatureMatchMixin, IgnoredTransformAction):
     """Zenodo to RDM for OAuth re-login."""
 
     name = "oauth-relogin"
+    signatures = [
+        [
+            ("accounts_user", OperationType.UPDATE),
+            ("oauthclient_remotetoken", OperationType.UPDATE),
+        ],
+    ]
 
     @classmethod
     def matches_action(cls, tx):
@@ -16,30 +16,29 @@ from invenio_rdm_migrator.streams.oauth import (
 )
 from invenio_rdm_migrator.transform import IdentityTransform, JSONTransformMixin
 
+from .signatures import SignatureMatchMixin
 
-class OAuthServerTokenCreateAction(TransformAction):
+CLIENT = "oauth2server_client"
+TOKEN = "oauth2server_token"
+REMOTE_ACCOUNT = "oauthclient_remoteaccount"
+REMOTE_TOKEN = "oauthclient_remotetoken"
+USER_IDENTITY = "oauthclient_useridentity"
+
+
+class OAuthServerTokenCreateAction(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM OAuth server create action."""
 
     name = "oauth-server-token-create"
     load_cls = load.OAuthServerTokenCreateAction
+    signatures = [
+        [(CLIENT, OperationType.INSERT), (TOKEN, OperationType.INSERT)],
+    ]
+    exact_signatures = True
 
     @classmethod
     def matches_action(cls, tx):
         """Checks if the data corresponds with that required by the action."""
-        if len(tx.operations) != 2:
-            return False
-
-        rules = {
-            "oauth2server_client": OperationType.INSERT,
-            "oauth2server_token": OperationType.INSERT,
-        }
-
-        for op in tx.operations:
-            rule = rules.pop(op["source"]["table"], None)
-            if not rule or rule != op["op"]:
-                return False
-
-        return True
+        return cls.matches_signature(tx)
 
     def _transform_data(self):
         """Transforms the data and returns dictionary."""
@@ -63,39 +62,23 @@ class OAuthServerTokenCreateAction(TransformAction):
         return result
 
 
-class OAuthServerTokenUpdateAction(TransformAction):
+class OAuthServerTokenUpdateAction(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM OAuth server update action."""
 
     name = "oauth-server-token-update"
     load_cls = load.OAuthServerTokenUpdateAction
+    # note 1: this action would handle both personal and application tokens
+    # note 2: tx with only oauth2server_client are handled by the app action
+    signatures = [
+        [(TOKEN, OperationType.UPDATE)],
+        [(CLIENT, OperationType.UPDATE), (TOKEN, OperationType.UPDATE)],
+    ]
+    exact_signatures = True
 
     @classmethod
     def matches_action(cls, tx):
         """Checks if the data corresponds with that required by the action."""
-        if len(tx.operations) == 1:
-            # note 1: this action would handle both personal and application tokens
-            # note 2: tx with only oauth2server_client are handled by the app action
-
-            op = tx.operations[0]
-            return (
-                op["source"]["table"] == "oauth2server_token"
-                and op["op"] == OperationType.UPDATE
-            )
-
-        if len(tx.operations) == 2:
-            rules = {
-                "oauth2server_client": OperationType.UPDATE,
-                "oauth2server_token": OperationType.UPDATE,
-            }
-
-            for op in tx.operations:
-                rule = rules.pop(op["source"]["table"], None)
-                if not rule or rule != op["op"]:
-                    return False
-
-            return True
-
-        return False
+        return cls.matches_signature(tx)
 
     def _transform_data(self):
         """Transforms the data and returns dictionary."""
@@ -112,24 +95,20 @@ class OAuthServerTokenUpdateAction(TransformAction):
         return result
 
 
-class OAuthServerTokenDeleteAction(TransformAction):
+class OAuthServerTokenDeleteAction(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM OAuth server delete action."""
 
     name = "oauth-server-token-delete"
     load_cls = load.OAuthServerTokenDeleteAction
+    signatures = [
+        [(TOKEN, OperationType.DELETE)],
+    ]
+    exact_signatures = True
 
     @classmethod
     def matches_action(cls, tx):
         """Checks if the data corresponds with that required by the action."""
-        if len(tx.operations) != 1:
-            return False
-
-        op = tx.operations[0]
-
-        return (
-            op["source"]["table"] == "oauth2server_token"
-            and op["op"] == OperationType.DELETE
-        )
+        return cls.matches_signature(tx)
 
     def _transform_data(self):
         """Transforms the data and returns dictionary."""
@@ -139,24 +118,20 @@ class OAuthServerTokenDeleteAction(TransformAction):
         return {"token": OAuthServerTokenTransform()._transform(op["before"])}
 
 
-class OAuthApplicationCreateAction(TransformAction):
+class OAuthApplicationCreateAction(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM OAuth server create action."""
 
     name = "oauth-application-create"
     load_cls = load.OAuthApplicationCreateAction
+    signatures = [
+        [(CLIENT, OperationType.INSERT)],
+    ]
+    exact_signatures = True
 
     @classmethod
     def matches_action(cls, tx):
         """Checks if the data corresponds with that required by the action."""
-        if len(tx.operations) != 1:
-            return False
-
-        op = tx.operations[0]
-
-        return (
-            op["source"]["table"] == "oauth2server_client"
-            and op["op"] == OperationType.INSERT
-        )
+        return cls.matches_signature(tx)
 
     def _transform_data(self):
         """Transforms the data and returns dictionary."""
@@ -165,27 +140,23 @@ class OAuthApplicationCreateAction(TransformAction):
         return {"client": OAuthServerClientTransform()._transform(op["after"])}
 
 
-class OAuthApplicationUpdateAction(TransformAction):
+class OAuthApplicationUpdateAction(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM OAuth server create action."""
 
     name = "oauth-application-update"
     load_cls = load.OAuthApplicationUpdateAction
+    # note: it will absorb OAuthServerTokenUpdateAction that update only
+    # the client (e.g. a name), but the behavior/outcome is left unchanged:
+    # an update to oauth2server_client
+    signatures = [
+        [(CLIENT, OperationType.UPDATE)],
+    ]
+    exact_signatures = True
 
     @classmethod
     def matches_action(cls, tx):
         """Checks if the data corresponds with that required by the action."""
-        # note: it will absorb OAuthServerTokenUpdateAction that update only
-        # the client (e.g. a name), but the behavior/outcome is left unchanged:
-        # an update to oauth2server_client
-        if len(tx.operations) != 1:
-            return False
-
-        op = tx.operations[0]
-
-        return (
-            op["source"]["table"] == "oauth2server_client"
-            and op["op"] == OperationType.UPDATE
-        )
+        return cls.matches_signature(tx)
 
     def _transform_data(self):
         """Transforms the data and returns dictionary."""
@@ -194,24 +165,20 @@ class OAuthApplicationUpdateAction(TransformAction):
         return {"client": OAuthServerClientTransform()._transform(op["after"])}
 
 
-class OAuthApplicationDeleteAction(TransformAction):
+class OAuthApplicationDeleteAction(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM OAuth server create action."""
 
     name = "oauth-application-delete"
     load_cls = load.OAuthApplicationDeleteAction
+    signatures = [
+        [(CLIENT, OperationType.DELETE)],
+    ]
+    exact_signatures = True
 
     @classmethod
     def matches_action(cls, tx):
         """Checks if the data corresponds with that required by the action."""
-        if len(tx.operations) != 1:
-            return False
-
-        op = tx.operations[0]
-
-        return (
-            op["source"]["table"] == "oauth2server_client"
-            and op["op"] == OperationType.DELETE
-        )
+        return cls.matches_signature(tx)
 
     def _transform_data(self):
         """Transforms the data and returns dictionary."""
@@ -220,11 +187,29 @@ class OAuthApplicationDeleteAction(TransformAction):
         return {"client": OAuthServerClientTransform()._transform(op["before"])}
 
 
-class OAuthLinkedAccountConnectAction(TransformAction, JSONTransformMixin):
+class OAuthLinkedAccountConnectAction(
+    SignatureMatchMixin, TransformAction, JSONTransformMixin
+):
     """Zenodo to RDM OAuth client linked account connect action."""
 
     name = "oauth-application-connect"
     load_cls = load.OAuthLinkedAccountConnectAction
+    # the server client and token are optional, the remote account can be updated
+    # more than once, so the signatures are not exact
+    signatures = [
+        [
+            (REMOTE_ACCOUNT, OperationType.INSERT),
+            (REMOTE_TOKEN, OperationType.INSERT),
+            (USER_IDENTITY, OperationType.INSERT),
+            *server_ops,
+            *account_updates,
+        ]
+        for server_ops in (
+            (),
+            ((CLIENT, OperationType.INSERT), (TOKEN, OperationType.INSERT)),
+        )
+        for account_updates in ((), ((REMOTE_ACCOUNT, OperationType.UPDATE),))
+    ]
 
     @classmethod
     def matches_action(cls, tx):
@@ -310,35 +295,28 @@ class OAuthLinkedAccountConnectAction(TransformAction, JSONTransformMixin):
         return result
 
 
-class OAuthLinkedAccountDisconnectAction(TransformAction, JSONTransformMixin):
+class OAuthLinkedAccountDisconnectAction(
+    SignatureMatchMixin, TransformAction, JSONTransformMixin
+):
     """Zenodo to RDM OAuth client linked account disconnect action."""
 
     name = "oauth-application-disconnect"
     load_cls = load.OAuthLinkedAccountDisconnectAction
+    # the user identity is optional in GitHub
+    signatures = [
+        [
+            (REMOTE_ACCOUNT, OperationType.DELETE),
+            (REMOTE_TOKEN, OperationType.DELETE),
+            (USER_IDENTITY, OperationType.DELETE),
+        ],
+        [(REMOTE_ACCOUNT, OperationType.DELETE), (REMOTE_TOKEN, OperationType.DELETE)],
+    ]
+    exact_signatures = True
 
     @classmethod
     def matches_action(cls, tx):
         """Checks if the data corresponds with that required by the action."""
-        if len(tx.operations) > 3 or len(tx.operations) < 2:
-            return False
-
-        rules = {
-            "oauthclient_remoteaccount": OperationType.DELETE,
-            "oauthclient_remotetoken": OperationType.DELETE,
-            "oauthclient_useridentity": OperationType.DELETE,  # optional in gh
-        }
-
-        for op in tx.operations:
-            rule = rules.pop(op["source"]["table"], None)
-            if not rule or rule != op["op"]:
-                return False
-
-        # the previous len check means that at this point the rules have 1 or 0 left
-        # if the len is 1 then only left should be the identity
-        if len(rules) == 1 and "oauthclient_useridentity" not in rules.keys():
-            return False
-
-        return True
+        return cls.matches_signature(tx)
 
     def _transform_data(self):
         """Transforms the data and returns dictionary."""
@@ -373,29 +351,20 @@ class OAuthLinkedAccountDisconnectAction(TransformAction, JSONTransformMixin):
         return result
 
 
-class OAuthGHDisconnectToken(TransformAction):
+class OAuthGHDisconnectToken(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM GH linked account disconnect server token and identity."""
 
     name = "oauth-gh-application-disconnect"
     load_cls = load.OAuthGHDisconnectToken
+    signatures = [
+        [(USER_IDENTITY, OperationType.DELETE), (TOKEN, OperationType.DELETE)],
+    ]
+    exact_signatures = True
 
     @classmethod
     def matches_action(cls, tx):
         """Checks if the data corresponds with that required by the action."""
-        if len(tx.operations) != 2:
-            return False
-
-        rules = {
-            "oauthclient_useridentity": OperationType.DELETE,
-            "oauth2server_token": OperationType.DELETE,
-        }
-
-        for op in tx.operations:
-            rule = rules.pop(op["source"]["table"], None)
-            if not rule or rule != op["op"]:
-                return False
-
-        return True
+        return cls.matches_signature(tx)
 
     def _transform_data(self):
         """Transforms the data and returns dictionary."""
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Operation signatures of the transform actions.
+
+The signature of a transaction is the set of distinct ``(table, op type)`` pairs of
+its operations, optionally ignoring some tables. Actions declaring the signatures
+they can match are looked up by the signature of a transaction, instead of calling
+the ``matches_action`` of every action.
+"""
+
+
+def _normalize(ops):
+    """Hashable ``(table, op type)`` pairs.
+
+    ``OperationType`` compares case-insensitively and is not hashable, so the op
+    types are reduced to their upper-case string value.
+    """
+    return frozenset((table, op.upper()) for table, op in ops)
+
+
+def ops_signature(ops, exclude=None):
+    """Signature of a list of ``(table, op type)`` tuples.
+
+    :returns: a tuple with the signature and whether it is *exact*, i.e. no
+        ``(table, op type)`` pair was repeated.
+    """
+    if exclude:
+        ops = [op for op in ops if op[0] not in exclude]
+    signature = _normalize(ops)
+    return signature, len(signature) == len(ops)
+
+
+class SignatureMatchMixin:
+    """Declare the operation signatures an action can match.
+
+    ``signatures`` is a list of ``(table, op type)`` pair lists, one per variant
+    of the transaction, computed without the ``signatures_exclude`` tables. Matching
+    one of them is required for ``matches_action`` to be true. When
+    ``exact_signatures`` is set it is also enough, provided that no pair is repeated
+    in the transaction.
+    """
+
+    signatures = None
+    signatures_exclude = ()
+    exact_signatures = False
+
+    @classmethod
+    def matches_signature(cls, tx):
+        """Checks if the transaction matches one of the signatures exactly."""
+        sizes = {len(s) for s in cls.signatures}
+        if not cls.signatures_exclude and len(tx.operations) not in sizes:
+            return False  # cheap check before looking at the operations
+        signature, exact = ops_signature(tx.as_ops_tuples(), cls.signatures_exclude)
+        return exact and signature in {_normalize(s) for s in cls.signatures}
+
+
+class ActionLookup:
+    """Precompiled lookup of the actions by transaction signature."""
+
+    def __init__(self, actions):
+        """Constructor."""
+        self.actions = list(actions)
+        # exclude -> signature -> actions, and actions without signatures
+        self._index = {}
+        self._unindexed = set()
+        for action in self.actions:
+            if getattr(action, "signatures", None) is None:
+                self._unindexed.add(action)
+                continue
+            index = self._index.setdefault(frozenset(action.signatures_exclude), {})
+            for signature in action.signatures:
+                index.setdefault(_normalize(signature), set()).add(action)
+
+    def candidates(self, tx):
+        """Yield the actions that can match a transaction, in declaration order.
+
+        :returns: an iterator of ``(action, confirmed)`` tuples. Confirmed actions
+            match the transaction; the rest still need their ``matches_action``.
+        """
+        ops = tx.as_ops_tuples()
+        found = {}
+        for exclude, index in self._index.items():
+            signature, exact = ops_signature(ops, exclude)
+            for action in index.get(signature, ()):
+                found[action] = exact and action.exact_signatures
+
+        for action in self.actions:
+            if action in found:
+                yield action, found[action]
+            elif action in self._unindexed:
+                yield action, False
@@ -7,37 +7,32 @@
 
 """Invenio RDM migration users actions module."""
 
-
 from invenio_rdm_migrator.actions import TransformAction
 from invenio_rdm_migrator.load.postgresql.transactions.operations import OperationType
 from invenio_rdm_migrator.streams.actions import load
 
 from ...transform.entries.users import ZenodoUserEntry
+from .signatures import SignatureMatchMixin
+
+USER = "accounts_user"
+PROFILE = "userprofiles_userprofile"
+SESSION = "accounts_user_session_activity"
 
 
-class UserRegistrationAction(TransformAction):
+class UserRegistrationAction(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM user registration action."""
 
     name = "register-user"
     load_cls = load.UserRegistrationAction
+    signatures = [
+        [(PROFILE, OperationType.INSERT), (USER, OperationType.INSERT)],
+    ]
+    exact_signatures = True
 
     @classmethod
     def matches_action(cls, tx):
         """Checks if the data corresponds with that required by the action."""
-        rules = {
-            "userprofiles_userprofile": OperationType.INSERT,
-            "accounts_user": OperationType.INSERT,
-        }
-
-        for operation in tx.operations:
-            table_name = operation["source"]["table"]
-
-            rule = rules.pop(table_name, None)
-            # no duplicated tables, can fail fast if rule is None
-            if not rule or not rule == operation["op"]:
-                return False
-
-        return len(rules) == 0
+        return cls.matches_signature(tx)
 
     def _transform_data(self):
         """Transforms the data and returns an instance of the mapped_cls."""
@@ -62,11 +57,14 @@ class UserRegistrationAction(TransformAction):
         return dict(user=user, login_information=login_info)
 
 
-class UserEditAction(TransformAction):
+class UserEditAction(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM user edit action."""
 
     name = "edit-user"
     load_cls = load.UserEditAction
+    signatures = [
+        [(USER, OperationType.UPDATE)],
+    ]
 
     @classmethod
     def matches_action(cls, tx):
@@ -103,11 +101,18 @@ class UserEditAction(TransformAction):
         return dict(user=user, login_information=login_info)
 
 
-class UserDeactivationAction(TransformAction):
+class UserDeactivationAction(SignatureMatchMixin, TransformAction):
     """Zenodo to RDM user deactivation action."""
 
     name = "deactivate-user"
     load_cls = load.UserDeactivationAction
+    # the user must also be set as not active
+    signatures = [
+        [(USER, OperationType.UPDATE), (SESSION, OperationType.DELETE)],
+        [(USER, OperationType.UPDATE)],
+        [(SESSION, OperationType.DELETE)],
+        [],
+    ]
 
     @classmethod
     def matches_action(cls, tx):
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Validation-only dry-run of the migration streams.
+
+A dry-run extracts and transforms the entries of a stream, and validates the
+transformed JSON documents against the RDM JSON schemas. Nothing is written to disk
+or loaded to the database; the result is a histogram of the errors found, grouped by
+document, field and error type, with a few sample entry IDs for each of them.
+"""
+
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from importlib.metadata import entry_points
+from importlib.util import find_spec
+from pathlib import Path
+
+import pypeln
+import yaml
+from invenio_rdm_migrator.logging import Logger
+from jsonschema import RefResolver
+from jsonschema.validators import validator_for
+
+from .errors import UnknownSchema
+
+
+def _schemas_entry_points():
+    """Return the ``invenio_jsonschemas.schemas`` entry points."""
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        return eps.select(group="invenio_jsonschemas.schemas")
+    return eps.get("invenio_jsonschemas.schemas", [])  # python<3.10
+
+
+class SchemaStore:
+    """Load ``local://`` JSON schemas and cache their validators."""
+
+    def __init__(self, schemas_dirs=None):
+        """Constructor.
+
+        :param schemas_dirs: directories to look up the schemas in. By default, the
+            directories registered by the installed Invenio modules are used.
+        """
+        if schemas_dirs is None:
+            schemas_dirs = self._discover_dirs()
+        self.schemas_dirs = [Path(d) for d in schemas_dirs]
+        self._schemas = {}
+        self._validators = {}
+
+    @staticmethod
+    def _discover_dirs():
+        """Get the schema directories of the installed Invenio modules."""
+        dirs = []
+        for ep in _schemas_entry_points():
+            try:
+                spec = find_spec(ep.value)
+            except ImportError:
+                continue
+            if spec and spec.submodule_search_locations:
+                dirs.extend(spec.submodule_search_locations)
+        return dirs
+
+    def load(self, uri):
+        """Load a schema from its ``local://`` URI."""
+        path = uri.split("#", 1)[0].replace("local://", "", 1)
+        if path not in self._schemas:
+            for schemas_dir in self.schemas_dirs:
+                schema_file = schemas_dir / path
+                if schema_file.is_file():
+                    with open(schema_file) as f:
+                        self._schemas[path] = json.load(f)
+                    break
+            else:
+                raise UnknownSchema(uri)
+        return self._schemas[path]
+
+    def validator(self, uri):
+        """Get a (cached) validator for a schema."""
+        if uri not in self._validators:
+            schema = self.load(uri)
+            resolver = RefResolver(
+                base_uri=uri, referrer=schema, handlers={"local": self.load}
+            )
+            self._validators[uri] = validator_for(schema)(schema, resolver=resolver)
+        return self._validators[uri]
+
+
+def _error_fields(error):
+    """Yield the dotted field paths an error refers to.
+
+    List indices are collapsed to ``*`` so that errors aggregate by field.
+    """
+    path = ".".join("*" if isinstance(p, int) else str(p) for p in error.absolute_path)
+    prefix = f"{path}." if path else ""
+    instance = error.instance if isinstance(error.instance, dict) else {}
+    if error.validator == "required":
+        for field in error.validator_value:
+            if field not in instance:
+                yield prefix + field
+    elif error.validator == "additionalProperties":
+        properties = error.schema.get("properties", {})
+        for field in instance:
+            if field not in properties:
+                yield prefix + field
+    else:
+        yield path
+
+
+def _documents(name, result):
+    """Yield the JSON documents of a transformed entry, with their name."""
+    if not isinstance(result, dict):
+        return
+    if "$schema" in (result.get("json") or {}):
+        yield name, result["json"]
+        return
+    for key, value in result.items():
+        if isinstance(value, dict) and "$schema" in (value.get("json") or {}):
+            yield key, value["json"]
+
+
+def _entry_id(entry):
+    """Best-effort identifier of an extracted entry, used for samples."""
+    for data in (entry, entry.get("json") or {}):
+        for key in ("recid", "id"):
+            if data.get(key) is not None:
+                return data[key]
+
+
+class DryRunReport:
+    """Aggregated errors of a dry-run."""
+
+    def __init__(self, sample_size=5):
+        """Constructor."""
+        self.sample_size = sample_size
+        self.entries = 0
+        self.failed = 0
+        self.errors = Counter()
+        self.samples = {}
+
+    def add(self, entry_id, errors):
+        """Add the (document, field, error type) errors of an entry."""
+        self.entries += 1
+        if errors:
+            self.failed += 1
+        for key in errors:
+            self.errors[key] += 1
+            samples = self.samples.setdefault(key, [])
+            if len(samples) < self.sample_size:
+                samples.append(entry_id)
+
+    def to_dict(self):
+        """Dump the report, most frequent errors first."""
+        return {
+            "entries": self.entries,
+            "failed": self.failed,
+            "errors": [
+                {
+                    "document": document,
+                    "field": field,
+                    "type": error_type,
+                    "count": count,
+                    "samples": self.samples[(document, field, error_type)],
+                }
+                for (document, field, error_type), count in self.errors.most_common()
+            ],
+        }
+
+
+class DryRunStream:
+    """Validation-only stream: extract, transform and validate, without loading."""
+
+    def __init__(self, name, extract, transform, schemas, workers=None, sample_size=5):
+        """Constructor."""
+        self.name = name
+        self.extract = extract
+        self.transform = transform
+        self.schemas = schemas
+        self.workers = workers
+        self.sample_size = sample_size
+
+    def _check(self, entry):
+        """Transform and validate an entry.
+
+        :returns: a tuple with the entry ID and the set of its errors.
+        """
+        errors = set()
+        try:
+            result = self.transform._transform(entry)
+        except Exception as exc:
+            errors.add(("transform", "", type(exc).__name__))
+            return _entry_id(entry), errors
+
+        for document, data in _documents(self.name, result):
+            try:
+                validator = self.schemas.validator(data["$schema"])
+            except UnknownSchema:
+                errors.add((document, "$schema", "unknown"))
+                continue
+            for error in validator.iter_errors(data):
+                for field in _error_fields(error):
+                    errors.add((document, field, error.validator))
+        return _entry_id(entry), errors
+
+    def run(self):
+        """Run the dry-run stream and return its report."""
+        logger = Logger.get_logger()
+        start_time = datetime.now()
+        logger.info(f"Dry-run of stream {self.name} started {start_time.isoformat()}")
+
+        entries = self.extract.run()
+        if self.workers is None:
+            results = map(self._check, entries)
+        else:
+            results = pypeln.process.map(
+                self._check,
+                entries,
+                workers=self.workers,
+                maxsize=self.workers * 100,
+            )
+
+        report = DryRunReport(sample_size=self.sample_size)
+        for entry_id, errors in results:
+            report.add(entry_id, errors)
+
+        end_time = datetime.now()
+        logger.info(
+            f"Dry-run of stream {self.name} ended {end_time.isoformat()}: "
+            f"{report.failed}/{report.entries} entries with errors"
+        )
+        for (document, field, error_type), count in report.errors.most_common(20):
+            samples = ", ".join(
+                str(s) for s in report.samples[(document, field, error_type)]
+            )
+            logger.info(f"{count:>10} {document}:{field} [{error_type}] ({samples})")
+        logger.info(f"Execution time: {end_time - start_time}")
+        return report
+
+
+class DryRunner:
+    """Runner for validation-only stream executions."""
+
+    def _read_config(self, filepath):
+        """Read config from file."""
+        with open(filepath) as f:
+            return yaml.safe_load(f)
+
+    def __init__(self, stream_definitions, config_filepath, streams=None):
+        """Constructor.
+
+        :param streams: names of the streams to run, by default all the configured.
+        """
+        config = self._read_config(config_filepath)
+
+        self.log_dir = Path(config.get("log_dir"))
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        Logger.initialize(self.log_dir)
+
+        dry_run_config = config.get("dry_run") or {}
+        workers = dry_run_config.get("workers", os.cpu_count())
+        sample_size = dry_run_config.get("sample_size", 5)
+        schemas = SchemaStore(dry_run_config.get("schemas_dirs"))
+
+        self.streams = []
+        for definition in stream_definitions:
+            if streams and definition.name not in streams:
+                continue
+            if definition.name not in config:
+                continue
+            stream_config = config.get(definition.name) or {}
+            # there is nothing to validate for streams that are only loaded
+            if stream_config.get("existing_data") or not definition.transform_cls:
+                continue
+            self.streams.append(
+                DryRunStream(
+                    definition.name,
+                    definition.extract_cls(**stream_config.get("extract", {})),
+                    definition.transform_cls(**stream_config.get("transform", {})),
+                    schemas,
+                    workers=workers,
+                    sample_size=sample_size,
+                )
+            )
+
+    def run(self):
+        """Run the dry-run streams and write the reports to the log directory."""
+        reports = {}
+        for stream in self.streams:
+            try:
+                reports[stream.name] = stream.run().to_dict()
+            except Exception:
+                Logger.get_logger().exception(
+                    f"Dry-run of stream {stream.name} failed.", exc_info=1
+                )
+                continue
+
+        with open(self.log_dir / "dry-run.json", "w") as f:
+            json.dump(reports, f, indent=2, default=str)
+        return reports
@@ -41,3 +41,16 @@ class InvalidIdentifier(Exception):
     def description(self):
         """Exception's description."""
         return f"Invalid identifier {self.identifier}"
+
+
+class UnknownSchema(Exception):
+    """JSON schema not found in the schema directories."""
+
+    def __init__(self, schema):
+        """Initialise error."""
+        self.schema = schema
+
+    @property
+    def description(self):
+        """Exception's description."""
+        return f"Unknown JSON schema {self.schema}"
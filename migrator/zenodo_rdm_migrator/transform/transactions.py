@@ -7,8 +7,8 @@
 
 """Zenodo migrator actions transform."""
 
-
 from invenio_rdm_migrator.transform import BaseTxTransform
+from invenio_rdm_migrator.transform.errors import MultipleActionMatches, NoActionMatch
 
 from ..actions.transform import (
     COMMUNITY_ACTIONS,
@@ -19,6 +19,7 @@ from ..actions.transform import (
     OAUTH_ACTIONS,
     USER_ACTIONS,
 )
+from ..actions.transform.signatures import ActionLookup
 
 
 class ZenodoTxTransform(BaseTxTransform):
@@ -33,3 +34,32 @@ class ZenodoTxTransform(BaseTxTransform):
         *USER_ACTIONS,
         *IGNORED_ACTIONS,
     ]
+
+    def __init__(self, *args, **kwargs):
+        """Constructor."""
+        super().__init__(*args, **kwargs)
+        self._lookup = ActionLookup(self.actions)
+
+    def _detect_action(self, tx):
+        """Detect the action of a transaction.
+
+        Only the actions whose signatures fit the transaction, and the ones without
+        signatures, are checked with their ``matches_action``.
+        """
+        match_classes = [
+            action_cls
+            for action_cls, confirmed in self._lookup.candidates(tx)
+            if confirmed or action_cls.matches_action(tx)
+        ]
+
+        if len(match_classes) == 0:
+            self.failed_tx_logger.error("No action match.", extra={"tx": tx})
+            raise NoActionMatch(tx)
+        elif len(match_classes) > 1:
+            self.failed_tx_logger.error(
+                "Multiple action matches.",
+                extra={"tx": tx, "matches": match_classes},
+            )
+            raise MultipleActionMatches(tx, match_classes)
+
+        return match_classes[0]  # return the one and only matched class
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Hash-based verification of migrated records against the legacy dumps.
+
+Both sides are reduced to one canonical hash per row, keyed by recid:
+
+- the *expected* side, by transforming the entries of the legacy records (and
+  deleted records) dumps,
+- the *actual* side, by reading the ``rdm_records_metadata``,
+  ``rdm_parents_metadata`` and ``pidstore_pid`` rows of a migrated database.
+
+The recid to object UUID mapping of the database is selected once, and the recid
+space is split in shards that are verified in parallel. Each shard reads its rows
+by primary key (or indexed object UUID), and compares the two sides' hashes.
+"""
+
+import hashlib
+import json
+import os
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+
+import psycopg
+import pypeln
+import yaml
+from invenio_rdm_migrator.extract import JSONLExtract
+from invenio_rdm_migrator.logging import Logger
+
+from .transform import ZenodoDeletedRecordTransform, ZenodoRecordTransform
+
+TABLES = ("records", "parents", "pids")
+"""Verified tables: records metadata, parents metadata and PIDs."""
+
+STREAMS = {
+    "records": ZenodoRecordTransform,
+    "deleted_records": ZenodoDeletedRecordTransform,
+}
+"""Streams whose dumps are verified, with their transform class."""
+
+RECIDS_QUERY = """
+    SELECT pid_value, object_uuid
+    FROM pidstore_pid
+    WHERE pid_type = 'recid' AND pid_value ~ '^[0-9]+$' AND object_uuid IS NOT NULL
+"""
+"""Query of the recid to object UUID mapping, selected once for all the shards."""
+
+QUERIES = {
+    "records": """
+        SELECT id, json, index FROM rdm_records_metadata WHERE id = ANY(%(ids)s)
+    """,
+    "parents": """
+        SELECT id, json FROM rdm_parents_metadata WHERE id = ANY(%(ids)s)
+    """,
+    "pids": """
+        SELECT object_uuid, pid_type, pid_value
+        FROM pidstore_pid
+        WHERE object_type = 'rec' AND object_uuid = ANY(%(ids)s)
+    """,
+}
+"""Queries of the actual rows of a shard, by primary key or indexed object UUID."""
+
+
+def canonical_hash(data):
+    """Hash of the canonical JSON serialization of some data."""
+    dumped = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(dumped.encode("utf-8")).hexdigest()
+
+
+def record_hash(record_json, index):
+    """Hash of a record row, ignoring the PID reference generated on load."""
+    data = {k: v for k, v in record_json.items() if k != "pid"}
+    return canonical_hash({"json": data, "index": index})
+
+
+def parent_hash(parent_json):
+    """Hash of a parent row.
+
+    The PID reference is generated and the community slugs are resolved to IDs on
+    load, so only the number of communities is compared.
+    """
+    data = {k: v for k, v in parent_json.items() if k not in ("pid", "communities")}
+    communities = (parent_json.get("communities") or {}).get("ids") or []
+    return canonical_hash({"json": data, "communities": len(communities)})
+
+
+def pids_hash(pids):
+    """Hash of the set of ``(pid_type, pid_value)`` PIDs of a record or parent."""
+    return canonical_hash(sorted(set(pids)))
+
+
+def diff_hashes(expected, actual):
+    """Yield the mismatching keys of two ``{key: hash}`` maps, in key order.
+
+    :returns: an iterator of ``(key, status)`` tuples, where the status is one of
+        ``missing``, ``unexpected`` or ``different``.
+    """
+    for key in sorted(expected.keys() | actual.keys()):
+        if key not in actual:
+            yield key, "missing"
+        elif key not in expected:
+            yield key, "unexpected"
+        elif expected[key] != actual[key]:
+            yield key, "different"
+
+
+def _recid(value):
+    """Convert a recid to an integer key, ``None`` if not numeric."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ExpectedHashes:
+    """Row hashes of the transformed legacy records dumps."""
+
+    def __init__(self, workers=None):
+        """Constructor."""
+        self.workers = workers
+        self.hashes = {table: {} for table in TABLES}
+        self.failed = 0
+        self._transform = None
+
+    def _hash_entry(self, item):
+        """Transform an entry and hash its rows.
+
+        :returns: a tuple with the entry position and a list of
+            ``(table, key, hash)`` rows, ``None`` if the transformation failed.
+        """
+        idx, entry = item
+        try:
+            result = self._transform._transform(entry)
+        except Exception:
+            return idx, None
+
+        rows = []
+        record = result.get("record")
+        parent = result.get("parent")
+        if record:
+            recid = _recid(record["json"].get("id"))
+            record_pids = record["json"].get("pids") or {}
+            pids = [("recid", str(record["json"].get("id")))]
+            pids += [(s, p["identifier"]) for s, p in record_pids.items()]
+            rows.append(
+                ("records", recid, record_hash(record["json"], record["index"]))
+            )
+            rows.append(("pids", recid, pids_hash(pids)))
+        if parent:
+            parent_recid = _recid(parent["json"].get("id"))
+            parent_doi = (parent["json"].get("pids") or {}).get("doi") or {}
+            pids = [("recid", str(parent["json"].get("id")))]
+            if parent_doi.get("identifier"):
+                pids.append(("doi", parent_doi["identifier"]))
+            rows.append(("parents", parent_recid, parent_hash(parent["json"])))
+            rows.append(("pids", parent_recid, pids_hash(pids)))
+        return idx, rows
+
+    def add(self, entries, transform):
+        """Hash the rows of the extracted legacy entries."""
+        self._transform = transform
+        items = enumerate(entries)
+        if self.workers is None:
+            results = map(self._hash_entry, items)
+        else:
+            results = pypeln.process.map(
+                self._hash_entry,
+                items,
+                workers=self.workers,
+                maxsize=self.workers * 100,
+            )
+
+        # parents are loaded once, from the first entry (i.e. version) seen
+        first_seen = {}
+        for idx, rows in results:
+            if rows is None:
+                self.failed += 1
+                continue
+            for table, key, row_hash in rows:
+                if key is None:
+                    continue
+                if table != "records":
+                    if first_seen.get((table, key), idx) < idx:
+                        continue
+                    first_seen[(table, key)] = idx
+                self.hashes[table][key] = row_hash
+
+
+class ShardVerifier:
+    """Verify a shard of a migrated database against its expected hashes."""
+
+    def __init__(self, db_uri, sample_size=10):
+        """Constructor."""
+        self.db_uri = db_uri
+        self.sample_size = sample_size
+
+    def _actual_hashes(self, conn, recids):
+        """Hash the rows of the ``{recid: object UUID}`` PIDs in the database."""
+        recid_of = {uuid: recid for recid, uuid in recids.items()}
+        params = {"ids": list(recid_of)}
+        hashes = {table: {} for table in TABLES}
+        with conn.cursor() as cur:
+            for uuid, record_json, index in cur.execute(QUERIES["records"], params):
+                hashes["records"][recid_of[uuid]] = record_hash(record_json, index)
+            for uuid, parent_json in cur.execute(QUERIES["parents"], params):
+                hashes["parents"][recid_of[uuid]] = parent_hash(parent_json)
+            # PIDs of drafts, i.e. without a record or parent, are not verified
+            found = {
+                uuid
+                for uuid, recid in recid_of.items()
+                if recid in hashes["records"] or recid in hashes["parents"]
+            }
+            pids = {}
+            if found:
+                rows = cur.execute(QUERIES["pids"], {"ids": list(found)})
+                for uuid, pid_type, pid_value in rows:
+                    pids.setdefault(recid_of[uuid], []).append((pid_type, pid_value))
+            hashes["pids"] = {k: pids_hash(v) for k, v in pids.items()}
+        return hashes
+
+    def verify(self, shard):
+        """Verify a shard.
+
+        :param shard: a dictionary with the ``recids`` of the shard in the database,
+            as a ``{recid: object UUID}`` mapping, and the ``expected`` per-table
+            hashes of the shard.
+        :returns: a per-table dictionary of row counts and mismatches.
+        """
+        actual = {table: {} for table in TABLES}
+        if shard["recids"]:
+            with psycopg.connect(self.db_uri) as conn:
+                actual = self._actual_hashes(conn, shard["recids"])
+
+        result = {}
+        for table in TABLES:
+            expected = shard["expected"][table]
+            mismatches = {}
+            samples = []
+            for key, status in diff_hashes(expected, actual[table]):
+                mismatches[status] = mismatches.get(status, 0) + 1
+                if len(samples) < self.sample_size:
+                    samples.append({"recid": key, "status": status})
+            result[table] = {
+                "expected": len(expected),
+                "actual": len(actual[table]),
+                "mismatches": mismatches,
+                "samples": samples,
+            }
+        return result
+
+
+def shard_ranges(start, end, shards):
+    """Split the ``[start, end)`` range in (at most) ``shards`` ranges."""
+    step = max(-(-(end - start) // shards), 1)
+    return [(s, min(s + step, end)) for s in range(start, end, step)]
+
+
+def split_shards(expected, recids, shards):
+    """Split the expected hashes and the database recids in recid range shards.
+
+    Each shard only holds its own slice of the expected hashes and of the
+    ``{recid: object UUID}`` mapping, to be sent to a worker process.
+    """
+    keys = [*recids, *(k for hashes in expected.values() for k in hashes)]
+    if not keys:
+        return []
+    ranges = shard_ranges(min(keys), max(keys) + 1, shards)
+    starts = [start for start, _ in ranges]
+    result = [
+        {"recids": {}, "expected": {table: {} for table in TABLES}} for _ in ranges
+    ]
+    for recid, uuid in recids.items():
+        result[bisect_right(starts, recid) - 1]["recids"][recid] = uuid
+    for table, hashes in expected.items():
+        for recid, row_hash in hashes.items():
+            result[bisect_right(starts, recid) - 1]["expected"][table][recid] = row_hash
+    return result
+
+
+def merge_results(results, sample_size=10):
+    """Merge the per-shard verification results."""
+    merged = {
+        table: {"expected": 0, "actual": 0, "mismatches": {}, "samples": []}
+        for table in TABLES
+    }
+    for result in results:
+        for table, data in result.items():
+            total = merged[table]
+            total["expected"] += data["expected"]
+            total["actual"] += data["actual"]
+            for status, count in data["mismatches"].items():
+                total["mismatches"][status] = total["mismatches"].get(status, 0) + count
+            total["samples"].extend(data["samples"])
+            total["samples"] = total["samples"][:sample_size]
+    return merged
+
+
+class Verifier:
+    """Runner of the hash-based verification of the records streams."""
+
+    def _read_config(self, filepath):
+        """Read config from file."""
+        with open(filepath) as f:
+            return yaml.safe_load(f)
+
+    def __init__(self, config_filepath):
+        """Constructor."""
+        config = self._read_config(config_filepath)
+
+        self.log_dir = Path(config.get("log_dir"))
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        Logger.initialize(self.log_dir)
+
+        self.db_uri = config.get("db_uri")
+        verify_config = config.get("verify") or {}
+        self.workers = verify_config.get("workers", os.cpu_count())
+        self.shards = verify_config.get("shards", self.workers * 4)
+        self.sample_size = verify_config.get("sample_size", 10)
+
+        self.streams = []
+        for name, transform_cls in STREAMS.items():
+            stream_config = config.get(name) or {}
+            if "extract" in stream_config:
+                self.streams.append(
+                    (
+                        JSONLExtract(**stream_config["extract"]),
+                        transform_cls(**stream_config.get("transform", {})),
+                    )
+                )
+
+    def _db_recids(self):
+        """Get the ``{recid: object UUID}`` mapping of the migrated database."""
+        with psycopg.connect(self.db_uri) as conn:
+            return {int(recid): uuid for recid, uuid in conn.execute(RECIDS_QUERY)}
+
+    def run(self):
+        """Run the verification and write the report to the log directory."""
+        logger = Logger.get_logger()
+        start_time = datetime.now()
+        logger.info(f"Verification started {start_time.isoformat()}")
+
+        expected = ExpectedHashes(workers=self.workers)
+        for extract, transform in self.streams:
+            expected.add(extract.run(), transform)
+        logger.info(
+            "Hashed legacy entries: "
+            + ", ".join(f"{t}={len(h)}" for t, h in expected.hashes.items())
+            + f" ({expected.failed} failed transformations)"
+        )
+
+        shards = split_shards(expected.hashes, self._db_recids(), self.shards)
+        verifier = ShardVerifier(self.db_uri, sample_size=self.sample_size)
+        results = pypeln.process.map(
+            verifier.verify, shards, workers=self.workers, maxsize=self.workers
+        )
+        report = merge_results(results, sample_size=self.sample_size)
+        report["failed_transformations"] = expected.failed
+
+        for table in TABLES:
+            data = report[table]
+            logger.info(
+                f"{table}: {data['expected']} expected, {data['actual']} actual, "
+                f"mismatches {data['mismatches'] or 'none'}"
+            )
+        with open(self.log_dir / "verify.json", "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+        end_time = datetime.now()
+        logger.info(f"Verification ended {end_time.isoformat()}")
+        logger.info(f"Execution time: {end_time - start_time}")
+        return report
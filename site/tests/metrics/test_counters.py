@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the incremental row counters."""
+
+from copy import deepcopy
+from datetime import datetime
+
+import pytest
+from invenio_accounts.models import User
+from invenio_cache import current_cache
+from invenio_communities import current_communities
+from invenio_communities.communities.records.models import CommunityMetadata
+from invenio_communities.communities.records.systemfields.deletion_status import (
+    CommunityDeletionStatusEnum,
+)
+
+from zenodo_rdm.metrics.counters import COUNTERS, reconcile_counters
+
+
+@pytest.fixture()
+def researchers(app, db, cache):
+    """Researchers counter, reconciled with the exact count."""
+    counter = COUNTERS["researchers"]
+    counter.reconcile()
+    return counter
+
+
+def _user(email, **kwargs):
+    return User(email=email, password="password", **kwargs)
+
+
+def test_insert(researchers, db):
+    """Test inserted rows matching the conditions are counted."""
+    count = researchers.incremental()
+    db.session.add(
+        _user("confirmed@zenodo.org", active=True, confirmed_at=datetime.now())
+    )
+    db.session.add(_user("unconfirmed@zenodo.org", active=True))
+    db.session.commit()
+
+    assert researchers.incremental() == count + 1
+    assert researchers.incremental() == researchers.exact()
+
+
+def test_update(researchers, db):
+    """Test updated rows are counted when their conditions change."""
+    user = _user("updated@zenodo.org", active=True)
+    db.session.add(user)
+    db.session.commit()
+    count = researchers.incremental()
+
+    user.confirmed_at = datetime.now()
+    db.session.commit()
+    assert researchers.incremental() == count + 1
+
+    # the previous value of expired attributes is loaded when they are set
+    db.session.expire(user)
+    user.active = False
+    db.session.commit()
+    assert researchers.incremental() == count
+    assert researchers.incremental() == researchers.exact()
+
+
+def test_soft_delete(community, db, cache):
+    """Test soft-deleted communities are not counted."""
+    communities = COUNTERS["communities"]
+    count = communities.reconcile()
+    model = CommunityMetadata.query.filter_by(slug="blr").one()
+
+    db.session.expire(model)
+    model.deletion_status = CommunityDeletionStatusEnum.DELETED
+    db.session.commit()
+    assert communities.incremental() == count - 1
+    assert communities.incremental() == communities.exact()
+
+
+def test_community_service(
+    running_app, community_type_record, community_owner, minimal_community, db, cache
+):
+    """Test communities created and updated through the service are counted."""
+    communities = COUNTERS["communities"]
+    count = communities.reconcile()
+    data = deepcopy(minimal_community)
+    data["slug"] = "counted"
+    community = current_communities.service.create(community_owner.identity, data)
+    assert communities.incremental() == count + 1
+
+    data["metadata"]["title"] = "Counted community"
+    current_communities.service.update(community_owner.identity, community.id, data)
+    assert communities.incremental() == count + 1
+    assert communities.incremental() == communities.exact()
+
+
+def test_rollback(researchers, db):
+    """Test the changes of rolled back transactions are not counted."""
+    count = researchers.incremental()
+    db.session.add(_user("rolled@zenodo.org", active=True, confirmed_at=datetime.now()))
+    db.session.flush()
+    db.session.rollback()
+
+    assert researchers.incremental() == count
+    assert researchers.incremental() == researchers.exact()
+
+
+def test_not_initialized(app, db, cache):
+    """Test a counter not in the cache is computed exactly when first read."""
+    researchers = COUNTERS["researchers"]
+    current_cache.delete(researchers.cache_key)
+    db.session.add(_user("first@zenodo.org", active=True, confirmed_at=datetime.now()))
+    db.session.commit()
+
+    assert current_cache.get(researchers.cache_key) is None
+    assert researchers.incremental() == researchers.exact()
+
+
+def test_reconcile_drift(researchers, db):
+    """Test reconciling resets the counters drifted by bulk changes."""
+    db.session.add(_user("bulk@zenodo.org", active=True, confirmed_at=datetime.now()))
+    db.session.commit()
+    count = researchers.incremental()
+
+    # bulk updates are not seen by the session listeners
+    User.query.filter_by(email="bulk@zenodo.org").update({"active": False})
+    db.session.commit()
+    assert researchers.incremental() == count
+
+    assert reconcile_counters()["researchers"] == count - 1
+    assert researchers.incremental() == count - 1
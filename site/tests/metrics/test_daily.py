@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the incrementally computed daily counters."""
+
+from datetime import date, timedelta
+
+import pytest
+
+from zenodo_rdm.metrics.daily import BackfillPendingError, DailyCounter, VisitorsCounter
+from zenodo_rdm.metrics.sketches import HyperLogLog
+
+START = date(2023, 6, 1)
+TODAY = date(2023, 6, 30)
+
+
+class _Sums(DailyCounter):
+    name = "test_sums"
+
+    def __init__(self, events):
+        self.events = events
+        self.queries = []
+
+    def aggregate(self, start, end):
+        self.queries.append((start, end))
+        days = {}
+        for day, value in self.events:
+            if start <= day < end:
+                days[day] = days.get(day, 0) + value
+        return days
+
+    def initial(self):
+        return 0
+
+    def merge(self, total, value):
+        return total + value
+
+
+class _Visitors(VisitorsCounter):
+    name = "test_visitors"
+
+    def __init__(self, visits):
+        self.visits = visits
+
+    def aggregate(self, start, end):
+        days = {}
+        for day, visitor in self.visits:
+            if start <= day < end:
+                days.setdefault(day, HyperLogLog(self.initial().precision))
+                days[day].add(visitor)
+        return days
+
+
+def _day(n):
+    return START + timedelta(days=n)
+
+
+@pytest.fixture()
+def daily_config(app, cache, monkeypatch):
+    """Configuration of the daily counters, with an empty cache."""
+    monkeypatch.setitem(app.config, "METRICS_DAILY_CHUNK_DAYS", 10)
+    monkeypatch.setitem(app.config, "METRICS_DAILY_GRACE_DAYS", 3)
+    return app.config
+
+
+def test_get_backfill_pending(daily_config):
+    """Test the counter is not computed when too many days are not updated."""
+    counter = _Sums([(_day(0), 1)])
+    with pytest.raises(BackfillPendingError):
+        counter.get(START, today=TODAY)
+    assert counter.queries == []
+
+    # a start date in the last chunk of days is computed when getting it
+    assert counter.get(_day(25), today=TODAY) == 0
+    assert counter.queries == [(_day(25), TODAY + timedelta(days=1))]
+
+
+def test_update(daily_config):
+    """Test the settled days are computed in chunks, and persisted."""
+    counter = _Sums([(_day(n), n) for n in range(30)])
+    # days up to 3 days before today are settled
+    assert counter.update(START, today=TODAY) == sum(range(26))
+    assert counter.queries == [
+        (_day(0), _day(10)),
+        (_day(10), _day(20)),
+        (_day(20), _day(26)),
+    ]
+
+    counter.queries = []
+    assert counter.update(START, today=TODAY) == sum(range(26))
+    assert counter.queries == []
+
+    # the next day, only the newly settled day is computed
+    assert counter.update(START, today=TODAY + timedelta(days=1)) == sum(range(27))
+    assert counter.queries == [(_day(26), _day(27))]
+
+
+def test_get_recent_days(daily_config):
+    """Test the days of the grace period and the open day are always aggregated."""
+    events = [(_day(n), n) for n in range(30)]
+    counter = _Sums(events)
+    counter.update(START, today=TODAY)
+
+    counter.queries = []
+    assert counter.get(START, today=TODAY) == sum(range(30))
+    assert counter.queries == [(_day(26), TODAY + timedelta(days=1))]
+
+    # late events are counted in the grace period, but not in the settled days
+    events.extend([(_day(27), 100), (_day(20), 1000)])
+    assert counter.get(START, today=TODAY) == sum(range(30)) + 100
+    assert counter.get(START, today=TODAY) == sum(range(30)) + 100
+
+
+def test_update_start_date(daily_config):
+    """Test the persisted total is recomputed for another start date."""
+    counter = _Sums([(_day(n), 1) for n in range(30)])
+    counter.update(START, today=TODAY)
+
+    counter.queries = []
+    # the aggregates of the settled days are reused
+    assert counter.update(_day(10), today=TODAY) == 16
+    assert counter.queries == []
+    assert counter.get(_day(10), today=TODAY) == 20
+
+
+def test_visitors_merge(daily_config):
+    """Test the unique visitors are merged from the daily sketches."""
+    visits = [(_day(n), f"visitor-{n % 7}") for n in range(30)]
+    visits.append((_day(29), "visitor-new"))
+    counter = _Visitors(visits)
+    assert counter.update(START, today=TODAY) == 7
+
+    # the persisted total is not changed by the recent days
+    assert counter.get(START, today=TODAY) == 8
+    assert counter.get(START, today=TODAY) == 8
+    assert counter.update(START, today=TODAY) == 7
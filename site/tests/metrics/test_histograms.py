@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the histograms shared by worker processes."""
+
+import fakeredis
+import pytest
+from flask import Flask
+
+from zenodo_rdm.metrics.histograms import (
+    HistogramRecorder,
+    format_histogram,
+    format_labels,
+)
+
+
+@pytest.fixture()
+def redis():
+    """Fake Redis server."""
+    return fakeredis.FakeStrictRedis()
+
+
+def _recorder(redis, flush_interval=60):
+    recorder = HistogramRecorder(
+        "TEST_HISTOGRAMS", (1, 0.1), flush_interval, "redis://localhost"
+    )
+    recorder._redis = redis
+    return recorder
+
+
+def test_format_labels():
+    """Test the label values are escaped."""
+    assert format_labels(endpoint="records.read", le=0.5) == (
+        'endpoint="records.read",le="0.5"'
+    )
+    assert format_labels(name='a "b" \\c') == 'name="a \\"b\\" \\\\c"'
+
+
+def test_format_histogram():
+    """Test a collected histogram is formatted into Prometheus lines."""
+    histogram = {"buckets": {0.1: 1, 1: 3, "+Inf": 4}, "sum": 2.5, "count": 4}
+    assert format_histogram("duration", {"task": "t"}, histogram) == [
+        'duration_bucket{task="t",le="0.1"} 1',
+        'duration_bucket{task="t",le="1"} 3',
+        'duration_bucket{task="t",le="+Inf"} 4',
+        'duration_sum{task="t"} 2.5',
+        'duration_count{task="t"} 4',
+    ]
+
+
+def test_flush(redis):
+    """Test the observed values are merged into Redis on flush."""
+    recorder = _recorder(redis)
+    recorder.observe("records.read", {"total": 0.05, "sql": 0.02})
+    recorder.observe("records.read", {"total": 0.5})
+    recorder.observe("records.read", {"total": 5})
+    assert recorder.collect() == {}
+
+    recorder.flush()
+    assert recorder._histograms == {}
+    assert recorder.collect() == {
+        ("records.read", "total"): {
+            "buckets": {0.1: 1, 1: 2, "+Inf": 3},
+            "sum": 5.55,
+            "count": 3,
+        },
+        ("records.read", "sql"): {
+            "buckets": {0.1: 1, 1: 1, "+Inf": 1},
+            "sum": 0.02,
+            "count": 1,
+        },
+    }
+
+
+def test_flush_merges_processes(redis):
+    """Test the histograms of several processes are added up."""
+    first, second = _recorder(redis), _recorder(redis)
+    first.observe("task", {"duration": 0.5})
+    second.observe("task", {"duration": 0.5})
+    second.observe("task", {"duration": 2})
+    first.flush()
+    second.flush()
+    second.flush()
+
+    histogram = first.collect()[("task", "duration")]
+    assert histogram["buckets"] == {0.1: 0, 1: 2, "+Inf": 3}
+    assert histogram["count"] == 3
+    assert histogram["sum"] == 3.0
+
+
+def test_flush_interval(redis):
+    """Test the values are flushed on observe, after the flush interval."""
+    recorder = _recorder(redis, flush_interval=0)
+    recorder.observe("task", {"duration": 0.5})
+    assert recorder.collect()[("task", "duration")]["count"] == 1
+
+
+def test_flush_failure(redis, monkeypatch):
+    """Test a failed flush is logged, without failing the observed request."""
+    recorder = _recorder(redis)
+    recorder.observe("task", {"duration": 0.5})
+    monkeypatch.setattr(
+        fakeredis.FakeStrictRedis,
+        "pipeline",
+        lambda *args, **kwargs: _FailingPipeline(),
+    )
+    with Flask("test").app_context():
+        recorder.flush()
+    assert recorder._histograms == {}
+
+
+class _FailingPipeline:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    def execute(self):
+        raise ConnectionError("Redis is down.")
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the endpoint latency breakdown metrics."""
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask, g
+
+from zenodo_rdm.metrics import latency
+
+
+@pytest.fixture()
+def engine():
+    """SQLite engine, with the SQL queries measured."""
+    latency.instrument_sql()
+    engine = sa.create_engine("sqlite://")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def request_ctx():
+    """Measured request context."""
+    app = Flask("test")
+    with app.test_request_context("/"):
+        latency.start_request()
+        yield
+
+
+def test_sql_time(engine, request_ctx):
+    """Test the time spent in SQL queries is added to the request."""
+    with engine.connect() as conn:
+        conn.execute(sa.text("SELECT 1"))
+        assert conn.info["latency_start"] == []
+    assert g.latency_components["sql"] > 0
+
+
+def test_sql_time_failed_query(engine, request_ctx):
+    """Test a failed query is not left measured on the connection."""
+    with engine.connect() as conn:
+        with pytest.raises(sa.exc.OperationalError):
+            conn.execute(sa.text("SELECT * FROM missing"))
+        assert conn.info["latency_start"] == []
+        sql_time = g.latency_components["sql"]
+
+        conn.execute(sa.text("SELECT 1"))
+        assert conn.info["latency_start"] == []
+    assert g.latency_components["sql"] > sql_time
+
+
+def test_formatted_response():
+    """Test the histograms are formatted per endpoint and component."""
+    histogram = {"buckets": {0.1: 1, "+Inf": 2}, "sum": 0.5, "count": 2}
+    response = latency.formatted_response(
+        {("records.read", "total"): histogram, ("records.read", "sql"): histogram}
+    )
+    lines = response.splitlines()
+    assert "# TYPE zenodo_http_request_duration_seconds histogram" in lines
+    assert (
+        'zenodo_http_request_duration_seconds_bucket{endpoint="records.read",le="0.1"} 1'
+        in lines
+    )
+    assert (
+        "zenodo_http_request_component_duration_seconds_count"
+        '{endpoint="records.read",component="sql"} 2'
+    ) in lines
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the mergeable cardinality sketches."""
+
+import pytest
+
+from zenodo_rdm.metrics.sketches import HyperLogLog
+
+
+def _sketch(values, precision=12):
+    sketch = HyperLogLog(precision)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_count():
+    """Test the estimate is within the standard error of the precision."""
+    assert HyperLogLog(12).count() == 0
+    assert _sketch(["a", "a", "a"]).count() == 1
+    assert _sketch(range(100)).count() == pytest.approx(100, abs=2)
+    # 1.04 / sqrt(2 ** 12) is a standard error of 1.6%
+    assert _sketch(range(50000)).count() == pytest.approx(50000, rel=0.05)
+
+
+def test_merge():
+    """Test merged sketches estimate the cardinality of the union."""
+    first = _sketch(range(0, 30000))
+    second = _sketch(range(20000, 50000))
+    union = _sketch(range(0, 50000))
+
+    assert first.copy().merge(second).registers == union.registers
+    assert first.merge(second).count() == union.count()
+
+
+def test_merge_precision():
+    """Test sketches of different precision are not merged."""
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(14))
+
+
+def test_copy():
+    """Test a copy does not share the registers."""
+    sketch = _sketch(range(10))
+    copy = sketch.copy()
+    copy.add("other")
+    assert copy.count() == 11
+    assert sketch.count() == 10
+
+
+def test_dumps_loads():
+    """Test a sketch round trips through its serialized registers."""
+    sketch = _sketch(range(1000), precision=10)
+    data = sketch.dumps()
+    assert isinstance(data, bytes)
+    assert len(data) == 2**10
+
+    loaded = HyperLogLog.loads(data)
+    assert loaded.precision == 10
+    assert loaded.registers == sketch.registers
+    assert loaded.count() == sketch.count()
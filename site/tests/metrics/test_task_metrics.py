@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the Celery task runtime metrics."""
+
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from celery import Celery
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    worker_process_shutdown,
+)
+from flask import Flask
+
+from zenodo_rdm.metrics import task_metrics
+from zenodo_rdm.metrics.histograms import HistogramRecorder
+
+
+@pytest.fixture()
+def recorder():
+    """Histogram recorder, merging into a fake Redis server."""
+    recorder = HistogramRecorder(
+        task_metrics.REDIS_KEY, (0.1, 1, 10), 60, "redis://localhost"
+    )
+    recorder._redis = fakeredis.FakeStrictRedis()
+    return recorder
+
+
+@pytest.fixture()
+def metrics(recorder):
+    """Task metrics of the ``tests.measured.*`` tasks, connected to the signals."""
+    metrics = task_metrics.TaskMetrics(Flask("test"), recorder, [r"tests\.measured\."])
+    metrics.connect()
+    yield metrics
+    for signal in (
+        before_task_publish,
+        task_prerun,
+        task_postrun,
+        worker_process_shutdown,
+    ):
+        signal.disconnect(dispatch_uid=task_metrics.__name__)
+
+
+@pytest.fixture()
+def celery_app():
+    """Celery application with measured and not measured tasks."""
+    celery = Celery("test")
+
+    @celery.task(name="tests.measured.add")
+    def add(x, y):
+        return x + y
+
+    @celery.task(name="tests.measured.fail")
+    def fail():
+        raise ValueError("Failed task.")
+
+    @celery.task(bind=True, name="tests.measured.retry", max_retries=1)
+    def retry(self):
+        if not self.request.retries:
+            raise self.retry(countdown=0)
+
+    @celery.task(name="tests.other.add")
+    def other_add(x, y):
+        return x + y
+
+    return celery
+
+
+def _request(sent_at=None, eta=None, headers=None):
+    return SimpleNamespace(zenodo_sent_at=sent_at, eta=eta, headers=headers)
+
+
+def test_queue_wait():
+    """Test the queue wait is measured from the publication or the ETA."""
+    now = time.time()
+    assert task_metrics._queue_wait(_request(), now) is None
+    assert task_metrics._queue_wait(_request(sent_at=now - 5), now) == 5
+    assert task_metrics._queue_wait(
+        _request(headers={"zenodo_sent_at": now - 3}), now
+    ) == pytest.approx(3)
+
+    eta = datetime.fromtimestamp(now - 2, tz=timezone.utc)
+    assert task_metrics._queue_wait(
+        _request(sent_at=now - 60, eta=eta), now
+    ) == pytest.approx(2)
+    assert task_metrics._queue_wait(
+        _request(sent_at=now - 60, eta=eta.isoformat()), now
+    ) == pytest.approx(2)
+
+    # tasks started before their ETA did not wait
+    future = datetime.now(timezone.utc) + timedelta(minutes=1)
+    assert task_metrics._queue_wait(_request(sent_at=now - 60, eta=future), now) == 0
+
+
+def test_publish_header(metrics):
+    """Test the measured tasks are published with their publication time."""
+    headers = {}
+    before_task_publish.send(sender="tests.measured.add", headers=headers)
+    assert headers[task_metrics.SENT_AT_HEADER] == pytest.approx(time.time(), abs=5)
+
+    headers = {}
+    before_task_publish.send(sender="tests.other.add", headers=headers)
+    assert headers == {}
+
+
+def test_task_states(metrics, recorder, celery_app):
+    """Test the task runs are observed per final state."""
+    sent_at = time.time() - 5
+    headers = {task_metrics.SENT_AT_HEADER: sent_at}
+    assert celery_app.tasks["tests.measured.add"].apply((1, 2), headers=headers).get()
+    celery_app.tasks["tests.measured.add"].apply((1, 2))
+    celery_app.tasks["tests.measured.fail"].apply()
+    celery_app.tasks["tests.measured.retry"].apply()
+    celery_app.tasks["tests.other.add"].apply((1, 2))
+    assert metrics._running == {}
+
+    with metrics.app.app_context():
+        recorder.flush()
+    histograms = recorder.collect()
+    assert set(histograms) == {
+        ("tests.measured.add", "SUCCESS"),
+        ("tests.measured.add", task_metrics.QUEUE_WAIT),
+        ("tests.measured.fail", "FAILURE"),
+        ("tests.measured.retry", "RETRY"),
+        ("tests.measured.retry", "SUCCESS"),
+    }
+    assert histograms[("tests.measured.add", "SUCCESS")]["count"] == 2
+    queue_wait = histograms[("tests.measured.add", task_metrics.QUEUE_WAIT)]
+    assert queue_wait["count"] == 1
+    assert queue_wait["sum"] >= 5
+
+
+def test_shutdown_flush(metrics, recorder, celery_app):
+    """Test the histograms are merged when a worker process stops."""
+    celery_app.tasks["tests.measured.add"].apply((1, 2))
+    assert recorder.collect() == {}
+
+    worker_process_shutdown.send(sender=None, pid=1, exitcode=0)
+    assert recorder.collect()[("tests.measured.add", "SUCCESS")]["count"] == 1
+
+
+def test_formatted_response():
+    """Test failures and retries are exposed as counters as well."""
+    histogram = {"buckets": {1: 2, "+Inf": 3}, "sum": 4.0, "count": 3}
+    response = task_metrics.formatted_response(
+        {
+            ("tests.measured.add", "SUCCESS"): histogram,
+            ("tests.measured.add", "FAILURE"): histogram,
+            ("tests.measured.add", "RETRY"): {**histogram, "count": 1},
+            ("tests.measured.add", task_metrics.QUEUE_WAIT): histogram,
+        }
+    )
+    lines = response.splitlines()
+    assert "# TYPE zenodo_celery_task_failures_total counter" in lines
+    assert 'zenodo_celery_task_failures_total{task="tests.measured.add"} 3' in lines
+    assert 'zenodo_celery_task_retries_total{task="tests.measured.add"} 1' in lines
+    assert (
+        "zenodo_celery_task_duration_seconds_count"
+        '{task="tests.measured.add",state="FAILURE"} 3'
+    ) in lines
+    assert (
+        'zenodo_celery_task_queue_wait_seconds_sum{task="tests.measured.add"} 4.0'
+        in lines
+    )
+    assert 'state="queue_wait"' not in response
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# Zenodo-RDM is free software; you can redistribute it and/or modify
+# it under the terms of the MIT License; see LICENSE file for more details.
+"""Test the OpenAIRE communities."""
+
+from copy import deepcopy
+from unittest.mock import patch
+
+import pytest
+from invenio_access.permissions import system_identity
+from invenio_cache import current_cache
+from invenio_communities import current_communities
+from invenio_communities.communities.records.api import Community
+from invenio_communities.communities.records.models import CommunityMetadata
+from invenio_communities.communities.records.systemfields.deletion_status import (
+    CommunityDeletionStatusEnum,
+)
+from invenio_db import db
+
+from zenodo_rdm.openaire.communities import CACHE_KEY, ecfunded_community_ids
+from zenodo_rdm.openaire.utils import OA_PUBLICATION, is_openaire_publication
+
+
+@pytest.fixture(scope="function")
+def ecfunded_cache(running_app):
+    """Clear the cached IDs of the ``ecfunded`` communities."""
+    current_cache.delete(CACHE_KEY)
+    yield
+    current_cache.delete(CACHE_KEY)
+
+
+@pytest.fixture(scope="function")
+def publication(minimal_record):
+    """Restricted publication, without funding."""
+    r = deepcopy(minimal_record)
+    r["metadata"]["resource_type"] = {"id": "publication"}
+    r["access"] = {"record": "restricted", "files": "restricted"}
+    return r
+
+
+def _in_communities(record, *communities):
+    """Add the record to the communities."""
+    record["parent"] = {"communities": {"ids": [str(c.id) for c in communities]}}
+    return record
+
+
+def test_ecfunded_community_created(
+    ecfunded_cache,
+    community_type_record,
+    community_owner,
+    ec_funded_community_data,
+    publication,
+):
+    """Test a created ``ecfunded`` community is resolved, after a cached miss."""
+    assert ecfunded_community_ids() == set()
+
+    community = current_communities.service.create(
+        community_owner.identity, ec_funded_community_data
+    )
+    Community.index.refresh()
+
+    assert ecfunded_community_ids() == {str(community.id)}
+    assert is_openaire_publication(
+        _in_communities(publication, community), OA_PUBLICATION
+    )
+
+
+def test_ecfunded_community_renamed(ecfunded_cache, ec_funded_community, publication):
+    """Test a renamed ``ecfunded`` community is no longer resolved."""
+    record = _in_communities(publication, ec_funded_community)
+    assert ecfunded_community_ids() == {str(ec_funded_community.id)}
+    assert is_openaire_publication(record, OA_PUBLICATION)
+
+    current_communities.service.rename(
+        system_identity, str(ec_funded_community.id), {"slug": "ecfunded-old"}
+    )
+    Community.index.refresh()
+
+    assert ecfunded_community_ids() == set()
+    assert not is_openaire_publication(record, OA_PUBLICATION)
+
+    current_communities.service.rename(
+        system_identity, str(ec_funded_community.id), {"slug": "ecfunded"}
+    )
+    Community.index.refresh()
+
+    assert ecfunded_community_ids() == {str(ec_funded_community.id)}
+    assert is_openaire_publication(record, OA_PUBLICATION)
+
+
+def test_ecfunded_community_updated(
+    ecfunded_cache, ec_funded_community, ec_funded_community_data, publication
+):
+    """Test an ``ecfunded`` community updated without renaming is still resolved."""
+    record = _in_communities(publication, ec_funded_community)
+    assert ecfunded_community_ids() == {str(ec_funded_community.id)}
+
+    data = deepcopy(ec_funded_community_data)
+    data["metadata"]["title"] = "European Commission Funded Research"
+    current_communities.service.update(system_identity, ec_funded_community.id, data)
+    Community.index.refresh()
+
+    assert ecfunded_community_ids() == {str(ec_funded_community.id)}
+    assert is_openaire_publication(record, OA_PUBLICATION)
+
+
+def test_ecfunded_community_deleted(ecfunded_cache, ec_funded_community, publication):
+    """Test a soft-deleted ``ecfunded`` community is no longer resolved."""
+    record = _in_communities(publication, ec_funded_community)
+    assert ecfunded_community_ids() == {str(ec_funded_community.id)}
+
+    model = CommunityMetadata.query.filter_by(slug="ecfunded").one()
+    model.deletion_status = CommunityDeletionStatusEnum.DELETED
+    db.session.commit()
+
+    assert ecfunded_community_ids() == set()
+    assert not is_openaire_publication(record, OA_PUBLICATION)
+
+    model.deletion_status = CommunityDeletionStatusEnum.PUBLISHED
+    db.session.commit()
+    assert ecfunded_community_ids() == {str(ec_funded_community.id)}
+
+
+def test_ecfunded_community_ids_ttl(running_app, monkeypatch):
+    """Test the resolved IDs are cached for a finite time."""
+    monkeypatch.setitem(running_app.app.config, "OPENAIRE_COMMUNITIES_CACHE_TTL", 60)
+    with patch("zenodo_rdm.openaire.communities.current_cache") as cache:
+        cache.get.return_value = None
+        ecfunded_community_ids()
+    cache.set.assert_called_once()
+    assert cache.set.call_args.kwargs["timeout"] == 60
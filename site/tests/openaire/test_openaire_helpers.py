@@ -15,6 +15,7 @@ from zenodo_rdm.openaire.utils import (
     OA_OTHER,
     OA_PUBLICATION,
     OA_SOFTWARE,
+    get_resource_type_vocabulary,
     openaire_link,
     openaire_type,
 )
@@ -88,6 +89,25 @@ def test_funded_publication_serialization(
     assert openaire_type(r) is None
 
 
+def test_openaire_type_cached(running_app, minimal_open_record):
+    """Test the OpenAIRE type is computed once per record revision."""
+    r = deepcopy(minimal_open_record)
+    r["id"] = "abcd-1234"
+    r["revision_id"] = 1
+    r["metadata"]["resource_type"] = {"id": "publication"}
+    assert openaire_type(r) == OA_PUBLICATION
+
+    # same revision
+    r["access"] = {"record": "restricted", "files": "restricted"}
+    assert openaire_type(r) == OA_PUBLICATION
+
+    r["revision_id"] = 2
+    assert openaire_type(r) is None
+
+    vocab = get_resource_type_vocabulary("publication")
+    assert get_resource_type_vocabulary("publication") is vocab
+
+
 @pytest.mark.parametrize(
     "resource_type,oatype",
     [
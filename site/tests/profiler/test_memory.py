@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the memory allocation profiling."""
+
+import tracemalloc
+
+from zenodo_rdm.profiler.memory import MemoryProfiler
+
+
+def _allocate(count):
+    """Allocate blocks of 1 kB."""
+    return [bytearray(1024) for _ in range(count)]
+
+
+def test_request_allocations():
+    """Test only the allocations of the request are reported."""
+    before = _allocate(2000)
+    profiler = MemoryProfiler(top=5)
+    assert profiler.start()
+    during = _allocate(1000)
+    freed = _allocate(3000)
+    del freed
+    profiler.stop()
+
+    assert not tracemalloc.is_tracing()
+    assert 1000 * 1024 <= profiler.size < 2000 * 1024
+    assert profiler.peak >= 4000 * 1024
+    top, *_ = profiler.top_stats()
+    assert top["file"] == __file__
+    assert top["line"] == _allocate.__code__.co_firstlineno + 2
+    assert top["count"] >= 1000
+    # the allocations before the request are not reported
+    assert 1000 * 1024 <= top["size"] < 2000 * 1024
+    assert len(before) == 2000 and len(during) == 1000
+
+
+def test_overlapping_requests():
+    """Test the memory profilers of overlapping requests are not started."""
+    first, second = MemoryProfiler(), MemoryProfiler()
+    assert first.start()
+    assert not second.start()
+    first.stop()
+
+    assert second.start()
+    second.stop()
+
+
+def test_already_tracing():
+    """Test the tracing started outside of the profiler is not stopped."""
+    tracemalloc.start()
+    try:
+        profiler = MemoryProfiler()
+        assert profiler.start()
+        profiler.stop()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
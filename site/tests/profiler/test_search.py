@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the OpenSearch requests profiling."""
+
+import json
+import threading
+
+import pytest
+from opensearchpy import Transport
+
+from zenodo_rdm.profiler import search
+from zenodo_rdm.profiler.reports import dump_search_profile, load_search_profile
+from zenodo_rdm.profiler.search import SearchProfiler
+
+RESPONSE = {"took": 5, "hits": {"total": {"value": 3}, "hits": []}}
+
+
+@pytest.fixture()
+def transport(monkeypatch):
+    """OpenSearch transport, returning a fixed response to all requests."""
+    requests = []
+
+    def _perform_request(transport, method, url, params=None, body=None, **kwargs):
+        requests.append((method, url))
+        return RESPONSE
+
+    monkeypatch.setattr(Transport, "perform_request", _perform_request)
+    transport = Transport.__new__(Transport)
+    transport.requests = requests
+    return transport
+
+
+def test_search_profiler(transport, monkeypatch):
+    """Test the requests of the current thread are recorded while started."""
+    profiler = SearchProfiler()
+    transport.perform_request("GET", "/records/_search", body={"query": {}})
+    profiler.start()
+    try:
+        with monkeypatch.context() as m:
+            # the responses are not serialized in the profiled request
+            m.setattr(search, "json", None)
+            transport.perform_request(
+                "POST", "/records/_search", params={"size": 10}, body={"query": {}}
+            )
+            other = threading.Thread(
+                target=transport.perform_request, args=("GET", "/communities/_search")
+            )
+            other.start()
+            other.join()
+            transport.perform_request("GET", "/records/_doc/1")
+    finally:
+        profiler.stop()
+    transport.perform_request("GET", "/records/_search", body={"query": {}})
+
+    assert len(transport.requests) == 5
+    assert [(q.method, q.url) for q in profiler.queries] == [
+        ("POST", "/records/_search"),
+        ("GET", "/records/_doc/1"),
+    ]
+    query = profiler.queries[0]
+    assert query.index == "records"
+    assert query.params == {"size": 10}
+    assert query.is_search and not profiler.queries[1].is_search
+    assert (query.took, query.hits) == (5, 3)
+    assert query.size == len(json.dumps(RESPONSE))
+
+
+def test_dump_search_profile(transport):
+    """Test the stored requests, with the size of their response."""
+    profiler = SearchProfiler()
+    profiler.start()
+    try:
+        transport.perform_request("POST", "/records/_search", body={"query": {}})
+    finally:
+        profiler.stop()
+
+    (query,) = load_search_profile(dump_search_profile(profiler))
+    assert query["url"] == "/records/_search"
+    assert query["body"] == {"query": {}}
+    assert (query["took"], query["hits"]) == (5, 3)
+    assert query["size"] == len(json.dumps(RESPONSE))
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the storage of the profiling sessions."""
+
+import sqlite3
+from datetime import datetime
+
+from flask import Flask
+
+from zenodo_rdm.profiler import Profiler
+
+
+def test_previous_schema_session_files(tmp_path):
+    """Test the session files of a previous schema do not break the sessions."""
+    # session file of the HTML reports schema
+    conn = sqlite3.connect(tmp_path / "old.db")
+    conn.execute(
+        "CREATE TABLE session_requests "
+        "(id INTEGER PRIMARY KEY, ts DATETIME, context JSON, "
+        "base_report TEXT, sql_report TEXT)"
+    )
+    conn.execute(
+        "INSERT INTO session_requests VALUES "
+        "(1, '2023-01-01 00:00:00', '{}', '<html></html>', NULL)"
+    )
+    conn.commit()
+    conn.close()
+
+    app = Flask("test")
+    app.config.update(PROFILER_STORAGE=tmp_path)
+    profiler = Profiler(app)
+    with app.app_context():
+        assert profiler.profiler_sessions == {"old": []}
+        assert profiler.get_request_report("old", 1, "base") is None
+
+        profiler.write_session_request(
+            "old",
+            tmp_path,
+            ts=datetime.utcnow(),
+            context={"endpoint": "records"},
+            profilers={},
+        )
+        (entry,) = profiler.get_session_entries("old")
+        assert entry.context == {"endpoint": "records"}
+        assert not entry.has_base_report
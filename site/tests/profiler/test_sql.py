@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the SQL query fingerprints of profiling sessions."""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from zenodo_rdm.profiler import Profiler
+from zenodo_rdm.profiler.sql import aggregate_queries, fingerprint
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        (
+            "SELECT * FROM users WHERE id = 42 AND email = 'a@b.org'",
+            "SELECT * FROM users WHERE id = ? AND email = ?",
+        ),
+        (
+            "SELECT * FROM users WHERE name = 'O''Brien' AND score > 1.5",
+            "SELECT * FROM users WHERE name = ? AND score > ?",
+        ),
+        (
+            "SELECT * FROM t WHERE a = %(a_1)s AND b = %s AND c = :c AND d = $1",
+            "SELECT * FROM t WHERE a = ? AND b = ? AND c = ? AND d = ?",
+        ),
+        (
+            "SELECT * FROM t -- comment\nWHERE /* inline */ a = 1",
+            "SELECT * FROM t WHERE a = ?",
+        ),
+        # casts and column names with digits are kept
+        (
+            "SELECT t1.col2 FROM t1 WHERE t1.id = %(id)s::uuid",
+            "SELECT t1.col2 FROM t1 WHERE t1.id = ?::uuid",
+        ),
+    ],
+)
+def test_fingerprint_literals(query, expected):
+    """Test the literals and parameters are replaced."""
+    assert fingerprint(query) == expected
+
+
+def test_fingerprint_in_lists():
+    """Test the lists of values of ``IN`` clauses are collapsed."""
+    one = fingerprint("SELECT * FROM t WHERE id IN (1)")
+    many = fingerprint("SELECT * FROM t WHERE id in ( %(id_1)s, %(id_2)s,\n 'x' )")
+    assert one == "SELECT * FROM t WHERE id IN (?+)"
+    assert many == "SELECT * FROM t WHERE id IN (?+)"
+    # sub-queries are not collapsed
+    assert fingerprint("SELECT * FROM t WHERE id IN (SELECT id FROM u)") == (
+        "SELECT * FROM t WHERE id IN (SELECT id FROM u)"
+    )
+
+
+def _query(text, rowcount=1, duration=0.01):
+    """Query stats, as recorded by ``sqltap``."""
+    return SimpleNamespace(
+        text=text,
+        params={},
+        stack=[],
+        start_time=0,
+        end_time=duration,
+        duration=duration,
+        rowcount=rowcount,
+    )
+
+
+def test_aggregate_queries():
+    """Test the queries are aggregated by fingerprint."""
+    queries = [_query(f"SELECT * FROM t WHERE id = {i}") for i in range(3)]
+    queries.append(_query("UPDATE t SET a = 1", rowcount=-1, duration=0.5))
+
+    assert aggregate_queries(queries) == {
+        "SELECT * FROM t WHERE id = ?": {
+            "count": 3,
+            "rows": 3,
+            "duration": pytest.approx(0.03),
+        },
+        "UPDATE t SET a = ?": {"count": 1, "rows": 0, "duration": 0.5},
+    }
+
+
+def test_n_plus_one_threshold(tmp_path):
+    """Test the fingerprints repeated over the threshold in a request are flagged."""
+    app = Flask("test")
+    app.config.update(PROFILER_STORAGE=tmp_path, PROFILER_N_PLUS_ONE_THRESHOLD=3)
+    profiler = Profiler(app)
+
+    def _request(endpoint, repeats):
+        queries = [_query(f"SELECT * FROM t WHERE id = {i}") for i in range(repeats)]
+        queries.append(_query("SELECT * FROM u"))
+        profiler.write_session_request(
+            "session",
+            tmp_path,
+            ts=datetime.utcnow(),
+            context={"endpoint": endpoint},
+            profilers={"sql": queries},
+        )
+
+    with app.app_context():
+        _request("records", 3)
+        _request("records", 4)
+        _request("search", 2)
+
+        queries = {q["fingerprint"]: q for q in profiler.get_session_queries("session")}
+        assert queries["SELECT * FROM t WHERE id = ?"]["count"] == 9
+        assert queries["SELECT * FROM t WHERE id = ?"]["n_plus_one"] is True
+        assert queries["SELECT * FROM u"]["n_plus_one"] is False
+
+        by_endpoint = {
+            (q["endpoint"], q["fingerprint"]): q["n_plus_one"]
+            for q in profiler.get_session_queries("session", by_endpoint=True)
+        }
+        assert by_endpoint[("records", "SELECT * FROM t WHERE id = ?")] is True
+        assert by_endpoint[("search", "SELECT * FROM t WHERE id = ?")] is False
+
+        entries = profiler.get_session_entries("session").all()
+        assert [e.n_plus_one for e in entries] == [None, 4, None]
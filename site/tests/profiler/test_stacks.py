@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the call stack aggregation of profiling sessions."""
+
+import time
+
+import pyinstrument
+import pytest
+from pyinstrument.session import Session
+
+from zenodo_rdm.profiler.reports import dump_base_profile, load_base_profile
+from zenodo_rdm.profiler.stacks import (
+    collapse_session,
+    frame_name,
+    to_collapsed,
+    to_flamegraph,
+    to_speedscope,
+)
+
+
+def _frame(function, path, line):
+    return f"{function}\x00{path}\x00{line}"
+
+
+ROOT = _frame("root", "/app/lib/python3.9/site-packages/zenodo_rdm/views.py", 10)
+QUERY = _frame("query", "/app/lib/python3.9/site-packages/sqlalchemy/orm.py", 20)
+RENDER = _frame("render", "/app/lib/python3.9/site-packages/jinja2/env.py", 30)
+THREAD = _frame("MainThread", "<thread>", 140228975537024)
+
+
+@pytest.fixture()
+def recorded_session():
+    """Recorded pyinstrument session."""
+    return Session.from_json(
+        {
+            "frame_records": [
+                [[THREAD, ROOT, QUERY], 0.002],
+                [[THREAD, ROOT, RENDER + "\x01l42"], 0.001],
+                [[THREAD, ROOT, QUERY], 0.003],
+                [[THREAD, ROOT], 0.0005],
+                [[THREAD], 0.001],
+            ],
+            "start_time": 0,
+            "duration": 0.0075,
+            "sample_count": 5,
+            "start_call_stack": [],
+            "program": "test",
+            "cpu_time": 0.0075,
+        }
+    )
+
+
+def test_frame_name():
+    """Test the names of the frames are relative to the installation directory."""
+    assert frame_name(ROOT) == "root (zenodo_rdm/views.py:10)"
+    assert frame_name(RENDER + "\x01l42") == "render (jinja2/env.py:30)"
+    assert frame_name(_frame("f", "/src/app.py", 1)) == "f (/src/app.py:1)"
+
+
+def test_collapse_session(recorded_session):
+    """Test the samples are merged by call stack, without the thread frames."""
+    root, query = "root (zenodo_rdm/views.py:10)", "query (sqlalchemy/orm.py:20)"
+    render = "render (jinja2/env.py:30)"
+    assert collapse_session(recorded_session) == {
+        f"{root};{query}": 5000,
+        f"{root};{render}": 1000,
+        root: 500,
+    }
+
+
+def test_collapse_stored_session(recorded_session):
+    """Test the stacks of a stored session are the same as of the recorded one."""
+    stored = load_base_profile(dump_base_profile(recorded_session))
+    assert collapse_session(stored) == collapse_session(recorded_session)
+
+
+def test_collapse_profiled_session():
+    """Test the stacks of a profiled function, and of its stored session."""
+    profiler = pyinstrument.Profiler(interval=0.001)
+    profiler.start()
+    end = time.perf_counter() + 0.05
+    while time.perf_counter() < end:
+        pass
+    session = profiler.stop()
+
+    stacks = collapse_session(session)
+    assert stacks
+    assert any("test_collapse_profiled_session" in stack for stack in stacks)
+    assert collapse_session(load_base_profile(dump_base_profile(session))) == stacks
+
+
+def test_to_collapsed():
+    """Test the collapsed format, one stack and weight per line."""
+    assert to_collapsed({"a;b": 3, "a": 1}) == "a;b 3\na 1\n"
+
+
+def test_to_flamegraph(recorded_session):
+    """Test the flamegraph tree adds up the weights of the stacks."""
+    tree = to_flamegraph(collapse_session(recorded_session), name="endpoint")
+
+    assert tree["name"] == "endpoint"
+    assert tree["value"] == 6500
+    (root,) = tree["children"]
+    assert root["name"] == "root (zenodo_rdm/views.py:10)"
+    assert root["value"] == 6500
+    assert {c["name"]: c["value"] for c in root["children"]} == {
+        "query (sqlalchemy/orm.py:20)": 5000,
+        "render (jinja2/env.py:30)": 1000,
+    }
+    assert all(c["children"] == [] for c in root["children"])
+
+
+def test_to_speedscope(recorded_session):
+    """Test the speedscope profile is the same stacks, as frame indices."""
+    stacks = collapse_session(recorded_session)
+    profile = to_speedscope(stacks, name="endpoint")
+
+    frames = [f["name"] for f in profile["shared"]["frames"]]
+    assert len(frames) == len(set(frames)) == 3
+    (sampled,) = profile["profiles"]
+    assert sampled["type"] == "sampled"
+    assert sampled["endValue"] == 6500
+
+    # round trip, from the samples back to the stacks
+    decoded = {
+        ";".join(frames[i] for i in sample): weight
+        for sample, weight in zip(sampled["samples"], sampled["weights"])
+    }
+    assert decoded == stacks
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the profiling of Celery tasks."""
+
+import pytest
+from celery import Celery
+from celery.signals import task_postrun, task_prerun
+from flask import Flask
+
+from zenodo_rdm.profiler import Profiler
+
+
+@pytest.fixture()
+def profiled_app(tmp_path):
+    """Application profiling the ``tests.profiled.*`` tasks, synchronously."""
+    app = Flask("test")
+    app.config.update(
+        PROFILER_STORAGE=tmp_path,
+        PROFILER_ASYNC_WRITES=False,
+        PROFILER_TASKS={r"tests\.profiled\.": 1},
+        PROFILER_TASKS_SESSION={"id": "celery-tasks", "base": True, "sql": True},
+    )
+    Profiler(app)
+    yield app
+    task_prerun.disconnect(dispatch_uid="zenodo_rdm.profiler.ext")
+    task_postrun.disconnect(dispatch_uid="zenodo_rdm.profiler.ext")
+
+
+@pytest.fixture()
+def celery_app():
+    """Celery application with a profiled and a skipped task."""
+    celery = Celery("test")
+
+    @celery.task(name="tests.profiled.add")
+    def add(x, y):
+        return x + y
+
+    @celery.task(name="tests.profiled.fail")
+    def fail():
+        raise ValueError("Failed task.")
+
+    @celery.task(name="tests.skipped.add")
+    def skipped_add(x, y):
+        return x + y
+
+    return celery
+
+
+def test_profiled_task(profiled_app, celery_app):
+    """Test the runs of the matching tasks are stored in the tasks session.
+
+    The tasks run outside of the application context, as in the workers.
+    """
+    profiler = profiled_app.extensions["profiler"]
+    assert celery_app.tasks["tests.profiled.add"].apply((1, 2)).get() == 3
+    celery_app.tasks["tests.profiled.fail"].apply()
+
+    with profiled_app.app_context():
+        entries = profiler.get_session_entries("celery-tasks").all()
+    assert [e.context["task"] for e in entries] == [
+        "tests.profiled.add",
+        "tests.profiled.fail",
+    ]
+    assert [e.context["state"] for e in entries] == ["SUCCESS", "FAILURE"]
+    assert entries[0].context["args"] == ["1", "2"]
+    assert entries[0].context["duration"] >= 0
+    assert entries[0].has_base_report and entries[0].has_sql_report
+    assert profiler._task_profilers == {}
+
+
+def test_skipped_task(profiled_app, celery_app):
+    """Test the tasks not matching the patterns are not profiled."""
+    profiler = profiled_app.extensions["profiler"]
+    assert celery_app.tasks["tests.skipped.add"].apply((1, 2)).get() == 3
+
+    assert profiler._task_profilers == {}
+    assert not (profiled_app.config["PROFILER_STORAGE"] / "celery-tasks.db").exists()
+
+
+def test_task_without_profiler(celery_app):
+    """Test the tasks run in applications without the profiler are not profiled."""
+    app = Flask("test")
+    assert celery_app.tasks["tests.profiled.add"].apply((1, 2)).get() == 3
+    assert "profiler" not in app.extensions
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the background writer of profiling reports."""
+
+import subprocess
+import sys
+import textwrap
+import threading
+from datetime import datetime
+
+from zenodo_rdm.profiler import Profiler
+from zenodo_rdm.profiler.models import SessionRequest
+from zenodo_rdm.profiler.writer import ReportWriter
+
+
+def test_writes_from_several_threads():
+    """Test the writes queued from several threads are all done on flush."""
+    writer = ReportWriter()
+    written = []
+
+    def _write(value):
+        written.append(value)
+
+    def _put(n):
+        for i in range(100):
+            writer.put(_write, value=(n, i))
+
+    threads = [threading.Thread(target=_put, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.flush()
+
+    assert sorted(written) == [(n, i) for n in range(8) for i in range(100)]
+
+
+def test_failed_writes_are_skipped():
+    """Test a failed write does not stop the writer."""
+    writer = ReportWriter()
+    written = []
+
+    def _fail():
+        raise ValueError("Failed write.")
+
+    def _write(value):
+        written.append(value)
+
+    writer.put(_fail)
+    writer.put(_write, value=1)
+    writer.flush()
+
+    assert written == [1]
+
+
+def test_flush_on_shutdown(tmp_path):
+    """Test the queued writes are done before the process exits."""
+    output = tmp_path / "output.txt"
+    script = textwrap.dedent(f"""
+        import time
+        from zenodo_rdm.profiler.writer import ReportWriter
+
+        def _write(path):
+            time.sleep(0.5)
+            with open(path, "w") as fp:
+                fp.write("written")
+
+        ReportWriter().put(_write, path={str(output)!r})
+        """)
+    subprocess.run([sys.executable, "-c", script], check=True, timeout=30)
+
+    assert output.read_text() == "written"
+
+
+def test_cached_session_engines(tmp_path):
+    """Test the session engines are cached and shared by concurrent writes."""
+    profiler = Profiler()
+    engine = profiler._engine(tmp_path / "session.db")
+    assert profiler._engine(tmp_path / "session.db") is engine
+
+    def _write(n):
+        for i in range(20):
+            profiler.write_session_request(
+                "session",
+                tmp_path,
+                ts=datetime.utcnow(),
+                context={"endpoint": f"endpoint-{n}"},
+                profilers={},
+            )
+
+    threads = [threading.Thread(target=_write, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    session = profiler._db_session("session", storage_dir=tmp_path)
+    assert session.query(SessionRequest).count() == 80
+    assert profiler._engines == {str(tmp_path / "session.db"): engine}
+    session.close()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Sitemap tests fixtures."""
+
+import gzip
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from zenodo_rdm.sitemap.generators import SitemapGenerator, _sitemapdtformat
+from zenodo_rdm.sitemap.pages import plan_update, publish_update, render_shard
+
+T0 = datetime(2023, 1, 1)
+
+
+class FakeGenerator(SitemapGenerator):
+    """Generator of rows kept in memory, keyed by integers."""
+
+    name = "fake"
+
+    def __init__(self, keys=()):
+        """Constructor."""
+        self.data = {key: {"updated": T0, "listed": True} for key in keys}
+
+    def change(self, key, listed=True):
+        """Insert or update a row."""
+        self.data[key] = {"updated": datetime.utcnow(), "listed": listed}
+
+    def rows(self, start=None, end=None):
+        """Listed rows with a key in ``[start, end)``, ordered by key."""
+        for key, row in sorted(self.data.items()):
+            if not row["listed"]:
+                continue
+            if start is not None and key < start:
+                continue
+            if end is not None and key >= end:
+                continue
+            yield key, row["updated"], str(key)
+
+    def boundaries(self, max_url_count):
+        """Keys splitting the rows into pages of at most ``max_url_count`` URLs."""
+        return [row[0] for row in self.rows()][::max_url_count]
+
+    def changed(self, since):
+        """Keys of the rows changed since a time."""
+        return [key for key, row in self.data.items() if row["updated"] >= since]
+
+    def url_templates(self):
+        """Record URLs."""
+        return lambda value: f"https://zenodo.org/records/{value}"
+
+    def entries(self, row, urls):
+        """Record URL."""
+        key, updated, value = row
+        yield {"loc": urls(value), "lastmod": _sitemapdtformat(updated)}
+
+
+@pytest.fixture()
+def sitemap(app, cache):
+    """Sitemap extension, with an empty cache."""
+    return app.extensions["zenodo-sitemap"]
+
+
+@pytest.fixture()
+def generator(sitemap, monkeypatch):
+    """Fake generator of the sitemap, with 25 rows keyed by multiples of 10."""
+    generator = FakeGenerator(range(10, 260, 10))
+    monkeypatch.setattr(sitemap, "generators", [generator])
+    monkeypatch.setitem(sitemap.app.config, "SITEMAP_UPDATE_OVERLAP", timedelta(0))
+    return generator
+
+
+@pytest.fixture()
+def update_sitemap(sitemap):
+    """Update the sitemap, rendering its shards in the current process."""
+
+    def _update(**kwargs):
+        with sitemap.app.test_request_context():
+            version, shards = plan_update(**kwargs)
+            for shard in range(shards):
+                render_shard(version, shard)
+            publish_update(version)
+        return version
+
+    return _update
+
+
+@pytest.fixture()
+def page_locs(sitemap):
+    """Get the URLs of a page of the active version, or ``None`` if missing."""
+
+    def _page_locs(page):
+        cached = sitemap.get_page(page)
+        if cached is None:
+            return None
+        xml = gzip.decompress(cached["data"]).decode("utf-8")
+        return re.findall(r"<loc>([^<]*)</loc>", xml)
+
+    return _page_locs
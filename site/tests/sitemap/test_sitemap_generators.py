@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the sitemap generators."""
+
+from datetime import datetime
+
+from flask import render_template, url_for
+
+from zenodo_rdm.sitemap.generators import URLTemplate, records_generator
+
+ENDPOINT = "invenio_app_rdm_records.record_detail"
+
+PIDS = [
+    "1234",
+    "10.5281/zenodo.1234",
+    "Zürich-ελληνικά-日本",
+    "a b?c#d%e&f+g=h",
+    "[x];y:z@w!$'()*,~",
+    "%2F%20",
+]
+
+
+def _render(urls):
+    """Render the sitemap page of the records, with the given URL builder."""
+    rows = [(i, datetime(2023, 1, 1), pid) for i, pid in enumerate(PIDS)]
+    urlset = [entry for row in rows for entry in records_generator.entries(row, urls)]
+    return render_template("zenodo_sitemap/sitemap.xml", urlset=urlset).encode()
+
+
+def test_url_template(app):
+    """Test the URLs built from the template are the same as with ``url_for``."""
+    with app.test_request_context():
+        template = URLTemplate(ENDPOINT, "pid_value", _external=True, _scheme="https")
+        assert template.template is not None
+
+        by_url_for = _render(
+            lambda value: url_for(
+                ENDPOINT, pid_value=value, _external=True, _scheme="https"
+            )
+        )
+        assert _render(template) == by_url_for
+        assert "Z%C3%BCrich".encode() in by_url_for
+
+
+def test_url_template_fallback(app):
+    """Test ``url_for`` is used when the URL cannot be templated."""
+    with app.test_request_context():
+        # the placeholder is in both the path and the query string
+        template = URLTemplate(ENDPOINT, "pid_value", q=URLTemplate.placeholder)
+        assert template.template is None
+        for pid in PIDS:
+            assert template(pid) == url_for(
+                ENDPOINT, pid_value=pid, q=URLTemplate.placeholder
+            )
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the incremental generation of the sitemap pages."""
+
+
+def _records(*keys):
+    return [f"https://zenodo.org/records/{key}" for key in keys]
+
+
+def _pages(sitemap):
+    return [
+        (page["id"], page["start"], page["count"])
+        for page in sitemap.get_state()["sections"]["fake"]
+    ]
+
+
+def _index(page_locs):
+    return [loc.rsplit("/", 1)[1] for loc in page_locs(0)]
+
+
+def test_full_update(sitemap, generator, update_sitemap, page_locs):
+    """Test the rows are split into pages of at most ``max_url_count`` URLs."""
+    update_sitemap(max_url_count=10)
+
+    assert _pages(sitemap) == [(1, None, 10), (2, 110, 10), (3, 210, 5)]
+    assert page_locs(1) == _records(*range(10, 110, 10))
+    assert page_locs(2) == _records(*range(110, 210, 10))
+    assert page_locs(3) == _records(*range(210, 260, 10))
+    assert _index(page_locs) == ["sitemap1.xml", "sitemap2.xml", "sitemap3.xml"]
+
+
+def test_changed_middle_page(sitemap, generator, update_sitemap, page_locs):
+    """Test only the page of a changed row is regenerated."""
+    update_sitemap(max_url_count=10)
+    previous = sitemap.get_active()["pages"]
+
+    generator.change(150)
+    update_sitemap(max_url_count=10)
+    pages = sitemap.get_active()["pages"]
+    assert pages[1] == previous[1]
+    assert pages[2] != previous[2]
+    assert pages[3] == previous[3]
+    assert pages[0] != previous[0]
+    assert page_locs(2) == _records(*range(110, 210, 10))
+
+    # without changes, only the index is regenerated
+    update_sitemap(max_url_count=10)
+    assert {k: v for k, v in sitemap.get_active()["pages"].items() if k} == {
+        k: v for k, v in pages.items() if k
+    }
+
+
+def test_split_page(sitemap, generator, update_sitemap, page_locs):
+    """Test a page grown over ``max_url_count`` URLs is split."""
+    update_sitemap(max_url_count=10)
+    previous = sitemap.get_active()["pages"]
+
+    for key in (115, 125, 135):
+        generator.change(key)
+    update_sitemap(max_url_count=10)
+
+    assert _pages(sitemap) == [(1, None, 10), (2, 110, 10), (4, 180, 3), (3, 210, 5)]
+    assert page_locs(2) == _records(110, 115, 120, 125, 130, 135, 140, 150, 160, 170)
+    assert page_locs(4) == _records(180, 190, 200)
+    assert sitemap.get_active()["pages"][3] == previous[3]
+    assert _index(page_locs) == [
+        "sitemap1.xml",
+        "sitemap2.xml",
+        "sitemap4.xml",
+        "sitemap3.xml",
+    ]
+
+
+def test_emptied_page(sitemap, generator, update_sitemap, page_locs):
+    """Test a page without rows left is dropped from the sitemap."""
+    update_sitemap(max_url_count=10)
+
+    for key in range(110, 210, 10):
+        generator.change(key, listed=False)
+    update_sitemap(max_url_count=10)
+
+    assert _pages(sitemap) == [(1, None, 10), (3, 210, 5)]
+    assert page_locs(2) is None
+    assert _index(page_locs) == ["sitemap1.xml", "sitemap3.xml"]
+
+    # the key range of the dropped page is covered by the previous page
+    generator.change(150)
+    update_sitemap(max_url_count=10)
+    assert _pages(sitemap) == [(1, None, 10), (4, 150, 1), (3, 210, 5)]
+    assert page_locs(4) == _records(150)
+
+
+def test_removed_rows(sitemap, generator, update_sitemap, page_locs):
+    """Test rows removed from the database are only dropped by a full update."""
+    update_sitemap(max_url_count=10)
+
+    del generator.data[150]
+    update_sitemap(max_url_count=10)
+    assert "https://zenodo.org/records/150" in page_locs(2)
+
+    update_sitemap(max_url_count=10, full=True)
+    assert page_locs(2) == _records(110, 120, 130, 140, 160, 170, 180, 190, 200)
+
+
+def test_max_url_count_change(sitemap, generator, update_sitemap, page_locs):
+    """Test changing ``max_url_count`` regenerates all the pages."""
+    update_sitemap(max_url_count=10)
+    previous = sitemap.get_active()["pages"]
+
+    update_sitemap(max_url_count=5)
+    pages = sitemap.get_active()["pages"]
+    assert all(pages[page] != previous[page] for page in previous)
+    assert [count for _, _, count in _pages(sitemap)] == [5, 5, 5, 5, 5]
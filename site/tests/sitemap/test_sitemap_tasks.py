@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the sitemap update tasks."""
+
+import pytest
+
+from zenodo_rdm.sitemap import tasks
+from zenodo_rdm.sitemap.errors import SitemapUpdateError
+from zenodo_rdm.sitemap.pages import plan_update, publish_update, render_shard
+
+
+@pytest.fixture()
+def chords(sitemap, generator, monkeypatch):
+    """Chords of the sharded updates, recorded instead of sent."""
+    chords = []
+    monkeypatch.setattr(
+        tasks, "chord", lambda header: lambda body: chords.append((list(header), body))
+    )
+    monkeypatch.setitem(sitemap.app.config, "SITEMAP_SHARDS", 2)
+    return chords
+
+
+def test_sharded_update(sitemap, chords, page_locs):
+    """Test the lock is held until the shards are rendered and published."""
+    tasks.update_sitemap_cache(max_url_count=10)
+    [(header, body)] = chords
+    version = body.args[0]
+    assert [shard.args for shard in header] == [(version, 0), (version, 1)]
+    assert not sitemap.acquire_lock()
+
+    for shard in header:
+        tasks.update_sitemap_shard(*shard.args)
+    tasks.publish_sitemap(*body.args)
+    assert sitemap.get_active()["version"] == version
+    assert len(page_locs(0)) == 3
+    assert sitemap.acquire_lock()
+
+
+def test_failed_shard(sitemap, chords):
+    """Test the lock is released if a shard of the update fails."""
+    tasks.update_sitemap_cache(max_url_count=10)
+    [(header, body)] = chords
+    assert body.task == tasks.publish_sitemap.name
+    [errback] = body.options["link_error"]
+    assert errback.task == tasks.release_sitemap_lock.name
+    assert not sitemap.acquire_lock()
+
+    tasks.release_sitemap_lock(*errback.args)
+    assert sitemap.acquire_lock()
+
+
+def test_missing_shard_result(sitemap, generator):
+    """Test an update with a shard not rendered is not published."""
+    with sitemap.app.test_request_context():
+        version, shards = plan_update(max_url_count=10, shards=2)
+        assert shards == 2
+        render_shard(version, 0)
+        with pytest.raises(SitemapUpdateError, match="Shard 1"):
+            publish_update(version)
+    assert sitemap.get_active() is None
+
+
+def test_missing_page_result(sitemap, generator):
+    """Test an update with a page missing from the shard results is not published."""
+    with sitemap.app.test_request_context():
+        version, _ = plan_update(max_url_count=10, shards=1)
+        render_shard(version, 0)
+        key = f"sitemap:{version}:shard:0:result"
+        result = sitemap.get_cache(key)
+        result.pop(2)
+        sitemap.set_cache(key, result)
+        with pytest.raises(SitemapUpdateError, match="Page 2"):
+            publish_update(version)
+    assert sitemap.get_active() is None
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the publication and garbage collection of the sitemap versions."""
+
+from zenodo_rdm.sitemap.ext import VERSIONS_KEY
+
+
+def _publish(sitemap, pages, shared=None):
+    """Publish a version with new pages, and pages shared with the active one."""
+    version = sitemap.begin_version()
+    writer = sitemap.page_writer(version)
+    keys = {page: writer.set_page(page, xml) for page, xml in pages.items()}
+    for page in shared or []:
+        keys[page] = sitemap.get_active()["pages"][page]
+    sitemap.publish(version, keys, {"version": version})
+    return version, keys
+
+
+def test_previous_version(sitemap):
+    """Test the pages of the previous version are kept for one publication."""
+    v1, keys1 = _publish(sitemap, {0: "index 1", 1: "page 1"})
+    v2, keys2 = _publish(sitemap, {0: "index 2", 1: "page 2"})
+
+    # requests that read the previous pointer can still get its pages
+    assert sitemap.get_cache(keys1[1])["etag"]
+    assert sitemap.get_cache(keys2[1])["etag"]
+    assert set(sitemap.get_cache(VERSIONS_KEY)) == {v1, v2}
+    assert sitemap.get_state() == {"version": v2}
+
+    v3, _ = _publish(sitemap, {0: "index 3", 1: "page 3"})
+    assert sitemap.get_cache(keys1[0]) is None
+    assert sitemap.get_cache(keys1[1]) is None
+    assert sitemap.get_cache(f"sitemap:{v1}:keys:main") is None
+    assert sitemap.get_cache(f"sitemap:{v1}:state") is None
+    assert sitemap.get_cache(keys2[1])["etag"]
+    assert set(sitemap.get_cache(VERSIONS_KEY)) == {v2, v3}
+
+
+def test_shared_pages(sitemap):
+    """Test the pages shared by later versions are kept with their version."""
+    v1, keys1 = _publish(sitemap, {0: "index 1", 1: "page 1", 2: "page 2"})
+    _publish(sitemap, {0: "index 2"}, shared=[1, 2])
+    _publish(sitemap, {0: "index 3", 2: "page 2 changed"}, shared=[1])
+    _publish(sitemap, {0: "index 4"}, shared=[1, 2])
+
+    assert sitemap.get_cache(keys1[0]) is None
+    assert sitemap.get_cache(keys1[2]) is None
+    assert sitemap.get_page(1) == sitemap.get_cache(keys1[1])
+    assert sitemap.get_cache(f"sitemap:{v1}:keys:main") == [keys1[1]]
+    assert v1 in sitemap.get_cache(VERSIONS_KEY)
+
+
+def test_unpublished_version(sitemap):
+    """Test the pages of an unpublished version are collected on publication."""
+    _publish(sitemap, {0: "index 1"})
+    failed = sitemap.begin_version(["main", "shard-0"])
+    key = sitemap.page_writer(failed, "shard-0").set_page(1, "page 1")
+
+    v3, _ = _publish(sitemap, {0: "index 3"})
+    assert v3 == failed + 1
+    assert sitemap.get_cache(key) is None
+    assert sitemap.get_cache(f"sitemap:{failed}:keys:shard-0") is None
+    assert failed not in sitemap.get_cache(VERSIONS_KEY)
+
+
+def test_clear_cache(sitemap):
+    """Test clearing the cache collects all the versions."""
+    _, keys1 = _publish(sitemap, {0: "index 1"})
+    _, keys2 = _publish(sitemap, {0: "index 2"})
+
+    sitemap.clear_cache()
+    assert sitemap.get_active() is None
+    assert sitemap.get_cache(keys1[0]) is None
+    assert sitemap.get_cache(keys2[0]) is None
+    assert sitemap.get_cache(VERSIONS_KEY) == {}
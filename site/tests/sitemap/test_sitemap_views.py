@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the sitemap views."""
+
+import gzip
+
+import pytest
+
+INDEX = '<?xml version="1.0" encoding="UTF-8"?><sitemapindex></sitemapindex>'
+PAGE = '<?xml version="1.0" encoding="UTF-8"?><urlset>Zürich</urlset>'
+
+
+@pytest.fixture()
+def published(sitemap):
+    """Published sitemap version, with an index and a page."""
+    version = sitemap.begin_version()
+    writer = sitemap.page_writer(version)
+    keys = {0: writer.set_page(0, INDEX), 1: writer.set_page(1, PAGE)}
+    sitemap.publish(version, keys, {})
+    return keys
+
+
+def test_gzip(client, published):
+    """Test the stored pages are served compressed to clients accepting gzip."""
+    res = client.get("/sitemap1.xml", headers={"Accept-Encoding": "gzip, deflate"})
+    assert res.status_code == 200
+    assert res.mimetype == "text/xml"
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(res.data) == PAGE.encode("utf-8")
+    assert "Accept-Encoding" in res.vary
+    assert res.get_etag()[0].endswith("-gzip")
+
+    res = client.get("/sitemap.xml", headers={"Accept-Encoding": "gzip"})
+    assert gzip.decompress(res.data) == INDEX.encode("utf-8")
+
+
+@pytest.mark.parametrize("accept_encoding", [None, "identity", "gzip;q=0"])
+def test_identity(client, published, accept_encoding):
+    """Test the pages are decompressed for clients not accepting gzip."""
+    headers = {"Accept-Encoding": accept_encoding} if accept_encoding else {}
+    res = client.get("/sitemap1.xml", headers=headers)
+    assert res.status_code == 200
+    assert "Content-Encoding" not in res.headers
+    assert res.data == PAGE.encode("utf-8")
+    assert "Accept-Encoding" in res.vary
+    assert not res.get_etag()[0].endswith("-gzip")
+
+
+def test_etag(client, published):
+    """Test the ETag of each encoding is validated."""
+    gzip_headers = {"Accept-Encoding": "gzip"}
+    gzip_etag = client.get("/sitemap1.xml", headers=gzip_headers).headers["ETag"]
+    etag = client.get("/sitemap1.xml").headers["ETag"]
+    assert gzip_etag != etag
+
+    res = client.get(
+        "/sitemap1.xml", headers={**gzip_headers, "If-None-Match": gzip_etag}
+    )
+    assert res.status_code == 304
+    assert res.data == b""
+    assert "Accept-Encoding" in res.vary
+    res = client.get("/sitemap1.xml", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+
+    # the ETag of an encoding does not validate the other one
+    res = client.get("/sitemap1.xml", headers={"If-None-Match": gzip_etag})
+    assert res.status_code == 200
+    assert res.data == PAGE.encode("utf-8")
+
+
+def test_last_modified(client, published):
+    """Test the last modification time is validated."""
+    last_modified = client.get("/sitemap1.xml").headers["Last-Modified"]
+    res = client.get("/sitemap1.xml", headers={"If-Modified-Since": last_modified})
+    assert res.status_code == 304
+
+
+def test_missing_page(client, sitemap):
+    """Test missing pages, or a missing sitemap, are not found."""
+    assert client.get("/sitemap.xml").status_code == 404
+    version = sitemap.begin_version()
+    sitemap.publish(version, {}, {})
+    assert client.get("/sitemap.xml").status_code == 404
+    assert client.get("/sitemap2.xml").status_code == 404
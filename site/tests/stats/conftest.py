@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Stats tests fixtures."""
+
+import pytest
+from invenio_access.permissions import system_identity
+from invenio_rdm_records.proxies import current_rdm_records_service as records_service
+from opensearch_dsl import AttrDict
+
+
+@pytest.fixture()
+def create_record(running_app, minimal_record):
+    """Factory of published records, with a title."""
+
+    def _create_record(title):
+        minimal_record["files"]["enabled"] = False
+        minimal_record["metadata"]["title"] = title
+        draft = records_service.create(system_identity, minimal_record)
+        return records_service.publish(system_identity, draft.id)
+
+    return _create_record
+
+
+@pytest.fixture()
+def make_event():
+    """Factory of stats events, as read from the search cluster."""
+
+    def _make_event(recid, timestamp="2023-01-01T00:00:00", **kwargs):
+        return AttrDict(
+            {
+                "recid": recid,
+                "timestamp": timestamp,
+                "unique_id": f"{recid}-{timestamp}",
+                "visitor_id": "0123456789abcdef0123456789abcdef",
+                "referrer": None,
+                **kwargs,
+            }
+        )
+
+    return _make_event
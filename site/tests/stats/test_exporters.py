@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the Piwik stats exporter."""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+import pytest
+from invenio_cache import current_cache
+from opensearch_dsl import AttrDict
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, ReadTimeoutError
+
+from zenodo_rdm.stats import exporters
+from zenodo_rdm.stats.errors import PiwikExportRequestError
+from zenodo_rdm.stats.exporters import (
+    BOOKMARK_KEY,
+    PiwikExporter,
+    _time_slices,
+    read_events,
+)
+
+
+def _record(recid):
+    return {"oai_id": f"oai:zenodo.org:{recid}", "title": f"Record {recid}"}
+
+
+@pytest.fixture()
+def fetched(monkeypatch):
+    """Recids fetched by the exporter, which are all registered but ``404``."""
+    fetched = []
+
+    def _fetch_records(recids):
+        if recids:
+            fetched.append(set(recids))
+        return {recid: _record(recid) for recid in recids if recid != "404"}
+
+    monkeypatch.setattr(exporters, "fetch_records", _fetch_records)
+    return fetched
+
+
+def test_build_chunk(app, make_event, fetched):
+    """Test the records of a chunk are fetched at once."""
+    chunk = [make_event("1"), make_event("2"), make_event("404"), make_event("1")]
+    with app.test_request_context():
+        query_strings = PiwikExporter()._build_chunk(chunk, OrderedDict(), 10)
+    assert fetched == [{"1", "2", "404"}]
+    # the events of records without a registered PID are skipped
+    assert [parse_qs(qs[1:])["action_name"] for qs in query_strings] == [
+        ["Record 1"],
+        ["Record 2"],
+        ["Record 1"],
+    ]
+
+
+def test_build_chunk_records_cache(app, make_event, fetched):
+    """Test the records cache keeps the most recently used records."""
+    exporter = PiwikExporter()
+    records = OrderedDict()
+    with app.test_request_context():
+        for recid in ("1", "2", "404", "1", "3", "2", "1"):
+            exporter._build_chunk([make_event(recid)], records, max_records=3)
+    assert fetched == [{"1"}, {"2"}, {"404"}, {"3"}, {"2"}]
+    assert list(records) == ["3", "2", "1"]
+
+
+class _FakeSession:
+    """Fake Piwik session, failing the requests with events at some timestamps."""
+
+    def __init__(self, failed=()):
+        self.failed = set(failed)
+        self.lock = threading.Lock()
+        self.tracked = []
+
+    def post(self, url, json, timeout):
+        timestamps = [parse_qs(qs[1:])["cdt"][0] for qs in json["requests"]]
+        if self.failed.intersection(timestamps):
+            # the failed request is answered after the next ones
+            time.sleep(0.2)
+            return SimpleNamespace(status_code=503, ok=False)
+        with self.lock:
+            self.tracked.extend(timestamps)
+        response = {"status": "success", "tracked": len(timestamps), "invalid": 0}
+        return SimpleNamespace(status_code=200, ok=True, json=lambda: response)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture()
+def piwik_session(app, cache, monkeypatch):
+    """Fake Piwik session of the exporter, submitting chunks of 2 events."""
+    session = _FakeSession()
+    monkeypatch.setattr(PiwikExporter, "_session", staticmethod(lambda config: session))
+    monkeypatch.setitem(
+        app.config,
+        "STATS_PIWIK_EXPORTER",
+        {**app.config["STATS_PIWIK_EXPORTER"], "chunk_size": 2, "concurrency": 4},
+    )
+    return session
+
+
+def _timestamp(i):
+    return f"2023-01-01T00:00:{i:02d}"
+
+
+def test_export(app, make_event, fetched, piwik_session):
+    """Test all the events are exported, and the bookmark set to the last one."""
+    events = [make_event(str(i), timestamp=_timestamp(i)) for i in range(10)]
+    with app.test_request_context():
+        PiwikExporter()._export(iter(events), update_bookmark=True)
+    assert sorted(piwik_session.tracked) == [_timestamp(i) for i in range(10)]
+    assert current_cache.get(BOOKMARK_KEY) == _timestamp(9)
+
+
+def test_export_failed_chunk(app, make_event, fetched, piwik_session):
+    """Test the bookmark stops before a failed chunk, even if later ones succeed."""
+    events = [make_event(str(i), timestamp=_timestamp(i)) for i in range(10)]
+    # the events 4 and 5 are the third chunk
+    piwik_session.failed = {_timestamp(5)}
+    with app.test_request_context():
+        with pytest.raises(PiwikExportRequestError) as exc_info:
+            PiwikExporter()._export(iter(events), update_bookmark=True)
+    assert exc_info.value.extra["begin_event_timestamp"] == _timestamp(4)
+    assert _timestamp(7) in piwik_session.tracked
+    assert current_cache.get(BOOKMARK_KEY) == _timestamp(3)
+
+
+def test_session_retries():
+    """Test only the connection errors and unprocessed statuses are retried."""
+    session = PiwikExporter._session({"max_retries": 3, "backoff_factor": 0})
+    retry = session.get_adapter("https://analytics.openaire.eu").max_retries
+    assert retry.is_retry("POST", 429)
+    assert retry.is_retry("POST", 503)
+    # the events of failed or timed out requests may have been tracked already
+    for status in (400, 500, 502, 504):
+        assert not retry.is_retry("POST", status)
+
+    url = "/piwik.php"
+    retry = retry.increment("POST", url, error=ConnectTimeoutError())
+    assert retry.connect == 2
+    # the events of a request that timed out may have been tracked
+    with pytest.raises(MaxRetryError):
+        retry.increment("POST", url, error=ReadTimeoutError(None, url, "Timed out."))
+
+
+class _Hit(AttrDict):
+    """Search hit of an event, sorted by timestamp and unique ID."""
+
+    def __init__(self, event):
+        super().__init__(event)
+        sort = [event["timestamp"], event["unique_id"]]
+        object.__setattr__(self, "meta", SimpleNamespace(sort=sort))
+
+
+class _FakeSearch:
+    """Fake search of the events, supporting ``search_after`` on a time range."""
+
+    events = []
+    failed = None
+    requests = []
+
+    def __init__(self, using=None, index=None):
+        self.range, self.size, self.after = None, 10, None
+
+    def _clone(self, **kwargs):
+        clone = _FakeSearch()
+        clone.__dict__.update(self.__dict__, **kwargs)
+        return clone
+
+    def sort(self, *args):
+        return self._clone()
+
+    def params(self, **kwargs):
+        return self._clone()
+
+    def filter(self, kind, timestamp):
+        return self._clone(range=timestamp)
+
+    def extra(self, size=None, search_after=None):
+        return self._clone(size=size or self.size, after=search_after or self.after)
+
+    def _in_range(self, ts):
+        if ts < self.range["gte"]:
+            return False
+        if "lt" in self.range:
+            return ts < self.range["lt"]
+        return ts <= self.range["lte"]
+
+    def execute(self):
+        _FakeSearch.requests.append(self.range)
+        if self.range["gte"] == _FakeSearch.failed:
+            raise ConnectionError("Search failed.")
+        hits = sorted(
+            (
+                e
+                for e in _FakeSearch.events
+                if self._in_range(e["timestamp"])
+                and (not self.after or [e["timestamp"], e["unique_id"]] > self.after)
+            ),
+            key=lambda e: (e["timestamp"], e["unique_id"]),
+        )
+        return SimpleNamespace(hits=[_Hit(e) for e in hits[: self.size]])
+
+
+@pytest.fixture()
+def search(app, monkeypatch):
+    """Fake search of the events, read in slices of 15 minutes, in pages of 2."""
+    monkeypatch.setattr(exporters, "Search", _FakeSearch)
+    monkeypatch.setattr(_FakeSearch, "events", [])
+    monkeypatch.setattr(_FakeSearch, "failed", None)
+    monkeypatch.setattr(_FakeSearch, "requests", [])
+    monkeypatch.setitem(
+        app.config,
+        "STATS_PIWIK_EXPORTER",
+        {
+            **app.config["STATS_PIWIK_EXPORTER"],
+            "readers": 3,
+            "slice_minutes": 15,
+            "page_size": 2,
+            "read_ahead": 1,
+        },
+    )
+    return _FakeSearch
+
+
+T0 = datetime(2023, 1, 1)
+
+
+def _at(minutes, seconds=0):
+    return (T0 + timedelta(minutes=minutes, seconds=seconds)).isoformat()
+
+
+def test_time_slices():
+    """Test the slices are consecutive, and only the last one includes its end."""
+    assert _time_slices(T0, T0 + timedelta(hours=1), timedelta(minutes=30)) == [
+        {"gte": _at(0), "lt": _at(30)},
+        {"gte": _at(30), "lte": _at(60)},
+    ]
+    assert _time_slices(T0, T0 + timedelta(minutes=40), timedelta(minutes=15)) == [
+        {"gte": _at(0), "lt": _at(15)},
+        {"gte": _at(15), "lt": _at(30)},
+        {"gte": _at(30), "lte": _at(40)},
+    ]
+    assert _time_slices(T0, T0, timedelta(minutes=15)) == [
+        {"gte": _at(0), "lte": _at(0)}
+    ]
+
+
+def test_read_events(app, make_event, search):
+    """Test the events are read once each, in timestamp order."""
+    timestamps = [
+        _at(0),
+        _at(0),
+        _at(0),
+        _at(14, 59),
+        _at(15),
+        _at(15),
+        _at(29, 59),
+        _at(30),
+        _at(44, 59),
+        _at(45),
+        _at(60),
+        _at(60),
+        _at(60, 1),
+    ]
+    search.events = [
+        make_event(str(i), timestamp=ts, unique_id=f"{i:02d}")
+        for i, ts in reversed(list(enumerate(timestamps)))
+    ]
+
+    events = list(read_events(T0, T0 + timedelta(hours=1)))
+    assert [(e.timestamp, e.unique_id) for e in events] == [
+        (ts, f"{i:02d}") for i, ts in enumerate(timestamps[:-1])
+    ]
+    assert {r["gte"] for r in search.requests} == {_at(0), _at(15), _at(30), _at(45)}
+
+
+def test_read_events_error(app, make_event, search):
+    """Test a failed reader raises its error, after the events of the slices before."""
+    search.events = [
+        make_event(str(i), timestamp=_at(minutes), unique_id=str(i))
+        for i, minutes in enumerate([0, 20, 40])
+    ]
+    search.failed = _at(30)
+
+    events = read_events(T0, T0 + timedelta(hours=1))
+    assert [e.timestamp for e in (next(events), next(events))] == [_at(0), _at(20)]
+    with pytest.raises(ConnectionError):
+        next(events)
+
+
+def test_run_closes_events(app, cache, monkeypatch):
+    """Test the events are closed when the export fails."""
+    closed = []
+
+    def _read_events(start_date, end_date):
+        try:
+            yield from range(10)
+        finally:
+            closed.append(True)
+
+    def _export(self, events, update_bookmark):
+        next(events)
+        raise PiwikExportRequestError("Failed.", export_info={})
+
+    monkeypatch.setattr(exporters, "read_events", _read_events)
+    monkeypatch.setattr(PiwikExporter, "_export", _export)
+    with pytest.raises(PiwikExportRequestError):
+        PiwikExporter().run(start_date=T0, end_date=T0 + timedelta(hours=1))
+    assert closed == [True]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Test the statistics utilities."""
+
+from invenio_pidstore.models import PersistentIdentifier
+from invenio_rdm_records.proxies import current_rdm_records_service as records_service
+
+from zenodo_rdm.stats.utils import chunkify, fetch_records
+
+
+def _resolved_record_info(recid):
+    """Record info as previously fetched for each event, by resolving its PID."""
+    record = records_service.record_cls.pid.resolve(recid)
+    return {
+        "oai_id": record.get("oai", {}).get("identifier"),
+        "title": record.get("metadata", {}).get("title")[:150],
+    }
+
+
+def test_chunkify():
+    """Test an iterable is split into chunks of the same size."""
+    assert list(chunkify(range(5), 2)) == [(0, 1), (2, 3), (4,)]
+    assert list(chunkify([], 2)) == []
+
+
+def test_fetch_records(create_record, db):
+    """Test the records are fetched as when resolving their PID."""
+    records = [create_record("A Romans story"), create_record("Zürich " * 30)]
+    recids = {record.id for record in records}
+
+    fetched = fetch_records(recids)
+    assert fetched == {recid: _resolved_record_info(recid) for recid in recids}
+    assert all(info["oai_id"] for info in fetched.values())
+    assert len(fetched[records[1].id]["title"]) == 150
+    assert fetch_records(set()) == {}
+
+
+def test_fetch_records_skipped(create_record, db):
+    """Test the records without a registered PID are skipped."""
+    deleted = create_record("Deleted record")
+    kept = create_record("Kept record")
+    PersistentIdentifier.get("recid", deleted.id).delete()
+    db.session.commit()
+
+    fetched = fetch_records({deleted.id, kept.id, "999999999"})
+    assert set(fetched) == {kept.id}
@@ -12,13 +12,9 @@ from datetime import datetime, timedelta, timezone
 
 import requests
 from flask import current_app
-from invenio_accounts.models import User
-from invenio_communities.communities.records.models import CommunityMetadata
-from invenio_files_rest.models import FileInstance
-from invenio_search import current_search_client
-from invenio_search.utils import build_alias_name
-from opensearchpy import Search
 
+from zenodo_rdm.metrics.counters import COUNTERS
+from zenodo_rdm.metrics.daily import DataTransferCounter, VisitorsCounter
 from zenodo_rdm.metrics.proxies import current_metrics
 
 
@@ -27,58 +23,13 @@ class ZenodoMetric(object):
 
     @staticmethod
     def get_data_transfer():
-        """Get file transfer volume in TB."""
-        time_range = {"gte": current_metrics.metrics_start_date.isoformat()}
-
-        search = (
-            Search(
-                using=current_search_client,
-                index=build_alias_name("stats-file-download"),
-            )
-            .filter(
-                "range",
-                timestamp=time_range,
-            )
-            .params(request_timeout=120)
-        )
-        search.aggs.metric("download_volume", "sum", field="volume")
-        result = search[:0].execute().aggregations.to_dict()
-        download_volume = result.get("download_volume", {}).get("value", 0)
-
-        search = (
-            Search(
-                using=current_search_client,
-                index=build_alias_name("rdmrecords-records"),
-            )
-            .filter("range", created=time_range)
-            .params(request_timeout=120)
-        )
-        search.aggs.metric("upload_volume", "sum", field="files.totalbytes")
-        result = search[:0].execute().aggregations.to_dict()
-        upload_volume = result.get("upload_volume", {}).get("value", 0)
-
-        return int(download_volume + upload_volume)
+        """Get file transfer volume in bytes."""
+        return DataTransferCounter().get(current_metrics.metrics_start_date)
 
     @staticmethod
     def get_visitors():
         """Get number of unique zenodo users."""
-        time_range = {"gte": current_metrics.metrics_start_date.isoformat()}
-
-        search = (
-            Search(
-                using=current_search_client, index=build_alias_name("events-stats-*")
-            )
-            .filter("range", timestamp=time_range)
-            .params(request_timeout=120)
-        )
-
-        search.aggs.metric("visitors_count", "cardinality", field="visitor_id")
-        result = search[:0].execute()
-
-        if "visitors_count" not in result.aggregations:
-            return 0
-
-        return int(result.aggregations.visitors_count.value)
+        return VisitorsCounter().get(current_metrics.metrics_start_date)
 
     @staticmethod
     def get_uptime():
@@ -101,6 +52,7 @@ class ZenodoMetric(object):
                     "api_key": api_key,
                     "custom_uptime_ranges": f"{start_ts}_{end_ts}",
                 },
+                timeout=current_app.config["METRICS_UPTIME_ROBOT_TIMEOUT"],
             )
 
             return sum(
@@ -110,21 +62,20 @@ class ZenodoMetric(object):
             ) / len(metrics)
 
     @staticmethod
-    def get_researchers():
-        """Get number of unique zenodo users."""
-        return User.query.filter(
-            User.confirmed_at.isnot(None),
-            User.active.is_(True),
-        ).count()
+    def get_researchers(count="exact"):
+        """Get number of unique zenodo users.
+
+        :param count: the row count method, i.e. ``exact``, ``incremental`` or
+            ``estimate``.
+        """
+        return COUNTERS["researchers"].get(count)
 
     @staticmethod
-    def get_files():
+    def get_files(count="exact"):
         """Get number of files."""
-        return FileInstance.query.count()
+        return COUNTERS["files"].get(count)
 
     @staticmethod
-    def get_communities():
+    def get_communities(count="exact"):
         """Get number of active communities."""
-        return CommunityMetadata.query.filter(
-            CommunityMetadata.is_deleted.is_(False)
-        ).count()
+        return COUNTERS["communities"].get(count)
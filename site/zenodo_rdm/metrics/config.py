@@ -8,12 +8,82 @@
 """Configuration for ZenodoRDM Metrics."""
 
 import datetime
+from functools import partial
 
 from zenodo_rdm.metrics.api import ZenodoMetric
 
 METRICS_START_DATE = datetime.datetime(2021, 1, 1)
 METRICS_CACHE_TIMEOUT = int(datetime.timedelta(hours=1).total_seconds())
 METRICS_CACHE_UPDATE_INTERVAL = datetime.timedelta(minutes=30)
+METRICS_CACHE_STALE_TIMEOUT = int(datetime.timedelta(days=7).total_seconds())
+"""Time metrics are kept in the cache after their TTL, served stale until refreshed.
+
+The TTL of a metric is its ``cache_ttl``, or ``METRICS_CACHE_TIMEOUT``.
+"""
+
+METRICS_EVALUATION_TIMEOUT = 120
+"""Default evaluation timeout in seconds of a metric, overridden by its ``timeout``."""
+
+METRICS_EVALUATION_WORKERS = 6
+"""Number of metrics evaluated concurrently."""
+
+METRICS_UPTIME_ROBOT_TIMEOUT = 10
+"""Timeout in seconds of the Uptime Robot API requests."""
+
+METRICS_DAILY_CHUNK_DAYS = 30
+"""Number of days aggregated per query by the incremental counters.
+
+It is also the maximum number of days since the last update of the counters, which
+are aggregated when getting them.
+"""
+
+METRICS_DAILY_GRACE_DAYS = 3
+"""Number of past days aggregated on every refresh of the incremental counters.
+
+Older days are considered settled, and are persisted by the
+``update_daily_counters`` task. Events indexed later than that are not counted.
+"""
+
+METRICS_DAILY_PAGE_SIZE = 10000
+"""Page size of the composite aggregations of the incremental counters."""
+
+METRICS_VISITORS_SKETCH_PRECISION = 14
+"""Precision of the daily unique visitors sketches (standard error of 0.81%).
+
+Changing it requires clearing the ``METRICS_DAILY::visitors::*`` cache keys.
+"""
+
+METRICS_LATENCY_ENABLED = False
+"""Enable the endpoint latency breakdown metrics."""
+
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+"""Buckets of the latency histograms, in seconds."""
+
+METRICS_FLUSH_INTERVAL = 15
+"""Interval in seconds of merging the histograms of a process into Redis."""
+
+METRICS_REDIS_URL = None
+"""Redis URL the histograms are merged in, defaults to ``CACHE_REDIS_URL``."""
+
+METRICS_LATENCY_COMPONENTS = {
+    "search": ["opensearchpy.transport:Transport.perform_request"],
+    "cache": ["redis.client:Redis.execute_command"],
+    "files": [
+        f"invenio_files_rest.storage.pyfs:PyFSFileStorage.{method}"
+        for method in ("open", "save", "update", "delete", "copy", "send_file")
+    ],
+    "serialization": ["flask_resources.responses:ResponseHandler.make_response"],
+}
+"""Methods measured as time spent in a component, besides SQL queries."""
+
+METRICS_TASKS_ENABLED = False
+"""Enable the Celery task runtime metrics."""
+
+METRICS_TASKS_PATTERNS = [r"zenodo_rdm\.(sitemap|metrics|openaire|stats)\.tasks\."]
+"""Regular expressions of the names of the tasks with runtime metrics."""
+
+METRICS_TASKS_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600)
+"""Buckets of the task duration and queue wait histograms, in seconds."""
 
 METRICS_DATA = {
     "openaire-nexus": [
@@ -40,24 +110,25 @@ METRICS_DATA = {
             "help": "Zenodo uptime percentage for the last month.",
             "type": "gauge",
             "value": ZenodoMetric.get_uptime,
+            "timeout": 30,
         },
         {
             "name": "zenodo_researchers",
             "help": "Number of researchers registered on Zenodo",
             "type": "gauge",
-            "value": ZenodoMetric.get_researchers,
+            "value": partial(ZenodoMetric.get_researchers, count="incremental"),
         },
         {
             "name": "zenodo_files",
             "help": "Number of files hosted on Zenodo",
             "type": "gauge",
-            "value": ZenodoMetric.get_files,
+            "value": partial(ZenodoMetric.get_files, count="estimate"),
         },
         {
             "name": "zenodo_communities",
             "help": "Number of Zenodo communities created",
             "type": "gauge",
-            "value": ZenodoMetric.get_communities,
+            "value": partial(ZenodoMetric.get_communities, count="incremental"),
         },
     ]
 }
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify
+# it under the terms of the MIT License; see LICENSE file for more details.
+
+"""Row counts of database tables, without full table scans.
+
+Row counts can be:
+
+* ``exact``: a ``COUNT(*)`` query.
+* ``incremental``: a counter kept in the cache, updated when model instances are
+  inserted, updated or deleted through the ORM, and periodically reconciled with
+  the exact count (e.g. to account for bulk changes).
+* ``estimate``: the PostgreSQL query planner estimate of the number of rows.
+"""
+
+from enum import Enum
+
+import sqlalchemy as sa
+from flask import current_app, has_app_context
+from invenio_accounts.models import User
+from invenio_cache import current_cache
+from invenio_communities.communities.records.models import CommunityMetadata
+from invenio_db import db
+from invenio_files_rest.models import FileInstance
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.base import NO_VALUE
+
+NOT_NULL = object()
+"""Condition value matching any non-null attribute value."""
+
+
+def _value(value):
+    """Plain value of an attribute, e.g. of enumerated choices."""
+    if value is not NO_VALUE and isinstance(value, Enum):
+        return value.value
+    return value
+
+
+class RowCounter(object):
+    """Row count of a model, optionally filtered."""
+
+    def __init__(self, name, model, conditions=None):
+        """Constructor.
+
+        :param conditions: a dictionary of mapped column attribute names and their
+            expected value, e.g. ``{"active": True}``. A value of ``NOT_NULL``
+            matches non-null attributes.
+        """
+        self.name = name
+        self.model = model
+        self.conditions = conditions or {}
+
+    @property
+    def cache_key(self):
+        """Cache key of the incremental counter."""
+        return f"METRICS_COUNTER::{self.name}"
+
+    def _filters(self):
+        filters = []
+        for attr, value in self.conditions.items():
+            column = getattr(self.model, attr)
+            if value is NOT_NULL:
+                filters.append(column.isnot(None))
+            else:
+                filters.append(column == value)
+        return filters
+
+    def matches(self, values):
+        """Check if attribute values of an instance match the conditions."""
+        for attr, value in self.conditions.items():
+            if value is NOT_NULL:
+                if values[attr] is None:
+                    return False
+            elif values[attr] != value:
+                return False
+        return True
+
+    def exact(self):
+        """Exact row count."""
+        return self.model.query.filter(*self._filters()).count()
+
+    def estimate(self):
+        """Query planner estimate of the row count, on PostgreSQL."""
+        if db.engine.dialect.name != "postgresql":
+            return self.exact()
+        query = sa.select(self.model).where(*self._filters())
+        compiled = query.compile(
+            dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+        plan = db.session.execute(sa.text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def incremental(self):
+        """Incrementally maintained row count, initialized with the exact count."""
+        value = current_cache.get(self.cache_key)
+        if value is None:
+            value = self.reconcile()
+        return int(value)
+
+    def reconcile(self):
+        """Reset the incremental counter to the exact row count."""
+        value = self.exact()
+        current_cache.set(self.cache_key, value, timeout=-1)
+        return value
+
+    def get(self, count="exact"):
+        """Row count, by the ``exact``, ``incremental`` or ``estimate`` method."""
+        return getattr(self, count)()
+
+    def delta(self, instance, state):
+        """Change of the row count by the flush of a model instance.
+
+        Attributes are never loaded here, unknown changes (and conditions on names
+        that are not mapped attributes) are left to reconciling.
+
+        :param state: ``new``, ``dirty`` or ``deleted``.
+        """
+        if not isinstance(instance, self.model):
+            return 0
+        insp = sa.inspect(instance)
+        if any(attr not in insp.mapper.column_attrs for attr in self.conditions):
+            return 0
+        current, previous = {}, {}
+        for attr in self.conditions:
+            attr_state = insp.attrs[attr]
+            history = attr_state.history
+            if history.added:
+                current[attr] = _value(history.added[0])
+                # the previous value is loaded when set, an empty one was null
+                previous[attr] = _value(history.deleted[0]) if history.deleted else None
+            else:
+                current[attr] = previous[attr] = _value(attr_state.loaded_value)
+        if state == "dirty" and current == previous:
+            return 0
+        if NO_VALUE in current.values() or NO_VALUE in previous.values():
+            return 0
+        before = state != "new" and self.matches(previous)
+        after = state != "deleted" and self.matches(current)
+        return int(after) - int(before)
+
+
+COUNTERS = {
+    "researchers": RowCounter(
+        "researchers", User, {"confirmed_at": NOT_NULL, "active": True}
+    ),
+    "files": RowCounter("files", FileInstance),
+    # soft-deleted communities keep their JSON, only their deletion status changes
+    "communities": RowCounter(
+        "communities", CommunityMetadata, {"deletion_status": "P"}
+    ),
+}
+
+
+def _after_flush(session, flush_context):
+    """Accumulate the row count changes of a flush, until commit."""
+    deltas = session.info.setdefault("metrics_counters", {})
+    try:
+        for state, instances in (
+            ("new", session.new),
+            ("dirty", session.dirty),
+            ("deleted", session.deleted),
+        ):
+            for instance in instances:
+                for counter in COUNTERS.values():
+                    delta = counter.delta(instance, state)
+                    if delta:
+                        deltas[counter.name] = deltas.get(counter.name, 0) + delta
+    except Exception:
+        # never fail the transaction, the counters are left to reconciling
+        if has_app_context():
+            current_app.logger.exception("Counting the flushed rows failed.")
+
+
+def _after_commit(session):
+    """Apply the row count changes of a committed transaction."""
+    deltas = session.info.pop("metrics_counters", None)
+    if not deltas or not has_app_context():
+        return
+    try:
+        for name, delta in deltas.items():
+            key = COUNTERS[name].cache_key
+            # not initialized counters are computed exactly when first read
+            if delta and current_cache.has(key):
+                current_cache.inc(key, delta)
+    except Exception:
+        current_app.logger.exception("Updating the metrics counters failed.")
+
+
+def _after_rollback(session):
+    """Discard the row count changes of a rolled back transaction."""
+    session.info.pop("metrics_counters", None)
+
+
+def _track_previous_value(target, value, oldvalue, initiator):
+    """Attribute set listener, loading the previous value of expired attributes."""
+    return value
+
+
+def register_listeners():
+    """Listen to the ORM sessions, to update the incremental counters."""
+    for name, listener in (
+        ("after_flush", _after_flush),
+        ("after_commit", _after_commit),
+        ("after_rollback", _after_rollback),
+    ):
+        if not sa.event.contains(Session, name, listener):
+            sa.event.listen(Session, name, listener)
+    for counter in COUNTERS.values():
+        column_attrs = sa.inspect(counter.model).column_attrs
+        for attr in counter.conditions:
+            if attr not in column_attrs:
+                continue
+            column = getattr(counter.model, attr)
+            if not sa.event.contains(column, "set", _track_previous_value):
+                sa.event.listen(
+                    column, "set", _track_previous_value, active_history=True
+                )
+
+
+def reconcile_counters():
+    """Reset all the incremental counters to the exact row counts."""
+    return {name: counter.reconcile() for name, counter in COUNTERS.items()}
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify
+# it under the terms of the MIT License; see LICENSE file for more details.
+
+"""Incrementally computed counters, from daily aggregates.
+
+The aggregates of settled days (i.e. older than ``METRICS_DAILY_GRACE_DAYS``, so
+that late indexed events are included) never change, so they are computed once
+by a task and persisted in the cache, together with their running total. Getting
+a counter then only aggregates the days since the last update, i.e. the days of
+the grace period and the open day.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+from flask import current_app
+from invenio_cache import current_cache
+from invenio_search import current_search_client
+from invenio_search.utils import build_alias_name
+from opensearchpy import Search
+
+from zenodo_rdm.metrics.proxies import current_metrics
+from zenodo_rdm.metrics.sketches import HyperLogLog
+
+
+class BackfillPendingError(Exception):
+    """The settled days of a counter are not computed yet."""
+
+
+class DailyCounter(object):
+    """Counter computed from daily aggregates."""
+
+    name = None
+    """Name of the counter, used in the cache keys."""
+
+    def aggregate(self, start, end):
+        """Compute the aggregates of the days in ``[start, end)``.
+
+        :returns: a dictionary of days and their aggregate.
+        """
+        raise NotImplementedError()
+
+    def initial(self):
+        """Aggregate of no days."""
+        raise NotImplementedError()
+
+    def merge(self, total, value):
+        """Merge a daily aggregate into a total."""
+        raise NotImplementedError()
+
+    def result(self, total):
+        """Value of the counter, from a total."""
+        return total
+
+    def dumps(self, value):
+        """Serialize an aggregate, to persist it."""
+        return value
+
+    def loads(self, data):
+        """Deserialize a persisted aggregate."""
+        return data
+
+    def _key(self, suffix):
+        return f"METRICS_DAILY::{self.name}::{suffix}"
+
+    def _settled_days(self, start, end):
+        """Get the aggregates of settled days, from the cache or computed."""
+        day_keys = {day: self._key(day.isoformat()) for day in _days(start, end)}
+        cached = current_cache.get_many(*day_keys.values())
+        missing = [day for day, data in zip(day_keys, cached) if data is None]
+        computed = {}
+        if missing:
+            computed = self.aggregate(missing[0], missing[-1] + timedelta(days=1))
+            current_cache.set_many(
+                {
+                    day_keys[day]: self.dumps(computed.get(day, self.initial()))
+                    for day in missing
+                },
+                timeout=-1,
+            )
+        days = {}
+        for day, data in zip(day_keys, cached):
+            if data is not None:
+                days[day] = self.loads(data)
+            else:
+                days[day] = computed.get(day, self.initial())
+        return days
+
+    def _total(self, start):
+        """Get the running total of the settled days since a start day.
+
+        :returns: a tuple of the last day of the total and the total.
+        """
+        cached = current_cache.get(self._key("total"))
+        if cached and cached[0] == start.isoformat():
+            _, last_day, data = cached
+            return date.fromisoformat(last_day), self.loads(data)
+        return start - timedelta(days=1), self.initial()
+
+    def update(self, start_date, today=None):
+        """Persist the aggregates of the settled days, and their running total.
+
+        The days are computed in chunks of ``METRICS_DAILY_CHUNK_DAYS`` days, and
+        the total is persisted after each chunk, so that an interrupted backfill
+        resumes where it stopped.
+        """
+        today = today or datetime.now(timezone.utc).date()
+        start = _as_date(start_date)
+        settled_end = today - timedelta(
+            days=current_app.config["METRICS_DAILY_GRACE_DAYS"]
+        )
+        chunk = timedelta(days=current_app.config["METRICS_DAILY_CHUNK_DAYS"])
+
+        last_day, total = self._total(start)
+        chunk_start = last_day + timedelta(days=1)
+        while chunk_start < settled_end:
+            chunk_end = min(chunk_start + chunk, settled_end)
+            days = self._settled_days(chunk_start, chunk_end)
+            for day in sorted(days):
+                total = self.merge(total, days[day])
+            last_day = chunk_end - timedelta(days=1)
+            current_cache.set(
+                self._key("total"),
+                (start.isoformat(), last_day.isoformat(), self.dumps(total)),
+                timeout=-1,
+            )
+            chunk_start = chunk_end
+        return self.result(total)
+
+    def get(self, start_date, today=None):
+        """Get the counter value since a start date, up to now.
+
+        The days since the last update are never persisted, and are aggregated on
+        every call, as long as they fit in a chunk.
+
+        :raises BackfillPendingError: if more days are not updated yet.
+        """
+        today = today or datetime.now(timezone.utc).date()
+        start = _as_date(start_date)
+        last_day, total = self._total(start)
+        recent_start = last_day + timedelta(days=1)
+        if (today - recent_start).days >= current_app.config[
+            "METRICS_DAILY_CHUNK_DAYS"
+        ]:
+            raise BackfillPendingError(
+                f"The {self.name} counter is updated up to {last_day}."
+            )
+        recent = self.aggregate(recent_start, today + timedelta(days=1))
+        total = self._copy(total)
+        for day in sorted(recent):
+            total = self.merge(total, recent[day])
+        return self.result(total)
+
+    def _copy(self, total):
+        return self.loads(self.dumps(total))
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _days(start, end):
+    """Days in ``[start, end)``."""
+    return [start + timedelta(days=i) for i in range((end - start).days)]
+
+
+def _bucket_day(bucket):
+    """Day of a ``date_histogram`` bucket key (i.e. epoch in milliseconds)."""
+    return datetime.fromtimestamp(bucket.key / 1000, tz=timezone.utc).date()
+
+
+def _range(start, end):
+    return {"gte": start.isoformat(), "lt": end.isoformat()}
+
+
+class DataTransferCounter(DailyCounter):
+    """Bytes downloaded from and uploaded to Zenodo."""
+
+    name = "data_transfer"
+
+    def _daily_sum(self, index, date_field, sum_field, start, end):
+        search = (
+            Search(using=current_search_client, index=build_alias_name(index))
+            .filter("range", **{date_field: _range(start, end)})
+            .params(request_timeout=120)
+        )
+        search.aggs.bucket(
+            "days", "date_histogram", field=date_field, calendar_interval="day"
+        ).metric("volume", "sum", field=sum_field)
+        result = search[:0].execute()
+        if "days" not in result.aggregations:
+            return {}
+        return {
+            _bucket_day(b): int(b.volume.value or 0)
+            for b in result.aggregations.days.buckets
+        }
+
+    def aggregate(self, start, end):
+        """Sum the download and upload volumes per day."""
+        downloads = self._daily_sum(
+            "stats-file-download", "timestamp", "volume", start, end
+        )
+        uploads = self._daily_sum(
+            "rdmrecords-records", "created", "files.totalbytes", start, end
+        )
+        return {
+            day: downloads.get(day, 0) + uploads.get(day, 0)
+            for day in set(downloads) | set(uploads)
+        }
+
+    def initial(self):
+        """No bytes."""
+        return 0
+
+    def merge(self, total, value):
+        """Add the bytes of a day."""
+        return total + value
+
+
+class VisitorsCounter(DailyCounter):
+    """Unique visitors, estimated from mergeable daily cardinality sketches."""
+
+    name = "visitors"
+
+    def aggregate(self, start, end):
+        """Build a sketch of the visitors of each day."""
+        search = (
+            Search(
+                using=current_search_client, index=build_alias_name("events-stats-*")
+            )
+            .filter("range", timestamp=_range(start, end))
+            .params(request_timeout=120)
+            .extra(size=0)
+        )
+        sources = [
+            {
+                "day": {
+                    "date_histogram": {"field": "timestamp", "calendar_interval": "day"}
+                }
+            },
+            {"visitor": {"terms": {"field": "visitor_id"}}},
+        ]
+        page_size = current_app.config["METRICS_DAILY_PAGE_SIZE"]
+        precision = current_app.config["METRICS_VISITORS_SKETCH_PRECISION"]
+        days = {}
+        after = None
+        while True:
+            page = search._clone()
+            composite = {"sources": sources, "size": page_size}
+            if after:
+                composite["after"] = after
+            page.aggs.bucket("visitors", "composite", **composite)
+            result = page.execute()
+            if "visitors" not in result.aggregations:
+                break
+            visitors = result.aggregations.visitors
+            for bucket in visitors.buckets:
+                day = datetime.fromtimestamp(
+                    bucket.key.day / 1000, tz=timezone.utc
+                ).date()
+                sketch = days.get(day)
+                if sketch is None:
+                    sketch = days[day] = HyperLogLog(precision)
+                sketch.add(bucket.key.visitor)
+            after = visitors.to_dict().get("after_key")
+            if not after or len(visitors.buckets) < page_size:
+                break
+        return days
+
+    def initial(self):
+        """Empty sketch."""
+        return HyperLogLog(current_app.config["METRICS_VISITORS_SKETCH_PRECISION"])
+
+    def merge(self, total, value):
+        """Merge the sketch of a day."""
+        return total.merge(value)
+
+    def result(self, total):
+        """Estimate the number of unique visitors."""
+        return total.count()
+
+    def dumps(self, value):
+        """Serialize a sketch."""
+        return value.dumps()
+
+    def loads(self, data):
+        """Deserialize a sketch."""
+        return HyperLogLog.loads(data)
+
+
+DAILY_COUNTERS = {
+    counter.name: counter for counter in (DataTransferCounter, VisitorsCounter)
+}
+
+
+def update_counters():
+    """Persist the settled days of all the daily counters."""
+    start_date = current_metrics.metrics_start_date
+    return {name: cls().update(start_date) for name, cls in DAILY_COUNTERS.items()}
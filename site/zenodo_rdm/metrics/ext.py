@@ -9,7 +9,8 @@
 
 from flask import current_app
 
-from zenodo_rdm.metrics import config
+from zenodo_rdm.metrics import config, counters, latency, task_metrics
+from zenodo_rdm.metrics.histograms import HistogramRecorder
 
 
 class ZenodoMetrics(object):
@@ -17,6 +18,8 @@ class ZenodoMetrics(object):
 
     def __init__(self, app=None):
         """Extension initialization."""
+        self.latency_recorder = None
+        self.task_recorder = None
         if app:
             self.init_app(app)
 
@@ -31,6 +34,50 @@ class ZenodoMetrics(object):
         """Flask application initialization."""
         self.init_config(app)
         app.extensions["zenodo-metrics"] = self
+        counters.register_listeners()
+        if app.config["METRICS_LATENCY_ENABLED"]:
+            self.init_latency(app)
+        if app.config["METRICS_TASKS_ENABLED"]:
+            self.init_task_metrics(app)
+
+    def init_latency(self, app):
+        """Initialize the endpoint latency breakdown metrics."""
+        self.latency_recorder = HistogramRecorder(
+            latency.REDIS_KEY,
+            buckets=app.config["METRICS_LATENCY_BUCKETS"],
+            flush_interval=app.config["METRICS_FLUSH_INTERVAL"],
+            redis_url=self._redis_url(app),
+        )
+        latency.instrument_sql()
+        for component, targets in app.config["METRICS_LATENCY_COMPONENTS"].items():
+            for target in targets:
+                try:
+                    latency.instrument(component, target)
+                except (ImportError, AttributeError):
+                    app.logger.warning(f"Cannot measure {target} as {component}.")
+
+        app.before_request(latency.start_request)
+
+        @app.after_request
+        def _observe_latency(response):
+            latency.end_request(self.latency_recorder)
+            return response
+
+    def init_task_metrics(self, app):
+        """Initialize the Celery task runtime metrics."""
+        self.task_recorder = HistogramRecorder(
+            task_metrics.REDIS_KEY,
+            buckets=app.config["METRICS_TASKS_BUCKETS"],
+            flush_interval=app.config["METRICS_FLUSH_INTERVAL"],
+            redis_url=self._redis_url(app),
+        )
+        task_metrics.TaskMetrics(
+            app, self.task_recorder, app.config["METRICS_TASKS_PATTERNS"]
+        ).connect()
+
+    @staticmethod
+    def _redis_url(app):
+        return app.config["METRICS_REDIS_URL"] or app.config.get("CACHE_REDIS_URL")
 
     @property
     def metrics_start_date(self):
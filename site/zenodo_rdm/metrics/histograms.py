@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify
+# it under the terms of the MIT License; see LICENSE file for more details.
+
+"""Prometheus histograms shared by worker processes.
+
+Values are observed in per-process histograms, which are periodically merged
+into Redis, so that the metrics are shared by all the worker processes.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app
+from redis import StrictRedis
+
+
+class Histogram:
+    """Cumulative Prometheus histogram values."""
+
+    def __init__(self, buckets):
+        """Constructor."""
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Observe a value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class HistogramRecorder:
+    """Per-process histograms, periodically merged into Redis.
+
+    Histograms are identified by two labels, e.g. an endpoint and a component.
+    """
+
+    def __init__(self, redis_key, buckets, flush_interval, redis_url):
+        """Constructor."""
+        self.redis_key = redis_key
+        self.buckets = tuple(sorted(buckets))
+        self.flush_interval = flush_interval
+        self.redis_url = redis_url
+        self._redis = None
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._last_flush = time.monotonic()
+
+    @property
+    def redis(self):
+        """Redis client, created lazily in each process."""
+        if self._redis is None:
+            self._redis = StrictRedis.from_url(self.redis_url)
+        return self._redis
+
+    def observe(self, label, values):
+        """Observe values, in the histograms of a label and each value name."""
+        with self._lock:
+            for name, value in values.items():
+                key = (label, name)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(self.buckets)
+                histogram.observe(value)
+            flush = time.monotonic() - self._last_flush > self.flush_interval
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Merge the process histograms into Redis."""
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+            self._last_flush = time.monotonic()
+        if not histograms:
+            return
+        pipeline = self.redis.pipeline(transaction=False)
+        for (label, name), histogram in histograms.items():
+            prefix = f"{label}|{name}"
+            for le, count in zip([*self.buckets, "+Inf"], histogram.counts):
+                if count:
+                    pipeline.hincrby(self.redis_key, f"{prefix}|{le}", count)
+            pipeline.hincrbyfloat(self.redis_key, f"{prefix}|sum", histogram.sum)
+        try:
+            pipeline.execute()
+        except Exception:
+            current_app.logger.exception("Flushing the metrics histograms failed.")
+
+    def collect(self):
+        """Get the merged histograms from Redis.
+
+        :returns: a dictionary of label pairs and their cumulative bucket counts,
+            count and sum.
+        """
+        result = {}
+        for field, value in self.redis.hgetall(self.redis_key).items():
+            label, name, le = field.decode("utf-8").rsplit("|", 2)
+            histogram = result.setdefault(
+                (label, name),
+                {"buckets": dict.fromkeys([*self.buckets, "+Inf"], 0), "sum": 0.0},
+            )
+            if le == "sum":
+                histogram["sum"] = float(value)
+            else:
+                le = le if le == "+Inf" else float(le)
+                if le in histogram["buckets"]:
+                    histogram["buckets"][le] = int(value)
+        for histogram in result.values():
+            cumulative = 0
+            for le, count in histogram["buckets"].items():
+                cumulative += count
+                histogram["buckets"][le] = cumulative
+            histogram["count"] = cumulative
+        return result
+
+
+def format_labels(**labels):
+    """Format Prometheus labels."""
+    return ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in labels.items()
+    )
+
+
+def format_histogram(name, labels, histogram):
+    """Format the lines of a collected histogram into Prometheus format."""
+    lines = [
+        f"{name}_bucket{{{format_labels(**labels, le=le)}}} {count}"
+        for le, count in histogram["buckets"].items()
+    ]
+    lines.append(f"{name}_sum{{{format_labels(**labels)}}} {histogram['sum']}")
+    lines.append(f"{name}_count{{{format_labels(**labels)}}} {histogram['count']}")
+    return lines
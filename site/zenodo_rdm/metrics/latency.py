@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify
+# it under the terms of the MIT License; see LICENSE file for more details.
+
+"""Endpoint latency breakdown metrics.
+
+The duration of each request is measured, together with the time spent in its
+components (i.e. SQL, OpenSearch, cache, file storage and serialization).
+"""
+
+import time
+from functools import wraps
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.utils import import_string
+
+from zenodo_rdm.metrics.histograms import format_histogram
+
+REDIS_KEY = "METRICS_LATENCY"
+
+
+def _add_component_time(component, duration):
+    """Add time spent in a component to the current request."""
+    if has_request_context() and "latency_components" in g:
+        components = g.latency_components
+        components[component] = components.get(component, 0) + duration
+
+
+def timed(component, func):
+    """Wrap a function, to measure the time spent in it by requests.
+
+    Nested calls of the same component are only measured once.
+    """
+
+    @wraps(func)
+    def _timed(*args, **kwargs):
+        if not has_request_context() or "latency_components" not in g:
+            return func(*args, **kwargs)
+        depth = g.latency_depth.get(component, 0)
+        g.latency_depth[component] = depth + 1
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            g.latency_depth[component] = depth
+            if depth == 0:
+                _add_component_time(component, time.perf_counter() - start)
+
+    _timed._latency_component = component
+    return _timed
+
+
+def instrument(component, target):
+    """Measure the time spent in a method, given as ``module:Class.method``."""
+    path, _, method = target.rpartition(".")
+    cls = import_string(path)
+    func = getattr(cls, method)
+    if getattr(func, "_latency_component", None) != component:
+        setattr(cls, method, timed(component, func))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    conn.info.setdefault("latency_start", []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    _, start = conn.info["latency_start"].pop()
+    _add_component_time("sql", time.perf_counter() - start)
+
+
+def _handle_error(exception_context):
+    """Stop measuring a failed query, as ``after_cursor_execute`` is not fired."""
+    conn = exception_context.connection
+    stack = conn.info.get("latency_start") if conn is not None else None
+    if stack and stack[-1][0] is exception_context.execution_context:
+        _, start = stack.pop()
+        _add_component_time("sql", time.perf_counter() - start)
+
+
+def instrument_sql():
+    """Measure the time spent in SQL queries, on all engines."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def start_request():
+    """Start measuring the current request."""
+    g.latency_start = time.perf_counter()
+    g.latency_components = {}
+    g.latency_depth = {}
+
+
+def end_request(recorder):
+    """Observe the duration of the current request."""
+    if "latency_start" not in g:
+        return
+    duration = time.perf_counter() - g.latency_start
+    components = g.pop("latency_components")
+    del g.latency_start
+    recorder.observe(
+        request.endpoint or "<unmatched>", {"total": duration, **components}
+    )
+
+
+def formatted_response(histograms):
+    """Format the latency histograms into Prometheus format."""
+    metrics = {
+        "total": (
+            "zenodo_http_request_duration_seconds",
+            "Duration of the HTTP requests, per endpoint.",
+        ),
+        "component": (
+            "zenodo_http_request_component_duration_seconds",
+            "Time spent by the HTTP requests in SQL, search, cache, files and "
+            "serialization, per endpoint.",
+        ),
+    }
+    lines = {key: [] for key in metrics}
+    for (endpoint, component), histogram in sorted(histograms.items()):
+        if component == "total":
+            key, labels = "total", {"endpoint": endpoint}
+        else:
+            key, labels = "component", {"endpoint": endpoint, "component": component}
+        lines[key].extend(format_histogram(metrics[key][0], labels, histogram))
+
+    response = ""
+    for key, (name, help_) in metrics.items():
+        response += f"# HELP {name} {help_}\n# TYPE {name} histogram\n"
+        response += "".join(f"{line}\n" for line in lines[key])
+    return response
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify
+# it under the terms of the MIT License; see LICENSE file for more details.
+
+"""Mergeable cardinality sketches."""
+
+import math
+from hashlib import blake2b
+
+
+class HyperLogLog(object):
+    """HyperLogLog cardinality sketch.
+
+    Sketches of the same precision are merged by taking the maximum of their
+    registers, so that the cardinality of a union of sets can be estimated from the
+    sketches of each set. The standard error is ``1.04 / sqrt(2 ** precision)``.
+    """
+
+    def __init__(self, precision=14, registers=None):
+        """Constructor."""
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers or self.size)
+
+    def add(self, value):
+        """Add a value to the sketch."""
+        digest = blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        x = int.from_bytes(digest, "big")
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Merge another sketch of the same precision into this one."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision.")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def copy(self):
+        """Copy of the sketch."""
+        return HyperLogLog(self.precision, self.registers)
+
+    def count(self):
+        """Estimate the cardinality."""
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size**2 / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        # small range correction, with linear counting
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def dumps(self):
+        """Serialize the sketch registers."""
+        return bytes(self.registers)
+
+    @classmethod
+    def loads(cls, data):
+        """Deserialize a sketch from its registers."""
+        return cls(int(math.log2(len(data))), data)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify
+# it under the terms of the MIT License; see LICENSE file for more details.
+
+"""Celery task runtime metrics.
+
+The duration of each run of the instrumented tasks is observed per final state
+(i.e. ``SUCCESS``, ``FAILURE`` or ``RETRY``), together with the time the task
+waited in the queue, from its publication (or its ETA) to the start of its run.
+"""
+
+import re
+import time
+from datetime import datetime
+
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    worker_process_shutdown,
+)
+
+from zenodo_rdm.metrics.histograms import format_histogram, format_labels
+
+REDIS_KEY = "METRICS_TASKS"
+
+SENT_AT_HEADER = "zenodo_sent_at"
+"""Message header with the publication time of a task."""
+
+QUEUE_WAIT = "queue_wait"
+"""Name of the queue wait histograms, besides the final states."""
+
+
+def _request_header(request, name):
+    """Get a custom message header from a task request."""
+    value = getattr(request, name, None)
+    if value is None:
+        value = (getattr(request, "headers", None) or {}).get(name)
+    return value
+
+
+def _queue_wait(request, now):
+    """Time a task waited in the queue, or ``None`` if unknown."""
+    sent_at = _request_header(request, SENT_AT_HEADER)
+    if sent_at is None:
+        return None
+    ready_at = float(sent_at)
+    if request.eta:
+        eta = request.eta
+        if isinstance(eta, str):
+            eta = datetime.fromisoformat(eta)
+        ready_at = max(ready_at, eta.timestamp())
+    return max(0.0, now - ready_at)
+
+
+class TaskMetrics(object):
+    """Runtime metrics of Celery tasks, recorded from the Celery signals."""
+
+    def __init__(self, app, recorder, patterns):
+        """Constructor.
+
+        :param patterns: regular expressions of the instrumented task names.
+        """
+        self.app = app
+        self.recorder = recorder
+        self.patterns = [re.compile(p) for p in patterns]
+        self._running = {}
+
+    def instrumented(self, name):
+        """Check if a task is instrumented."""
+        return any(p.match(name or "") for p in self.patterns)
+
+    def on_publish(self, sender=None, headers=None, **kwargs):
+        """Mark published tasks with their publication time."""
+        if headers is not None and self.instrumented(sender):
+            headers[SENT_AT_HEADER] = time.time()
+
+    def on_prerun(self, task_id=None, task=None, **kwargs):
+        """Start measuring a task run."""
+        if task is None or not self.instrumented(task.name):
+            return
+        queue_wait = _queue_wait(task.request, time.time())
+        self._running[task_id] = (time.perf_counter(), queue_wait)
+
+    def on_postrun(self, task_id=None, task=None, state=None, **kwargs):
+        """Observe the duration and queue wait of a task run."""
+        start = self._running.pop(task_id, None)
+        if start is None:
+            return
+        started_at, queue_wait = start
+        values = {state or "UNKNOWN": time.perf_counter() - started_at}
+        if queue_wait is not None:
+            values[QUEUE_WAIT] = queue_wait
+        with self.app.app_context():
+            self.recorder.observe(task.name, values)
+
+    def on_shutdown(self, **kwargs):
+        """Merge the histograms of a stopping worker process."""
+        with self.app.app_context():
+            self.recorder.flush()
+
+    def connect(self):
+        """Connect to the Celery signals."""
+        for signal, receiver in (
+            (before_task_publish, self.on_publish),
+            (task_prerun, self.on_prerun),
+            (task_postrun, self.on_postrun),
+            (worker_process_shutdown, self.on_shutdown),
+        ):
+            signal.connect(receiver, weak=False, dispatch_uid=__name__)
+
+
+def formatted_response(histograms):
+    """Format the task histograms into Prometheus format.
+
+    Failures and retries are exposed as counters as well, i.e. the number of runs
+    that ended in the ``FAILURE`` and ``RETRY`` states.
+    """
+    metrics = {
+        "duration": (
+            "zenodo_celery_task_duration_seconds",
+            "histogram",
+            "Duration of the task runs, per task and final state.",
+        ),
+        "queue_wait": (
+            "zenodo_celery_task_queue_wait_seconds",
+            "histogram",
+            "Time the tasks waited in the queue before running, per task.",
+        ),
+        "FAILURE": (
+            "zenodo_celery_task_failures_total",
+            "counter",
+            "Number of failed task runs, per task.",
+        ),
+        "RETRY": (
+            "zenodo_celery_task_retries_total",
+            "counter",
+            "Number of retried task runs, per task.",
+        ),
+    }
+    lines = {key: [] for key in metrics}
+    for (task, name), histogram in sorted(histograms.items()):
+        if name == QUEUE_WAIT:
+            lines["queue_wait"].extend(
+                format_histogram(metrics["queue_wait"][0], {"task": task}, histogram)
+            )
+            continue
+        labels = {"task": task, "state": name}
+        lines["duration"].extend(
+            format_histogram(metrics["duration"][0], labels, histogram)
+        )
+        if name in ("FAILURE", "RETRY"):
+            lines[name].append(
+                f"{metrics[name][0]}{{{format_labels(task=task)}}} {histogram['count']}"
+            )
+
+    response = ""
+    for key, (name, type_, help_) in metrics.items():
+        response += f"# HELP {name} {help_}\n# TYPE {name} {type_}\n"
+        response += "".join(f"{line}\n" for line in lines[key])
+    return response
@@ -9,10 +9,22 @@
 
 from celery import shared_task
 
-from zenodo_rdm.metrics import utils
+from zenodo_rdm.metrics import counters, daily, utils
 
 
 @shared_task(ignore_result=True)
 def calculate_metrics(metric_id=None):
     """Calculate metrics for the passed metric ID."""
     utils.calculate_metrics(metric_id)
+
+
+@shared_task(ignore_result=True)
+def reconcile_counters():
+    """Reset the incremental row counters to the exact row counts."""
+    counters.reconcile_counters()
+
+
+@shared_task(ignore_result=True)
+def update_daily_counters():
+    """Persist the settled days of the incremental daily counters."""
+    daily.update_counters()
@@ -6,39 +6,99 @@
 # it under the terms of the MIT License; see LICENSE file for more details.
 
 """Utilities for metrics module."""
-from copy import deepcopy
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 from flask import current_app
 from invenio_cache import current_cache
 
 
+def _cache_key(metric_id, metric):
+    return f"METRICS_CACHE::{metric_id}::{metric['name']}"
+
+
+def _cache_ttl(metric):
+    return metric.get("cache_ttl", current_app.config["METRICS_CACHE_TIMEOUT"])
+
+
 def get_metrics(metric_id):
-    """Get metrics from cache."""
-    cached_data = current_cache.get(f"METRICS_CACHE::{metric_id}")
-    if cached_data is not None:
-        return cached_data
+    """Get metrics from cache.
+
+    Values are kept in the cache after their TTL, and are served stale until they
+    are refreshed.
+
+    :returns: a tuple of the cached metrics and whether any of them is stale or
+        missing, i.e. needs to be refreshed.
+    """
+    metrics = current_app.config["METRICS_DATA"][metric_id]
+    cached = current_cache.get_many(*[_cache_key(metric_id, m) for m in metrics])
+    now = time.time()
+    result = []
+    stale = False
+    for metric, entry in zip(metrics, cached):
+        if entry is None:
+            stale = True
+            continue
+        if now - entry["updated"] > _cache_ttl(metric):
+            stale = True
+        result.append({**metric, "value": entry["value"]})
+    return result, stale
+
+
+def _evaluate(app, metric):
+    """Evaluate a metric in an application context."""
+    with app.app_context():
+        return metric["value"]()
 
 
 def calculate_metrics(metric_id, cache=True):
-    """Calculate a metric's result."""
-    metrics = deepcopy(current_app.config["METRICS_DATA"][metric_id])
+    """Calculate a metric's result.
+
+    The metrics are evaluated concurrently, each with its own timeout (i.e. the
+    ``timeout`` of the metric, or ``METRICS_EVALUATION_TIMEOUT``), and cached under
+    their own key. Failed or timed out metrics keep their previously cached value.
+    """
+    metrics = current_app.config["METRICS_DATA"][metric_id]
+    app = current_app._get_current_object()
+    default_timeout = current_app.config["METRICS_EVALUATION_TIMEOUT"]
 
     result = []
-    for metric in metrics:
-        try:
-            metric["value"] = metric["value"]()
-            result.append(metric)
-        except Exception:
-            current_app.logger.exception(
-                "Metric evaluation failed", extra={"metric": metric["name"]}
-            )
-
-    if cache:
-        current_cache.set(
-            f"METRICS_CACHE::{metric_id}",
-            result,
-            timeout=current_app.config["METRICS_CACHE_TIMEOUT"],
-        )
+    executor = ThreadPoolExecutor(
+        max_workers=current_app.config["METRICS_EVALUATION_WORKERS"]
+    )
+    try:
+        start = time.monotonic()
+        futures = [executor.submit(_evaluate, app, metric) for metric in metrics]
+        for metric, future in zip(metrics, futures):
+            timeout = metric.get("timeout", default_timeout)
+            try:
+                value = future.result(
+                    timeout=max(0, start + timeout - time.monotonic())
+                )
+            except FutureTimeoutError:
+                current_app.logger.error(
+                    "Metric evaluation timed out", extra={"metric": metric["name"]}
+                )
+                continue
+            except Exception:
+                current_app.logger.exception(
+                    "Metric evaluation failed", extra={"metric": metric["name"]}
+                )
+                continue
+
+            result.append({**metric, "value": value})
+            if cache:
+                ttl = _cache_ttl(metric)
+                current_cache.set(
+                    _cache_key(metric_id, metric),
+                    {"value": value, "updated": time.time()},
+                    timeout=ttl + current_app.config["METRICS_CACHE_STALE_TIMEOUT"],
+                )
+    finally:
+        # do not wait for the timed out evaluations
+        executor.shutdown(wait=False)
 
     return result
 
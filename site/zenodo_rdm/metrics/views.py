@@ -11,27 +11,50 @@ import humanize
 from flask import Blueprint, Response, current_app
 from invenio_cache import current_cache
 
-from zenodo_rdm.metrics import tasks, utils
+from zenodo_rdm.metrics import latency, task_metrics, tasks, utils
+from zenodo_rdm.metrics.proxies import current_metrics
 
 blueprint = Blueprint("METRICS", __name__)
 
 
+@blueprint.route("/metrics/latency")
+def latency_metrics():
+    """Endpoint latency breakdown metrics endpoint."""
+    recorder = current_metrics.latency_recorder
+    if recorder is None:
+        return Response("Latency metrics disabled", status=404, mimetype="text/plain")
+    response = latency.formatted_response(recorder.collect())
+    return Response(response, mimetype="text/plain")
+
+
+@blueprint.route("/metrics/tasks")
+def task_metrics_view():
+    """Celery task runtime metrics endpoint."""
+    recorder = current_metrics.task_recorder
+    if recorder is None:
+        return Response("Task metrics disabled", status=404, mimetype="text/plain")
+    response = task_metrics.formatted_response(recorder.collect())
+    return Response(response, mimetype="text/plain")
+
+
 @blueprint.route("/metrics/<string:metric_id>")
 def metrics(metric_id):
     """Metrics endpoint."""
     if metric_id not in current_app.config["METRICS_DATA"]:
         return Response("Invalid key", status=404, mimetype="text/plain")
 
-    metrics = utils.get_metrics(metric_id)
-    if metrics:
-        response = utils.formatted_response(metrics)
-        return Response(response, mimetype="text/plain")
+    metrics, stale = utils.get_metrics(metric_id)
 
     # Send off task to compute metrics only if it wasn't already requested
-    if not current_cache.get(f"METRICS_EVALUATING::{metric_id}"):
+    if stale and not current_cache.get(f"METRICS_EVALUATING::{metric_id}"):
         tasks.calculate_metrics.delay(metric_id)
         current_cache.set(f"METRICS_EVALUATING::{metric_id}", True, timeout=60 * 2)
 
+    # Serve the last known values, even stale, while they are refreshed
+    if metrics:
+        response = utils.formatted_response(metrics)
+        return Response(response, mimetype="text/plain")
+
     retry_after = current_app.config["METRICS_CACHE_UPDATE_INTERVAL"]
     return Response(
         f"Metrics not available. Try again after {humanize.naturaldelta(retry_after)}.",
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# Zenodo-RDM is free software; you can redistribute it and/or modify
+# it under the terms of the MIT License; see LICENSE file for more details.
+"""Communities with a special meaning for OpenAIRE.
+
+The IDs of the communities are resolved from their slug once, and kept in the
+cache, until a community is created, renamed or deleted, or at most for
+``OPENAIRE_COMMUNITIES_CACHE_TTL`` seconds.
+"""
+
+import sqlalchemy as sa
+from flask import current_app, has_app_context
+from invenio_cache import current_cache
+from invenio_communities.communities.records.models import CommunityMetadata
+from invenio_db import db
+from sqlalchemy.orm import Session
+
+ECFUNDED_SLUG = "ecfunded"
+
+CACHE_KEY = "openaire:ecfunded_community_ids"
+
+
+def ecfunded_community_ids():
+    """IDs of the ``ecfunded`` communities, as strings."""
+    ids = current_cache.get(CACHE_KEY)
+    if ids is None:
+        rows = db.session.query(CommunityMetadata.id).filter(
+            CommunityMetadata.slug == ECFUNDED_SLUG,
+            CommunityMetadata.deletion_status == "P",
+        )
+        ids = [str(id_) for (id_,) in rows]
+        ttl = current_app.config["OPENAIRE_COMMUNITIES_CACHE_TTL"]
+        current_cache.set(CACHE_KEY, ids, timeout=ttl)
+    return set(ids)
+
+
+def _changed(instance, state):
+    """Check if a flushed community may change the resolved IDs."""
+    if not isinstance(instance, CommunityMetadata):
+        return False
+    if state != "dirty":
+        return True
+    insp = sa.inspect(instance)
+    return any(
+        insp.attrs[attr].history.has_changes()
+        for attr in ("slug", "deletion_status", "json")
+    )
+
+
+def _after_flush(session, flush_context):
+    """Mark the transactions changing the communities, until commit."""
+    try:
+        changed = any(
+            _changed(instance, state)
+            for state, instances in (
+                ("new", session.new),
+                ("dirty", session.dirty),
+                ("deleted", session.deleted),
+            )
+            for instance in instances
+        )
+    except Exception:
+        # never fail the transaction, invalidate the resolved IDs instead
+        changed = True
+    if changed:
+        session.info["openaire_communities_changed"] = True
+
+
+def _after_commit(session):
+    """Invalidate the resolved IDs, on commit of changed communities."""
+    if not session.info.pop("openaire_communities_changed", False):
+        return
+    if not has_app_context():
+        return
+    try:
+        current_cache.delete(CACHE_KEY)
+    except Exception:
+        current_app.logger.exception("Invalidating the ecfunded communities failed.")
+
+
+def _after_rollback(session):
+    """Discard the changes of a rolled back transaction."""
+    session.info.pop("openaire_communities_changed", None)
+
+
+def register_listeners():
+    """Listen to the ORM sessions, to invalidate the resolved IDs."""
+    for name, listener in (
+        ("after_flush", _after_flush),
+        ("after_commit", _after_commit),
+        ("after_rollback", _after_rollback),
+    ):
+        if not sa.event.contains(Session, name, listener):
+            sa.event.listen(Session, name, listener)
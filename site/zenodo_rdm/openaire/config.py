@@ -20,3 +20,14 @@ OPENAIRE_PORTAL_URL = "https://explore.openaire.eu"
 
 OPENAIRE_DIRECT_INDEXING_ENABLED = False
 """Enable sending published records for direct indexing at OpenAIRE."""
+
+OPENAIRE_RESOURCE_TYPES_CACHE_TTL = 60 * 60
+"""Seconds the resource type vocabulary items are cached in each process."""
+
+OPENAIRE_COMMUNITIES_CACHE_TTL = 24 * 60 * 60
+"""Seconds the IDs of the ``ecfunded`` communities are cached.
+
+The cached IDs are invalidated when a community is created, renamed or deleted,
+the TTL only bounds how long they may be stale when that is missed (e.g. on
+changes made directly in the database).
+"""
@@ -7,7 +7,7 @@
 """OpenAIRE extension."""
 
 
-from . import config
+from . import communities, config
 
 
 class OpenAIRE(object):
@@ -28,4 +28,7 @@ class OpenAIRE(object):
     def init_app(self, app):
         """Flask application initialization."""
         self.init_config(app)
+        # resource type vocabulary items, with their expiration time
+        self.resource_types = {}
         app.extensions["invenio-openaire"] = self
+        communities.register_listeners()
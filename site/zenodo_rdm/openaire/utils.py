@@ -7,14 +7,17 @@
 """OpenAire related helpers."""
 
 import hashlib
+import time
 import urllib
 
-from flask import current_app
+from flask import current_app, g, has_app_context
 from invenio_access.permissions import system_identity
-from invenio_communities.proxies import current_communities
 from invenio_vocabularies.proxies import current_service as vocab_service
 from requests import Session
 
+from zenodo_rdm.openaire.communities import ecfunded_community_ids
+from zenodo_rdm.openaire.proxies import current_openaire
+
 OPENAIRE_NAMESPACE_PREFIXES = {
     "publication": "od______2659",
     "dataset": "od______2659",
@@ -36,15 +39,55 @@ OA_OTHER = "other"
 
 
 def get_resource_type_vocabulary(resource_type):
-    """Returns the matching openaire type for the given resource type."""
+    """Returns the matching openaire type for the given resource type.
+
+    The vocabulary items are cached in the process, for
+    ``OPENAIRE_RESOURCE_TYPES_CACHE_TTL`` seconds. They must not be modified.
+    """
+    ttl = current_app.config["OPENAIRE_RESOURCE_TYPES_CACHE_TTL"]
+    cache = current_openaire.resource_types
+    now = time.monotonic()
+    cached = cache.get(resource_type)
+    if cached and cached[0] > now:
+        return cached[1]
+
     vocab = vocab_service.read(
         system_identity, ("resourcetypes", resource_type), expand=True
     ).to_dict()
+    if ttl:
+        cache[resource_type] = (now + ttl, vocab)
     return vocab
 
 
+def _record_key(record):
+    """Key of a record revision, or ``None`` for records without an ID."""
+    if not record.get("id"):
+        return None
+    return (
+        record["id"],
+        record.get("is_draft"),
+        record.get("revision_id"),
+        record.get("updated"),
+    )
+
+
 def openaire_type(record):
-    """Get the OpenAIRE type of a record."""
+    """Get the OpenAIRE type of a record.
+
+    It is computed once per record revision in the application context (e.g. of a
+    request), as it is needed by several helpers for the same record.
+    """
+    key = _record_key(record)
+    if key is None or not has_app_context():
+        return _openaire_type(record)
+    oatypes = g.setdefault("openaire_types", {})
+    if key not in oatypes:
+        oatypes[key] = _openaire_type(record)
+    return oatypes[key]
+
+
+def _openaire_type(record):
+    """Compute the OpenAIRE type of a record."""
     metadata = record.get("metadata", {})
     resource_type = metadata.get("resource_type", {}).get("id")
     rt = get_resource_type_vocabulary(resource_type)
@@ -83,17 +126,12 @@ def is_openaire_publication(record, oatype):
     # Has grants, is part of ecfunded community or is open access.
     has_grants = record.get("metadata", {}).get("funding")
 
-    # Compute communities to determine whether record belongs to "ecfunded" community.
-    comm_service = current_communities.service
+    # Record belongs to "ecfunded" community, resolved to IDs once.
     community_ids = record.get("parent", {}).get("communities", {}).get("ids", [])
-    is_ecfunded = False
-
-    if community_ids:
-        communities = comm_service.read_many(system_identity, community_ids)
-        for comm in communities:
-            if comm["slug"] == "ecfunded":
-                is_ecfunded = True
-                break
+    is_ecfunded = bool(
+        community_ids
+        and ecfunded_community_ids().intersection(str(id_) for id_ in community_ids)
+    )
 
     is_open = rights["record"] == "public" and rights["files"] == "public"
     if has_grants or is_ecfunded or is_open:
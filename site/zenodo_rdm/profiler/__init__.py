@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Profiler module."""
+
+from .ext import Profiler
+from .proxies import current_profiler
+
+__all__ = (
+    "Profiler",
+    "current_profiler",
+)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Profiler configuration."""
+
+from datetime import timedelta
+
+PROFILER_STORAGE = None
+"""Profiling data storage directory, defaults to ``<instance_path>/profiler``."""
+
+PROFILER_ACTIVE_SESSION_LIFETIME = timedelta(minutes=60)
+"""Lifetime of a profiling session."""
+
+PROFILER_ACTIVE_SESSION_REFRESH = timedelta(minutes=30)
+"""Refresh the lifetime of an active session when it expires in less than this."""
+
+PROFILER_IGNORED_ENDPOINTS = ["static", r"profiler\..+"]
+"""Endpoint patterns that are never profiled."""
+
+PROFILER_PERMISSION = lambda: True  # noqa: E731
+"""Permission check function for the profiler views."""
+
+PROFILER_SEARCH_PROFILE_API = False
+"""Re-run the profiled search queries with the OpenSearch search profile API."""
+
+PROFILER_MEMORY_TOP = 50
+"""Number of top allocation sites stored per request by the memory profiler."""
+
+PROFILER_N_PLUS_ONE_THRESHOLD = 10
+"""Flag queries executed more than this number of times in one request as N+1."""
+
+PROFILER_ASYNC_WRITES = True
+"""Serialize and store the profiles in a background thread."""
+
+PROFILER_WRITER_QUEUE_SIZE = 1000
+"""Maximum queued reports of the background writer, extra reports are dropped."""
+
+PROFILER_SAMPLING_ENABLED = False
+"""Enable the sampled profiling of requests, independently of any session."""
+
+PROFILER_SAMPLING_RATE = 100
+"""Profile one request in N, per endpoint."""
+
+PROFILER_SAMPLING_ENDPOINT_RATES = {}
+"""Per endpoint pattern sampling rates, overriding the default. ``0`` disables."""
+
+PROFILER_SAMPLING_INTERVAL = 0.005
+"""Interval in seconds of the statistical sampler for sampled requests."""
+
+PROFILER_SAMPLING_WINDOW = timedelta(minutes=10)
+"""Time window the sampled call stacks of an endpoint are merged in."""
+
+PROFILER_SAMPLING_RETENTION = timedelta(days=7)
+"""How long to keep the sampled call stacks."""
+
+PROFILER_TASKS = {}
+r"""Celery task name patterns to profile, with their sampling rate (one in N).
+
+For example:
+
+.. code-block:: python
+
+    PROFILER_TASKS = {
+        r"zenodo_rdm\.sitemap\.tasks\.update_sitemap_cache": 1,
+        r"zenodo_rdm\.openaire\.tasks\..+": 10,
+    }
+"""
+
+PROFILER_TASKS_SESSION = {
+    "id": "celery-tasks",
+    "base": True,
+    "sql": True,
+    "search": True,
+    "memory": False,
+}
+"""Profiling session the profiles of the Celery tasks are stored in."""
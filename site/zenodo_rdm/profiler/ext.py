@@ -0,0 +1,608 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Profiler extension."""
+
+import itertools
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import pyinstrument
+import sqlalchemy as sa
+import sqltap
+from celery.signals import task_postrun, task_prerun
+from flask import current_app, g, request, session
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import SingletonThreadPool
+
+from . import config
+from .memory import MemoryProfiler
+from .models import (
+    Base,
+    SampledBase,
+    SampledRequests,
+    SampledStack,
+    SessionRequest,
+    SessionRequestQuery,
+)
+from .reports import (
+    dump_base_profile,
+    dump_memory_profile,
+    dump_search_profile,
+    dump_sql_profile,
+    load_base_profile,
+    render_report,
+)
+from .search import SearchProfiler
+from .sql import aggregate_queries
+from .stacks import collapse_session
+from .views import blueprint
+from .writer import ReportWriter
+
+
+class Profiler:
+    """Profiler Flask extension."""
+
+    def __init__(self, app=None):
+        """Extension initialization."""
+        self._engines = {}
+        self._engines_lock = threading.Lock()
+        self._sampling_counters = {}
+        self._task_counters = {}
+        self._task_profilers = {}
+        self._sampling_purged_window = None
+        self.app = None
+        self.writer = None
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Flask application initialization."""
+        self.init_config(app)
+        self.app = app
+        app.extensions["profiler"] = self
+        app.register_blueprint(blueprint)
+        self.writer = ReportWriter(
+            maxsize=app.config["PROFILER_WRITER_QUEUE_SIZE"],
+            logger=app.logger,
+        )
+
+        @app.before_request
+        def _setup_profilers():
+            if request.endpoint is None or self._is_ignored(request.endpoint):
+                return
+            active_session = self.active_session
+            if active_session:
+                g.profiler_session_id = active_session["id"]
+                g.session_profilers = self._start_profilers(active_session)
+            elif current_app.config[
+                "PROFILER_SAMPLING_ENABLED"
+            ] and self._should_sample(
+                self._sampling_counters,
+                request.endpoint,
+                current_app.config["PROFILER_SAMPLING_ENDPOINT_RATES"],
+                current_app.config["PROFILER_SAMPLING_RATE"],
+            ):
+                g.sampled_profiler = pyinstrument.Profiler(
+                    interval=current_app.config["PROFILER_SAMPLING_INTERVAL"]
+                )
+                g.sampled_profiler.start()
+
+        @app.after_request
+        def _store_profiler_reports(response):
+            # only stop the profilers here, the profiles are stored by the writer
+            if hasattr(g, "session_profilers"):
+                profilers = self._stop_profilers(g.session_profilers)
+                if profilers:
+                    self.store_session_request(profilers)
+            if hasattr(g, "sampled_profiler"):
+                self.store_sampled_request(g.sampled_profiler.stop())
+            self.refresh_active_session()
+            return response
+
+        # Celery signals are global and sent outside of the application context
+        # of the task, the handlers push the context of the last initialized app
+        for signal, receiver in (
+            (task_prerun, self._on_task_prerun),
+            (task_postrun, self._on_task_postrun),
+        ):
+            signal.disconnect(dispatch_uid=__name__)
+            signal.connect(receiver, weak=False, dispatch_uid=__name__)
+
+    def init_config(self, app):
+        """Initialize configuration."""
+        for k in dir(config):
+            if k.startswith("PROFILER_"):
+                app.config.setdefault(k, getattr(config, k))
+        if app.config["PROFILER_STORAGE"] is None:
+            app.config["PROFILER_STORAGE"] = Path(app.instance_path) / "profiler"
+
+    @staticmethod
+    def _is_ignored(endpoint):
+        """Check if an endpoint is never profiled."""
+        return any(
+            re.match(e, endpoint)
+            for e in current_app.config["PROFILER_IGNORED_ENDPOINTS"]
+        )
+
+    @staticmethod
+    def _should_sample(counters, name, rates, default_rate):
+        """Check if the current execution of an endpoint or task is sampled.
+
+        One in N executions is sampled, with N the rate of the first pattern of
+        ``rates`` matching the name, or ``default_rate``.
+        """
+        counter = counters.get(name)
+        if counter is None:
+            rate = default_rate
+            for pattern, pattern_rate in rates.items():
+                if re.match(pattern, name):
+                    rate = pattern_rate
+                    break
+            # random offset, so that processes do not sample in lockstep
+            count = itertools.count(random.randrange(rate)) if rate else None
+            counter = counters.setdefault(name, (count, rate))
+        count, rate = counter
+        return bool(rate) and next(count) % rate == 0
+
+    @staticmethod
+    def _start_profilers(options):
+        """Start the profilers enabled in the options of a profiling session."""
+        profilers = {}
+        if options.get("base"):
+            profilers["base"] = pyinstrument.Profiler()
+            profilers["base"].start()
+        if options.get("sql"):
+            profilers["sql"] = sqltap.ProfilingSession()
+            profilers["sql"].start()
+        if options.get("search"):
+            profilers["search"] = SearchProfiler(
+                profile_api=current_app.config["PROFILER_SEARCH_PROFILE_API"]
+            )
+            profilers["search"].start()
+        # started last and stopped first, to not track the other profilers, and
+        # not started if another request is memory profiled
+        if options.get("memory"):
+            memory = MemoryProfiler(top=current_app.config["PROFILER_MEMORY_TOP"])
+            if memory.start():
+                profilers["memory"] = memory
+        return profilers
+
+    @staticmethod
+    def _stop_profilers(profilers):
+        """Stop the profilers, returning their results to store."""
+        results = {}
+        if "memory" in profilers:
+            results["memory"] = profilers["memory"].stop()
+        if "base" in profilers:
+            results["base"] = profilers["base"].stop()
+        if "sql" in profilers:
+            profilers["sql"].stop()
+            results["sql"] = profilers["sql"].collect()
+        if "search" in profilers:
+            results["search"] = profilers["search"].stop()
+        return results
+
+    @property
+    def active_session(self):
+        """Get currently active profiling session, stored in ``Flask.session``."""
+        value = session.get("profiler_session")
+        expires_at = (value or {}).get("expires_at")
+        if value and expires_at < datetime.utcnow():
+            # delete from session and return
+            session.pop("profiler_session")
+            return
+        return value
+
+    @active_session.setter
+    def active_session(self, value):
+        """Set currently active profiling session, stored in ``Flask.session``."""
+        if value:
+            value["expires_at"] = (
+                datetime.utcnow()
+                + current_app.config["PROFILER_ACTIVE_SESSION_LIFETIME"]
+            )
+        session["profiler_session"] = value
+
+    def refresh_active_session(self):
+        """Refresh the expiration of the active session."""
+        target_ts = (
+            datetime.utcnow() + current_app.config["PROFILER_ACTIVE_SESSION_REFRESH"]
+        )
+        if self.active_session and target_ts > self.active_session["expires_at"]:
+            session["profiler_session"]["expires_at"] = (
+                datetime.utcnow() + self.active_session_lifetime
+            )
+
+    @property
+    def permission_func(self):
+        """Get permission check function from config."""
+        return current_app.config["PROFILER_PERMISSION"]
+
+    @property
+    def storage_dir(self):
+        """Profiling sessions storage directory path from config."""
+        return Path(current_app.config["PROFILER_STORAGE"])
+
+    @property
+    def sampled_db_path(self):
+        """Path of the SQLite file of the sampled profiling data."""
+        # in a sub-directory, so that it is not listed as a profiling session
+        return self.storage_dir / "sampled" / "sampled.db"
+
+    def get_session_entries(self, session_id):
+        """Get profiling session request entries for a session."""
+        session = self._db_session(session_id)
+        n_plus_one = (
+            sa.select(sa.func.max(SessionRequestQuery.count))
+            .where(
+                SessionRequestQuery.request_id == SessionRequest.id,
+                SessionRequestQuery.count
+                > current_app.config["PROFILER_N_PLUS_ONE_THRESHOLD"],
+            )
+            .scalar_subquery()
+        )
+        return session.query(
+            SessionRequest.id,
+            SessionRequest.ts,
+            SessionRequest.context,
+            SessionRequest.base_profile.is_not(None).label("has_base_report"),
+            SessionRequest.sql_profile.is_not(None).label("has_sql_report"),
+            SessionRequest.search_profile.is_not(None).label("has_search_report"),
+            SessionRequest.memory_profile.is_not(None).label("has_memory_report"),
+            n_plus_one.label("n_plus_one"),
+        ).order_by(SessionRequest.ts.asc())
+
+    def get_session_queries(self, session_id, by_endpoint=False):
+        """Aggregate the SQL query fingerprints of a profiling session.
+
+        :param by_endpoint: aggregate per endpoint, instead of across the session.
+        :returns: a list of query stats, the slowest first. Fingerprints executed
+            more than ``PROFILER_N_PLUS_ONE_THRESHOLD`` times in a request are
+            flagged as ``n_plus_one``.
+        """
+        session = self._db_session(session_id)
+        endpoint = sa.func.json_extract(SessionRequest.context, "$.endpoint")
+        columns = [
+            SessionRequestQuery.fingerprint,
+            sa.func.count(SessionRequestQuery.request_id).label("requests"),
+            sa.func.sum(SessionRequestQuery.count).label("count"),
+            sa.func.sum(SessionRequestQuery.rows).label("rows"),
+            sa.func.sum(SessionRequestQuery.duration).label("duration"),
+            sa.func.max(SessionRequestQuery.count).label("max_count"),
+        ]
+        group_by = [SessionRequestQuery.fingerprint]
+        if by_endpoint:
+            columns.insert(0, endpoint.label("endpoint"))
+            group_by.insert(0, endpoint)
+        query = (
+            session.query(*columns)
+            .join(SessionRequest, SessionRequest.id == SessionRequestQuery.request_id)
+            .group_by(*group_by)
+            .order_by(sa.desc("duration"))
+        )
+        threshold = current_app.config["PROFILER_N_PLUS_ONE_THRESHOLD"]
+        return [
+            {**row._asdict(), "n_plus_one": row.max_count > threshold} for row in query
+        ]
+
+    @property
+    def profiler_session_ids(self):
+        """List profiler session IDs in storage."""
+        return [
+            sess_db.stem
+            for sess_db in self.storage_dir.iterdir()
+            if sess_db.is_file() and sess_db.suffix == ".db"
+        ]
+
+    @property
+    def profiler_sessions(self):
+        """List profiler sessions information."""
+        return {
+            session_id: self.get_session_entries(session_id).all()
+            for session_id in self.profiler_session_ids
+        }
+
+    def clear_sessions(self):
+        """Delete all profiling sesions files from storage."""
+        self.writer.flush()
+        for sess_db in self.storage_dir.iterdir():
+            if sess_db.is_file() and sess_db.suffix == ".db":
+                with self._engines_lock:
+                    engine = self._engines.pop(str(sess_db), None)
+                if engine is not None:
+                    engine.dispose()
+                sess_db.unlink(missing_ok=True)
+
+    def get_request_profile(self, session_id, request_id, report_type):
+        """Retrieve the stored raw profile type of a profiling session request."""
+        session = self._db_session(session_id)
+        if report_type == "sql":
+            query = session.query(SessionRequest.sql_profile)
+        elif report_type == "base":
+            query = session.query(SessionRequest.base_profile)
+        elif report_type == "search":
+            query = session.query(SessionRequest.search_profile)
+        elif report_type == "memory":
+            query = session.query(SessionRequest.memory_profile)
+        else:
+            return None
+        return query.filter(SessionRequest.id == request_id).scalar()
+
+    def get_request_report(self, session_id, request_id, report_type):
+        """Render the HTML report type of a profiling session request."""
+        data = self.get_request_profile(session_id, request_id, report_type)
+        if data:
+            return render_report(report_type, data)
+
+    def get_session_stacks(self, session_id, endpoint=None):
+        """Merge the call stacks of the base profiles of a profiling session.
+
+        :param endpoint: only merge the requests of an endpoint.
+        """
+        session = self._db_session(session_id)
+        query = session.query(SessionRequest.base_profile).filter(
+            SessionRequest.base_profile.is_not(None)
+        )
+        if endpoint:
+            query = query.filter(
+                sa.func.json_extract(SessionRequest.context, "$.endpoint") == endpoint
+            )
+        stacks = Counter()
+        for (data,) in query:
+            stacks.update(collapse_session(load_base_profile(data)))
+        return stacks
+
+    def _engine(self, db_path, metadata=Base.metadata):
+        """Cached SQLAlchemy engine for an SQLite file.
+
+        The schema is created once, when the engine is first created.
+        """
+        key = str(db_path)
+        engine = self._engines.get(key)
+        if engine is None:
+            with self._engines_lock:
+                engine = self._engines.get(key)
+                if engine is None:
+                    db_path.parent.mkdir(parents=True, exist_ok=True)
+                    engine = sa.create_engine(
+                        f"sqlite:///{db_path}", poolclass=SingletonThreadPool
+                    )
+                    metadata.create_all(engine)
+                    self._engines[key] = engine
+        return engine
+
+    def _db_session(self, session_id=None, storage_dir=None):
+        """SQLAlchemy session for the SQLite file of a profiling session."""
+        storage_dir = storage_dir or self.storage_dir
+        db_path = storage_dir / f"{session_id or g.profiler_session_id}.db"
+        return Session(bind=self._engine(db_path))
+
+    def _sampled_db_session(self, db_path=None):
+        """SQLAlchemy session for the SQLite file of the sampled profiling data."""
+        db_path = db_path or self.sampled_db_path
+        return Session(bind=self._engine(db_path, metadata=SampledBase.metadata))
+
+    def store_session_request(self, profilers):
+        """Store profiles and context for a request in a session.
+
+        The request context is captured here, while serializing and writing the
+        profiles is done by the background writer, unless disabled.
+        """
+        self._write(
+            self.write_session_request,
+            session_id=g.profiler_session_id,
+            storage_dir=self.storage_dir,
+            ts=datetime.utcnow(),
+            context={
+                "endpoint": request.endpoint,
+                "url": request.url,
+                "path": request.path,
+                "method": request.method,
+                "referrer": request.referrer,
+                "headers": dict(request.headers),
+            },
+            profilers=profilers,
+        )
+
+    def _write(self, func, **kwargs):
+        """Write in the background writer, or synchronously if disabled."""
+        if current_app.config["PROFILER_ASYNC_WRITES"]:
+            self.writer.put(func, **kwargs)
+        else:
+            func(**kwargs)
+
+    def write_session_request(self, session_id, storage_dir, ts, context, profilers):
+        """Serialize and write the raw profiles of a request."""
+        profiles = {}
+        if "base" in profilers:
+            profiles["base"] = dump_base_profile(profilers["base"])
+        if "sql" in profilers:
+            profiles["sql"] = dump_sql_profile(profilers["sql"])
+        if "search" in profilers:
+            profiles["search"] = dump_search_profile(profilers["search"])
+        if "memory" in profilers:
+            profiles["memory"] = dump_memory_profile(profilers["memory"])
+
+        session = self._db_session(session_id, storage_dir=storage_dir)
+        try:
+            session_request = SessionRequest(
+                ts=ts,
+                context=context,
+                base_profile=profiles.get("base"),
+                sql_profile=profiles.get("sql"),
+                search_profile=profiles.get("search"),
+                memory_profile=profiles.get("memory"),
+            )
+            session.add(session_request)
+            session.flush()
+            if "sql" in profilers:
+                queries = aggregate_queries(profilers["sql"])
+                session.add_all(
+                    SessionRequestQuery(
+                        request_id=session_request.id, fingerprint=f, **stats
+                    )
+                    for f, stats in queries.items()
+                )
+            session.commit()
+        finally:
+            session.close()
+
+    def _on_task_prerun(self, task_id=None, task=None, **kwargs):
+        """Celery ``task_prerun`` handler."""
+        with self.app.app_context():
+            self.start_task_profilers(task_id, task)
+
+    def _on_task_postrun(
+        self, task_id=None, task=None, args=None, kwargs=None, state=None, **extra
+    ):
+        """Celery ``task_postrun`` handler."""
+        if task_id not in self._task_profilers:
+            return
+        with self.app.app_context():
+            self.store_task_profilers(task_id, task, args, kwargs, state)
+
+    def start_task_profilers(self, task_id, task):
+        """Start the profilers of a task execution, if selected for profiling."""
+        if not self._should_sample(
+            self._task_counters, task.name, current_app.config["PROFILER_TASKS"], 0
+        ):
+            return
+        profilers = self._start_profilers(current_app.config["PROFILER_TASKS_SESSION"])
+        self._task_profilers[task_id] = (time.perf_counter(), profilers)
+
+    def store_task_profilers(self, task_id, task, args, kwargs, state):
+        """Stop the profilers of a task execution and store their profiles.
+
+        The profiles are stored in the ``PROFILER_TASKS_SESSION`` profiling session,
+        with the task name, arguments, state and duration as context.
+        """
+        started = self._task_profilers.pop(task_id, None)
+        if started is None:
+            return
+        start_time, task_profilers = started
+        profilers = self._stop_profilers(task_profilers)
+        self._write(
+            self.write_session_request,
+            session_id=current_app.config["PROFILER_TASKS_SESSION"]["id"],
+            storage_dir=self.storage_dir,
+            ts=datetime.utcnow(),
+            context={
+                "endpoint": task.name,
+                "task": task.name,
+                "task_id": task_id,
+                "args": [repr(a) for a in args or ()],
+                "kwargs": {k: repr(v) for k, v in (kwargs or {}).items()},
+                "state": state,
+                "duration": time.perf_counter() - start_time,
+            },
+            profilers=profilers,
+        )
+
+    def store_sampled_request(self, profile_session):
+        """Store the call stacks of a sampled request."""
+        window = current_app.config["PROFILER_SAMPLING_WINDOW"].total_seconds()
+        self._write(
+            self.write_sampled_request,
+            db_path=self.sampled_db_path,
+            endpoint=request.endpoint,
+            window=datetime.utcfromtimestamp(time.time() // window * window),
+            retention=current_app.config["PROFILER_SAMPLING_RETENTION"],
+            profile_session=profile_session,
+        )
+
+    def write_sampled_request(
+        self, db_path, endpoint, window, retention, profile_session
+    ):
+        """Merge the call stacks of a sampled request into its endpoint window."""
+        stacks = collapse_session(profile_session)
+        session = self._sampled_db_session(db_path)
+        try:
+            stmt = insert(SampledRequests).values(
+                window=window,
+                endpoint=endpoint,
+                requests=1,
+                duration=profile_session.duration,
+            )
+            session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["window", "endpoint"],
+                    set_={
+                        "requests": SampledRequests.requests + 1,
+                        "duration": SampledRequests.duration + stmt.excluded.duration,
+                    },
+                )
+            )
+            if stacks:
+                stmt = insert(SampledStack).values(
+                    [
+                        dict(window=window, endpoint=endpoint, stack=s, weight=w)
+                        for s, w in stacks.items()
+                    ]
+                )
+                session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=["window", "endpoint", "stack"],
+                        set_={"weight": SampledStack.weight + stmt.excluded.weight},
+                    )
+                )
+            # purge the expired windows, once per new window
+            if self._sampling_purged_window != window:
+                for model in (SampledRequests, SampledStack):
+                    session.query(model).filter(
+                        model.window < window - retention
+                    ).delete()
+                self._sampling_purged_window = window
+            session.commit()
+        finally:
+            session.close()
+
+    def get_sampled_endpoints(self, start, end=None):
+        """Get the sampled requests and time per endpoint in a time range."""
+        if not self.sampled_db_path.exists():
+            return {}
+        session = self._sampled_db_session()
+        try:
+            query = session.query(
+                SampledRequests.endpoint,
+                sa.func.sum(SampledRequests.requests),
+                sa.func.sum(SampledRequests.duration),
+            ).filter(SampledRequests.window >= start)
+            if end:
+                query = query.filter(SampledRequests.window < end)
+            return {
+                endpoint: {"requests": requests, "duration": duration}
+                for endpoint, requests, duration in query.group_by(
+                    SampledRequests.endpoint
+                )
+            }
+        finally:
+            session.close()
+
+    def get_sampled_stacks(self, endpoint, start, end):
+        """Get the merged call stacks of an endpoint in a time range."""
+        if not self.sampled_db_path.exists():
+            return {}
+        session = self._sampled_db_session()
+        try:
+            query = (
+                session.query(SampledStack.stack, sa.func.sum(SampledStack.weight))
+                .filter(
+                    SampledStack.endpoint == endpoint,
+                    SampledStack.window >= start,
+                    SampledStack.window < end,
+                )
+                .group_by(SampledStack.stack)
+            )
+            return dict(query)
+        finally:
+            session.close()
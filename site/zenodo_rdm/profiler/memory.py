@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Memory allocation profiling with ``tracemalloc``."""
+
+import threading
+import tracemalloc
+
+_IGNORED_FILES = (
+    tracemalloc.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+)
+
+
+class MemoryProfiler:
+    """Memory allocation profiler of a request.
+
+    Tracing and its peak are process-wide, so only one request at a time is memory
+    profiled in a process: the memory profilers of overlapping requests are not
+    started. The allocation sites are the difference between snapshots taken at the
+    start and at the end of the request.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, top=50):
+        """Constructor."""
+        self.top = top
+        self.start_size = None
+        self.start_snapshot = None
+        self.size = None
+        self.peak = None
+        self.snapshot = None
+        self._started_tracing = False
+
+    def start(self):
+        """Start tracing allocations.
+
+        :returns: whether the profiler was started, i.e. no other request is memory
+            profiled.
+        """
+        if not self._lock.acquire(blocking=False):
+            return False
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        self.start_snapshot = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        self.start_size = tracemalloc.get_traced_memory()[0]
+        return True
+
+    def stop(self):
+        """Take a snapshot of the allocations and stop tracing."""
+        try:
+            size, peak = tracemalloc.get_traced_memory()
+            self.size = size - self.start_size
+            self.peak = peak - self.start_size
+            self.snapshot = tracemalloc.take_snapshot()
+            if self._started_tracing:
+                tracemalloc.stop()
+        finally:
+            self._lock.release()
+        return self
+
+    def top_stats(self):
+        """Top allocation sites (i.e. file and line) of the request, by size."""
+        filters = [tracemalloc.Filter(False, f) for f in _IGNORED_FILES]
+        stats = self.snapshot.filter_traces(filters).compare_to(
+            self.start_snapshot.filter_traces(filters), "lineno"
+        )
+        stats = sorted(
+            (stat for stat in stats if stat.size_diff > 0),
+            key=lambda stat: stat.size_diff,
+            reverse=True,
+        )
+        return [
+            {
+                "file": stat.traceback[0].filename,
+                "line": stat.traceback[0].lineno,
+                "size": stat.size_diff,
+                "count": stat.count_diff,
+            }
+            for stat in stats[: self.top]
+        ]
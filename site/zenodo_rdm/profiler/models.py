@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Profiler SQLite DB models."""
+
+import sqlalchemy as sa
+from sqlalchemy.ext.declarative import declarative_base
+
+#
+# Profiling sessions
+#
+# The table names are versioned, so that the session files of previous schemas are
+# not read (``create_all`` does not migrate existing tables).
+Base = declarative_base()
+
+
+class SessionRequest(Base):
+    """Profiling session requests model."""
+
+    __tablename__ = "session_requests_v2"
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    ts = sa.Column(sa.DateTime)
+    context = sa.Column(sa.JSON)
+    base_profile = sa.Column(sa.LargeBinary)
+    """Compressed pyinstrument session."""
+    sql_profile = sa.Column(sa.LargeBinary)
+    """Compressed ``sqltap`` query stats."""
+    search_profile = sa.Column(sa.LargeBinary)
+    """Compressed OpenSearch requests."""
+    memory_profile = sa.Column(sa.LargeBinary)
+    """Compressed ``tracemalloc`` top allocation sites and peak size."""
+
+
+class SessionRequestQuery(Base):
+    """SQL query fingerprint stats of a profiling session request."""
+
+    __tablename__ = "session_request_queries_v2"
+
+    request_id = sa.Column(
+        sa.Integer, sa.ForeignKey(SessionRequest.id), primary_key=True
+    )
+    fingerprint = sa.Column(sa.Text, primary_key=True)
+    count = sa.Column(sa.Integer, nullable=False)
+    rows = sa.Column(sa.Integer, nullable=False)
+    duration = sa.Column(sa.Float, nullable=False)
+
+
+#
+# Sampled profiling
+#
+SampledBase = declarative_base()
+
+
+class SampledRequests(SampledBase):
+    """Sampled requests of an endpoint in a time window."""
+
+    __tablename__ = "sampled_requests"
+
+    window = sa.Column(sa.DateTime, primary_key=True)
+    endpoint = sa.Column(sa.String, primary_key=True)
+    requests = sa.Column(sa.Integer, nullable=False, default=0)
+    duration = sa.Column(sa.Float, nullable=False, default=0)
+
+
+class SampledStack(SampledBase):
+    """Merged call stack of an endpoint in a time window.
+
+    The stack is in collapsed format (i.e. ``;``-separated frames) and its weight is
+    the sampled time in microseconds.
+    """
+
+    __tablename__ = "sampled_stacks"
+
+    window = sa.Column(sa.DateTime, primary_key=True)
+    endpoint = sa.Column(sa.String, primary_key=True)
+    stack = sa.Column(sa.Text, primary_key=True)
+    weight = sa.Column(sa.Integer, nullable=False, default=0)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Raw profiling data storage and report rendering.
+
+Profiles are stored compressed in a machine-readable form, i.e. the pyinstrument
+session, the ``sqltap`` query stats, the OpenSearch requests and the ``tracemalloc``
+top allocation sites as JSON, and the HTML reports are only rendered when viewed.
+"""
+
+import json
+import zlib
+from types import SimpleNamespace
+
+import sqltap
+from flask import render_template
+from pyinstrument.renderers import HTMLRenderer
+from pyinstrument.session import Session
+from sqltap.sqltap import QueryStats
+
+
+def _compress(value):
+    """Serialize a value to compressed JSON."""
+    return zlib.compress(json.dumps(value, default=repr).encode("utf-8"))
+
+
+def _decompress(data):
+    """Deserialize a value from compressed JSON."""
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def dump_base_profile(session):
+    """Serialize a pyinstrument session."""
+    return _compress(session.to_json())
+
+
+def load_base_profile(data):
+    """Deserialize a pyinstrument session."""
+    return Session.from_json(_decompress(data))
+
+
+def dump_sql_profile(queries):
+    """Serialize ``sqltap`` query stats.
+
+    Parameter values which are not JSON serializable are stored as their ``repr``.
+    """
+    return _compress(
+        [
+            {
+                "text": str(q.text),
+                "params": q.params,
+                "stack": [list(frame)[:4] for frame in q.stack],
+                "start_time": q.start_time,
+                "end_time": q.end_time,
+                "rowcount": q.rowcount,
+            }
+            for q in queries
+        ]
+    )
+
+
+def load_sql_profile(data):
+    """Deserialize ``sqltap`` query stats, as expected by ``sqltap.report``."""
+    queries = []
+    for q in _decompress(data):
+        params = q["params"] or {}
+        queries.append(
+            SimpleNamespace(
+                text=q["text"],
+                params=params,
+                params_id=None,
+                params_hash=QueryStats.calculate_params_hash(params),
+                stack=[tuple(frame) for frame in q["stack"]],
+                stack_text=None,
+                start_time=q["start_time"],
+                end_time=q["end_time"],
+                duration=q["end_time"] - q["start_time"],
+                rowcount=q["rowcount"],
+                user_context=None,
+            )
+        )
+    return queries
+
+
+def dump_memory_profile(profiler):
+    """Serialize the peak size and top allocation sites of a memory profiler."""
+    return _compress(
+        {"size": profiler.size, "peak": profiler.peak, "top": profiler.top_stats()}
+    )
+
+
+def load_memory_profile(data):
+    """Deserialize a memory profile."""
+    return _decompress(data)
+
+
+def dump_search_profile(profiler):
+    """Serialize the OpenSearch requests of a search profiler.
+
+    The search queries are re-run with the search profile API first, if enabled.
+    """
+    queries = []
+    for q in profiler.queries:
+        query = {
+            "method": q.method,
+            "url": q.url,
+            "index": q.index,
+            "params": q.params,
+            "body": q.body,
+            "start_time": q.start_time,
+            "duration": q.duration,
+            "took": q.took,
+            "hits": q.hits,
+            "size": q.size,
+        }
+        if profiler.profile_api and q.is_search:
+            try:
+                query["profile"] = q.search_profile()
+            except Exception as e:
+                query["profile_error"] = str(e)
+        queries.append(query)
+    return _compress(queries)
+
+
+def load_search_profile(data):
+    """Deserialize OpenSearch requests."""
+    return _decompress(data)
+
+
+def render_report(report_type, data):
+    """Render the HTML report of a stored profile."""
+    if report_type == "base":
+        return HTMLRenderer(timeline=True).render(load_base_profile(data))
+    elif report_type == "sql":
+        return sqltap.report(load_sql_profile(data), report_format="html")
+    elif report_type == "memory":
+        return render_template(
+            "profiler/memory_report.html", profile=load_memory_profile(data)
+        )
+    elif report_type == "search":
+        return render_template(
+            "profiler/search_report.html", queries=load_search_profile(data)
+        )
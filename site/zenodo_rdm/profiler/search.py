@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""OpenSearch requests profiling."""
+
+import json
+import threading
+import time
+from functools import wraps
+
+from opensearchpy import Transport
+
+_local = threading.local()
+_patch_lock = threading.Lock()
+
+
+def _active_profilers():
+    """Search profilers active in the current thread."""
+    if not hasattr(_local, "profilers"):
+        _local.profilers = []
+    return _local.profilers
+
+
+def _patch_transport():
+    """Wrap the OpenSearch transport, to record requests for active profilers.
+
+    Like ``sqltap`` for SQLAlchemy engines, all the clients are instrumented, but
+    requests are only recorded in threads with active profilers.
+    """
+    with _patch_lock:
+        perform_request = Transport.perform_request
+        if getattr(perform_request, "_profiled", False):
+            return
+
+        @wraps(perform_request)
+        def _perform_request(transport, method, url, *args, **kwargs):
+            profilers = _active_profilers()
+            if not profilers:
+                return perform_request(transport, method, url, *args, **kwargs)
+            start_time = time.time()
+            response = perform_request(transport, method, url, *args, **kwargs)
+            end_time = time.time()
+            stats = SearchStats(
+                transport,
+                method,
+                url,
+                kwargs.get("params"),
+                kwargs.get("body"),
+                response,
+                start_time,
+                end_time,
+            )
+            for profiler in profilers:
+                profiler.queries.append(stats)
+            return response
+
+        _perform_request._profiled = True
+        Transport.perform_request = _perform_request
+
+
+class SearchStats:
+    """Statistics about an OpenSearch request."""
+
+    def __init__(
+        self, transport, method, url, params, body, response, start_time, end_time
+    ):
+        """Constructor."""
+        self.transport = transport
+        self.method = method
+        self.url = url
+        self.index = url.lstrip("/").split("/", 1)[0]
+        self.params = dict(params or {})
+        self.body = body
+        self.start_time = start_time
+        self.duration = end_time - start_time
+        self.response = response
+        self.took = None
+        self.hits = None
+        if isinstance(response, dict):
+            self.took = response.get("took")
+            total = response.get("hits", {}).get("total")
+            self.hits = total.get("value") if isinstance(total, dict) else total
+
+    @property
+    def size(self):
+        """Size of the response, serialized when the profile is stored.
+
+        It is not measured in the profiled request, to not add to its timings.
+        """
+        return len(json.dumps(self.response, default=str))
+
+    @property
+    def is_search(self):
+        """Check if the request is a single search query."""
+        return self.url.endswith("/_search") and isinstance(self.body, dict)
+
+    def search_profile(self):
+        """Re-run the search query with the search profile API."""
+        response = self.transport.perform_request(
+            "POST",
+            self.url,
+            params=self.params,
+            body={**self.body, "profile": True},
+        )
+        return response.get("profile")
+
+
+class SearchProfiler:
+    """Profiler of the OpenSearch requests issued in the current thread."""
+
+    def __init__(self, profile_api=False):
+        """Constructor.
+
+        :param profile_api: re-run the search queries with the search profile API
+            when storing them.
+        """
+        self.profile_api = profile_api
+        self.queries = []
+
+    def start(self):
+        """Start recording the OpenSearch requests."""
+        _patch_transport()
+        _active_profilers().append(self)
+
+    def stop(self):
+        """Stop recording the OpenSearch requests."""
+        _active_profilers().remove(self)
+        return self
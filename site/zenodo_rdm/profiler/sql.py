@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""SQL query fingerprints of profiling sessions."""
+
+import re
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_PARAMS = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\$\d+|\?")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(text):
+    """Normalized SQL query, with literals and parameters replaced by ``?``.
+
+    Lists of values of ``IN`` clauses are collapsed to ``IN (?+)``, so that the
+    same query with a different number of values has the same fingerprint.
+    """
+    text = _COMMENTS.sub(" ", str(text))
+    text = _STRINGS.sub("?", text)
+    text = _PARAMS.sub("?", text)
+    text = _NUMBERS.sub("?", text)
+    text = _IN_LISTS.sub("IN (?+)", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def aggregate_queries(queries):
+    """Aggregate ``sqltap`` query stats by fingerprint.
+
+    :returns: a dictionary of fingerprints and their count, rows and duration.
+    """
+    result = {}
+    for query in queries:
+        stats = result.setdefault(
+            fingerprint(query.text), {"count": 0, "rows": 0, "duration": 0.0}
+        )
+        stats["count"] += 1
+        stats["rows"] += max(query.rowcount or 0, 0)
+        stats["duration"] += query.duration
+    return result
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Call stack aggregation of profiling sessions."""
+
+from collections import Counter
+
+
+def frame_name(identifier):
+    """Readable name of a pyinstrument frame identifier.
+
+    Identifiers are ``\\x00``-separated function, file path and line number,
+    optionally followed by ``\\x01``-prefixed attributes.
+    """
+    function, _, rest = identifier.split("\x01", 1)[0].partition("\x00")
+    file_path, _, line_no = rest.partition("\x00")
+    # keep the module path, relative to the installation directory
+    for marker in ("site-packages/", "dist-packages/"):
+        if marker in file_path:
+            file_path = file_path.rsplit(marker, 1)[1]
+            break
+    return f"{function} ({file_path}:{line_no})"
+
+
+def collapse_session(session):
+    """Aggregate the samples of a pyinstrument session by call stack.
+
+    :returns: a ``Counter`` of collapsed (``;``-separated) stacks and their sampled
+        time in microseconds.
+    """
+    stacks = Counter()
+    for call_stack, duration in session.frame_records:
+        frames = [frame_name(f) for f in call_stack if "\x00<thread>\x00" not in f]
+        if frames:
+            stacks[";".join(frames)] += int(duration * 1e6)
+    return stacks
+
+
+def to_collapsed(stacks):
+    """Serialize stacks to the collapsed format (one ``stack weight`` per line)."""
+    return "".join(f"{stack} {weight}\n" for stack, weight in stacks.items())
+
+
+def to_flamegraph(stacks, name="root"):
+    """Build a flamegraph tree (``name``, ``value``, ``children``) from stacks."""
+    root = {"name": name, "value": 0, "children": {}}
+    for stack, weight in stacks.items():
+        root["value"] += weight
+        node = root
+        for frame in stack.split(";"):
+            node = node["children"].setdefault(
+                frame, {"name": frame, "value": 0, "children": {}}
+            )
+            node["value"] += weight
+
+    def _lists(node):
+        node["children"] = [_lists(c) for c in node["children"].values()]
+        return node
+
+    return _lists(root)
+
+
+def to_speedscope(stacks, name="root"):
+    """Build a speedscope sampled profile from stacks.
+
+    See https://www.speedscope.app/file-format-schema.json for the format.
+    """
+    frames = {}
+    samples, weights = [], []
+    for stack, weight in stacks.items():
+        samples.append([frames.setdefault(f, len(frames)) for f in stack.split(";")])
+        weights.append(weight)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "zenodo-rdm",
+        "shared": {"frames": [{"name": f} for f in frames]},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "microseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+    }
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Profiler views."""
+
+from datetime import datetime, timedelta
+
+from flask import (
+    Blueprint,
+    abort,
+    flash,
+    jsonify,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    url_for,
+)
+from werkzeug.utils import secure_filename
+
+from .proxies import current_profiler
+from .reports import load_base_profile
+from .stacks import collapse_session, to_collapsed, to_flamegraph, to_speedscope
+
+blueprint = Blueprint(
+    "profiler",
+    __name__,
+    url_prefix="/profiler",
+    template_folder="templates",
+)
+
+
+@blueprint.get("/")
+def index():
+    """Index view."""
+    return render_template(
+        "profiler/index.html",
+        active_session=current_profiler.active_session,
+        profiler_sessions=current_profiler.profiler_sessions,
+        sampled_endpoints=current_profiler.get_sampled_endpoints(
+            datetime.utcnow() - timedelta(days=1)
+        ),
+    )
+
+
+@blueprint.post("/start")
+def start_session():
+    """Start a profiling session."""
+    active_session = current_profiler.active_session
+    if active_session:
+        flash(
+            f"You already have a profiling session running with {active_session['id']}",
+            "error",
+        )
+        return redirect(url_for("profiler.index"), 302)
+
+    current_profiler.active_session = {
+        "id": secure_filename(request.form["id"]),
+        "base": request.form.get("base", type=bool),
+        "sql": request.form.get("sql", type=bool),
+        "search": request.form.get("search", type=bool),
+        "memory": request.form.get("memory", type=bool),
+    }
+    return redirect(url_for("profiler.index"), 303)
+
+
+@blueprint.post("/stop")
+def stop_session():
+    """Stop a profiling session."""
+    active_session = current_profiler.active_session
+    if not active_session:
+        flash("You don't have an active profiling session running", "error")
+        return redirect(url_for("profiler.index"), 302)
+    current_profiler.active_session = None
+    return redirect(url_for("profiler.index"), 303)
+
+
+@blueprint.post("/delete")
+def clear_sessions():
+    """Clear profiling sessions from storage."""
+    current_profiler.clear_sessions()
+    return redirect(url_for("profiler.index"), 302)
+
+
+@blueprint.get("/reports/<session_id>/<request_id>/<report_type>")
+def report_view(session_id, request_id, report_type):
+    """Serve an profiling HTML report."""
+    content = current_profiler.get_request_report(session_id, request_id, report_type)
+    if not content:
+        abort(404)
+    resp = make_response(content, 200)
+    resp.content_type = "text/html"
+    resp.charset = "utf-8"
+    return resp
+
+
+def _export_stacks(stacks, name):
+    """Serve call stacks in the format of the ``format`` query argument.
+
+    Either speedscope JSON (default) or collapsed stacks (``?format=collapsed``),
+    e.g. to diff the profiles of different releases.
+    """
+    if request.args.get("format") == "collapsed":
+        resp = make_response(to_collapsed(stacks), 200)
+        resp.content_type = "text/plain"
+        resp.charset = "utf-8"
+        return resp
+    return jsonify(to_speedscope(stacks, name=name))
+
+
+@blueprint.get("/reports/<session_id>/<request_id>/base/export")
+def report_export(session_id, request_id):
+    """Export the base profile of a request, for speedscope or flamegraph tools."""
+    data = current_profiler.get_request_profile(session_id, request_id, "base")
+    if not data:
+        abort(404)
+    stacks = collapse_session(load_base_profile(data))
+    return _export_stacks(stacks, name=f"{session_id}/{request_id}")
+
+
+@blueprint.get("/reports/<session_id>/export")
+def session_export(session_id):
+    """Export the merged base profiles of a session, or of an endpoint in it."""
+    if session_id not in current_profiler.profiler_session_ids:
+        abort(404)
+    endpoint = request.args.get("endpoint")
+    stacks = current_profiler.get_session_stacks(session_id, endpoint=endpoint)
+    if not stacks:
+        abort(404)
+    return _export_stacks(stacks, name=endpoint or session_id)
+
+
+@blueprint.get("/reports/<session_id>/queries")
+def session_queries(session_id):
+    """SQL query fingerprints of a profiling session, with N+1 flags.
+
+    Aggregated across the session, or per endpoint with ``?by=endpoint``.
+    """
+    if session_id not in current_profiler.profiler_session_ids:
+        abort(404)
+    by_endpoint = request.args.get("by") == "endpoint"
+    return jsonify(current_profiler.get_session_queries(session_id, by_endpoint))
+
+
+def _time_range():
+    """Get the ``start`` and ``end`` query arguments, by default the last day."""
+    end = request.args.get("end", type=datetime.fromisoformat) or datetime.utcnow()
+    start = request.args.get("start", type=datetime.fromisoformat)
+    return start or end - timedelta(days=1), end
+
+
+@blueprint.get("/sampled")
+def sampled_endpoints():
+    """Sampled requests and time per endpoint."""
+    start, end = _time_range()
+    return jsonify(current_profiler.get_sampled_endpoints(start, end))
+
+
+@blueprint.get("/sampled/<endpoint>")
+def sampled_flamegraph(endpoint):
+    """Merged sampled call stacks of an endpoint.
+
+    Served as a flamegraph tree in JSON, or in collapsed format with
+    ``?format=collapsed`` (e.g. for ``flamegraph.pl`` or speedscope).
+    """
+    start, end = _time_range()
+    stacks = current_profiler.get_sampled_stacks(endpoint, start, end)
+    if not stacks:
+        abort(404)
+    if request.args.get("format") == "collapsed":
+        resp = make_response(to_collapsed(stacks), 200)
+        resp.content_type = "text/plain"
+        resp.charset = "utf-8"
+        return resp
+    return jsonify(to_flamegraph(stacks, name=endpoint))
+
+
+@blueprint.before_request
+def check_permission():
+    """Hook for permission check over all the profiler views."""
+    if not current_profiler.permission_func():
+        abort(403)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+"""Background writer of profiling reports."""
+
+import atexit
+import os
+import queue
+import threading
+
+
+class ReportWriter:
+    """Background writer of profiling reports.
+
+    Rendering the reports and writing them to the SQLite files is moved out of the
+    profiled request to a daemon thread, fed through a bounded queue. The queued
+    writes are flushed when the process exits.
+    """
+
+    def __init__(self, maxsize=0, logger=None):
+        """Constructor."""
+        self.maxsize = maxsize
+        self.logger = logger
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        """Start the writer thread, once per process (e.g. after a fork)."""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue(maxsize=self.maxsize)
+                self._thread = threading.Thread(
+                    target=self._run, name="profiler-writer", daemon=True
+                )
+                self._thread.start()
+                if self._pid is None:
+                    atexit.register(self.flush)
+                self._pid = os.getpid()
+
+    def _run(self):
+        """Writer loop."""
+        while True:
+            func, kwargs = self._queue.get()
+            try:
+                func(**kwargs)
+            except Exception:
+                if self.logger:
+                    self.logger.exception("Failed to store profiling reports.")
+            finally:
+                self._queue.task_done()
+
+    def put(self, func, **kwargs):
+        """Queue a write, dropping it if the queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((func, kwargs))
+        except queue.Full:
+            if self.logger:
+                self.logger.warning("Profiler writer queue is full, dropping reports.")
+
+    def flush(self):
+        """Wait for the queued writes to be done."""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
@@ -7,8 +7,25 @@
 
 """Configuration for ZenodoRDM Sitemap."""
 
+from datetime import timedelta
+
 #: Sitemap links URL scheme
 SITEMAP_URL_SCHEME = "https"
 
-#: Max URLs per sitemap page
+#: Max URLs per sitemap page, changing it regenerates all the pages
 SITEMAP_MAX_URL_COUNT = 10000
+
+#: Gzip compression level of the stored sitemap pages
+SITEMAP_COMPRESSION_LEVEL = 6
+
+#: Number of parallel tasks rendering the sitemap pages
+SITEMAP_SHARDS = 8
+
+#: Margin of the changes looked up by an update, before the previous update.
+#: Updates only look up the rows changed since then, so rows removed from the
+#: database (rather than marked as deleted) are only dropped from the sitemap by a
+#: full update, i.e. the weekly ``sitemap-full-rebuild`` of the beat schedule
+SITEMAP_UPDATE_OVERLAP = timedelta(minutes=10)
+
+#: Maximum duration of a sitemap update, after which another update can start
+SITEMAP_LOCK_TIMEOUT = timedelta(hours=2)
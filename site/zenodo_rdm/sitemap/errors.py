@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify
+# it under the terms of the MIT License; see LICENSE file for more details.
+
+"""Sitemap errors."""
+
+
+class SitemapUpdateError(Exception):
+    """Error for sitemap updates that cannot be published."""
@@ -5,13 +5,87 @@
 # ZenodoRDM is free software; you can redistribute it and/or modify
 # it under the terms of the MIT License; see LICENSE file for more details.
 
-"""Sitemap generation for ZenodoRDM."""
+"""Sitemap generation for ZenodoRDM.
+
+Each update of the sitemap writes its pages in a new version, and publishes it by
+swapping the active version pointer once all its pages and its index are written.
+The pointer maps the page numbers to their cache keys, so that unchanged pages are
+shared by consecutive versions. Pages that are not referenced by the active or the
+previous version are garbage-collected after each publication.
+"""
+
+import gzip
+import hashlib
+import time
 
 from invenio_cache import current_cache
 
 from zenodo_rdm.sitemap import config
 from zenodo_rdm.sitemap.generators import generator_fns
 
+ACTIVE_KEY = "sitemap:active"
+"""Active version pointer, with the cache keys of its pages."""
+
+VERSIONS_KEY = "sitemap:versions"
+"""Versions with stored pages, and the names of their writers."""
+
+LOCK_KEY = "sitemap:lock"
+
+NEXT_ID_KEY = "sitemap:next_id"
+"""Counter of the page IDs, shared by the processes generating pages."""
+
+
+class PageWriter(object):
+    """Writer of sitemap pages in a version.
+
+    The keys written are tracked in the cache, under a key of the writer, so that
+    the pages of unpublished versions (e.g. of failed updates) can be cleared by
+    any process.
+    """
+
+    def __init__(self, sitemap, version, name):
+        """Constructor."""
+        self.sitemap = sitemap
+        self.version = version
+        self.keys_key = f"sitemap:{version}:keys:{name}"
+        self.keys = sitemap.get_cache(self.keys_key) or []
+
+    def set_cache(self, key, value):
+        """Set a cache key of the version, tracking it."""
+        # tracked before written, so that it is never left behind
+        self.keys.append(key)
+        self.sitemap.set_cache(self.keys_key, self.keys)
+        self.sitemap.set_cache(key, value)
+
+    def set_page(self, page, xml):
+        """Store a rendered sitemap page, gzip-compressed.
+
+        The page is stored with its ETag (i.e. a hash of its content) and its
+        last modification time, which is kept if the content did not change since
+        the active version.
+
+        :returns: the cache key of the page.
+        """
+        if isinstance(xml, str):
+            xml = xml.encode("utf-8")
+        key = f"sitemap:{self.version}:{page}"
+        etag = hashlib.sha256(xml).hexdigest()
+        previous = self.sitemap.get_page(page)
+        if previous and previous.get("etag") == etag:
+            last_modified = previous["last_modified"]
+        else:
+            last_modified = time.time()
+        level = self.sitemap.app.config["SITEMAP_COMPRESSION_LEVEL"]
+        self.set_cache(
+            key,
+            {
+                "data": gzip.compress(xml, compresslevel=level, mtime=0),
+                "etag": etag,
+                "last_modified": last_modified,
+            },
+        )
+        return key
+
 
 class ZenodoSitemap(object):
     """Zenodo sitemap extension."""
@@ -27,24 +101,104 @@ class ZenodoSitemap(object):
         self.init_config(app)
         self.generators = [fn for fn in generator_fns]
         app.extensions["zenodo-sitemap"] = self
-        # Keep the currently stored sitemap cache keys for easy clearing
-        self.cache_keys = set()
 
-    def set_cache(self, key, value):
+    @staticmethod
+    def set_cache(key, value):
         """Set the sitemap cache."""
         current_cache.set(key, value, timeout=-1)
-        self.cache_keys.add(key)
 
     @staticmethod
     def get_cache(key):
         """Get the sitemap cache."""
-        current_cache.get(key)
+        return current_cache.get(key)
+
+    def acquire_lock(self):
+        """Lock the sitemap updates, returning whether the lock was acquired."""
+        timeout = int(self.app.config["SITEMAP_LOCK_TIMEOUT"].total_seconds())
+        return current_cache.add(LOCK_KEY, True, timeout=timeout)
+
+    @staticmethod
+    def release_lock():
+        """Unlock the sitemap updates."""
+        current_cache.delete(LOCK_KEY)
+
+    @staticmethod
+    def allocate_page_id():
+        """Allocate a new page ID, unique across processes."""
+        return current_cache.inc(NEXT_ID_KEY)
+
+    def get_active(self):
+        """Get the active version pointer."""
+        return self.get_cache(ACTIVE_KEY)
+
+    def get_page(self, page):
+        """Get a page of the active version."""
+        active = self.get_active()
+        key = active and active["pages"].get(page)
+        return self.get_cache(key) if key else None
+
+    def get_state(self):
+        """Get the generation state of the active version."""
+        active = self.get_active()
+        return self.get_cache(f"sitemap:{active['version']}:state") if active else None
+
+    def begin_version(self, writers=("main",)):
+        """Register a new version, with the names of its page writers."""
+        versions = self.get_cache(VERSIONS_KEY) or {}
+        active = self.get_active()
+        version = max([*versions, active["version"] if active else 0]) + 1
+        versions[version] = list(writers)
+        self.set_cache(VERSIONS_KEY, versions)
+        return version
+
+    def page_writer(self, version, name="main"):
+        """Get a page writer of a version."""
+        return PageWriter(self, version, name)
+
+    def publish(self, version, pages, state):
+        """Make a version active, given its page keys and generation state."""
+        self.set_cache(f"sitemap:{version}:state", state)
+        active = self.get_active()
+        self.set_cache(
+            ACTIVE_KEY,
+            {
+                "version": version,
+                "pages": pages,
+                "previous": active["pages"] if active else {},
+            },
+        )
+        self.collect_garbage()
+
+    def collect_garbage(self):
+        """Clear the pages not referenced by the active or the previous version."""
+        active = self.get_active() or {"version": None, "pages": {}, "previous": {}}
+        referenced = {*active["pages"].values(), *active["previous"].values()}
+        versions = self.get_cache(VERSIONS_KEY) or {}
+        for version, writers in list(versions.items()):
+            kept_version = version == active["version"]
+            for name in writers:
+                keys_key = f"sitemap:{version}:keys:{name}"
+                keys = self.get_cache(keys_key) or []
+                kept = [key for key in keys if key in referenced]
+                stale = [key for key in keys if key not in referenced]
+                if stale:
+                    current_cache.delete_many(*stale)
+                if kept:
+                    kept_version = True
+                    if stale:
+                        self.set_cache(keys_key, kept)
+                else:
+                    current_cache.delete(keys_key)
+            if version != active["version"]:
+                current_cache.delete(f"sitemap:{version}:state")
+            if not kept_version:
+                del versions[version]
+        self.set_cache(VERSIONS_KEY, versions)
 
     def clear_cache(self):
         """Clear the sitemap cache."""
-        for key in self.cache_keys:
-            current_cache.delete(key)
-        self.cache_keys = set()
+        current_cache.delete(ACTIVE_KEY)
+        self.collect_garbage()
 
     @staticmethod
     def init_config(app):
@@ -7,13 +7,15 @@
 
 """Sitemap generators."""
 
+from urllib.parse import quote
+
 import arrow
 from flask import current_app, url_for
 from invenio_communities.communities.records.models import CommunityMetadata
 from invenio_db import db
 from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_rdm_records.records.models import RDMRecordMetadata
-from invenio_records.models import RecordMetadata
+from sqlalchemy import func, or_
 
 
 def _sitemapdtformat(dt):
@@ -27,59 +29,236 @@ def _sitemapdtformat(dt):
     return adt.format("YYYY-MM-DDTHH:mm:ss") + "Z"
 
 
-def records_generator():
+class URLTemplate(object):
+    """URL of a route, resolved once and then built by string templating.
+
+    Building the URL of each row with ``url_for`` is comparatively slow. The URL
+    is instead resolved once with a placeholder value, which is replaced by the
+    quoted value. The characters left unquoted are looked up in the URLs built by
+    ``url_for``, and the template is checked against ``url_for`` with values of
+    reserved and non-ASCII characters. ``url_for`` is used if they differ.
+    """
+
+    placeholder = "SITEMAPPLACEHOLDER"
+
+    reserved = "!$&'()*+,/:;=@"
+    """Reserved characters, which routes may leave unquoted."""
+
+    checked_values = ("a b", "Zürich/€", "?#%[]", "!$&'()*+,;=:@~", "1234")
+    """Values of which the URLs are checked against ``url_for``."""
+
+    def __init__(self, endpoint, arg, **values):
+        """Constructor."""
+        self.endpoint = endpoint
+        self.arg = arg
+        self.values = values
+        self.template = None
+        try:
+            parts = self._url_for(self.placeholder).split(self.placeholder)
+            if len(parts) == 2:
+                self.template = parts
+                self.safe = "".join(c for c in self.reserved if self._segment(c) == c)
+                if any(self._build(v) != self._url_for(v) for v in self.checked_values):
+                    self.template = None
+        except Exception:
+            # e.g. routes with converters not accepting the placeholder
+            self.template = None
+
+    def _url_for(self, value):
+        return url_for(self.endpoint, **{self.arg: value}, **self.values)
+
+    def _segment(self, value):
+        """Value as quoted in the URL built by ``url_for``."""
+        prefix, suffix = self.template
+        url = self._url_for(value)
+        if url.startswith(prefix) and url.endswith(suffix):
+            return url[len(prefix) : len(url) - len(suffix)]
+        return None
+
+    def _build(self, value):
+        prefix, suffix = self.template
+        return f"{prefix}{quote(str(value), safe=self.safe)}{suffix}"
+
+    def __call__(self, value):
+        """Build the URL of a value."""
+        if self.template is None:
+            return self._url_for(value)
+        return self._build(value)
+
+
+class SitemapGenerator(object):
+    """Generator of the sitemap entries of a type of rows, keyset-paginated.
+
+    Rows are ordered by a stable key (e.g. the PID primary key), so that the
+    sitemap pages cover stable key ranges, which are only regenerated when the
+    rows in their range change.
+    """
+
+    name = None
+    """Name of the generator, used in the sitemap state."""
+
+    entries_per_row = 1
+    """Number of sitemap entries of each row."""
+
+    @property
+    def key(self):
+        """Column of the key the rows are ordered by."""
+        raise NotImplementedError()
+
+    def query(self):
+        """Query of the listed rows, as ``(key, updated, value)``."""
+        raise NotImplementedError()
+
+    def changed_query(self, since):
+        """Query of the keys of the rows changed since a time, listed or not."""
+        raise NotImplementedError()
+
+    def url_templates(self):
+        """URL templates of the entries, resolved once per generation."""
+        raise NotImplementedError()
+
+    def entries(self, row, urls):
+        """Sitemap entries of a row, given the URL templates."""
+        raise NotImplementedError()
+
+    def rows(self, start=None, end=None):
+        """Listed rows with a key in ``[start, end)``, ordered by key."""
+        q = self.query()
+        if start is not None:
+            q = q.filter(self.key >= start)
+        if end is not None:
+            q = q.filter(self.key < end)
+        return q.order_by(self.key).yield_per(1000)
+
+    def boundaries(self, max_url_count):
+        """Keys splitting the rows into pages of at most ``max_url_count`` URLs."""
+        step = max(1, max_url_count // self.entries_per_row)
+        numbered = (
+            self.query()
+            .with_entities(
+                self.key.label("key"),
+                func.row_number().over(order_by=self.key).label("n"),
+            )
+            .subquery()
+        )
+        q = (
+            db.session.query(numbered.c.key)
+            .filter((numbered.c.n - 1) % step == 0)
+            .order_by(numbered.c.key)
+        )
+        return [key for (key,) in q]
+
+    def changed(self, since):
+        """Keys of the rows changed since a time."""
+        for (key,) in self.changed_query(since).yield_per(1000):
+            yield key
+
+    def __call__(self):
+        """Generate all the sitemap entries."""
+        urls = self.url_templates()
+        for row in self.rows():
+            yield from self.entries(row, urls)
+
+
+class RecordsGenerator(SitemapGenerator):
     """Generate the records links."""
-    q = (
-        db.session.query(PersistentIdentifier.pid_value, RDMRecordMetadata.updated)
-        .join(
-            RDMRecordMetadata, RDMRecordMetadata.id == PersistentIdentifier.object_uuid
+
+    name = "records"
+
+    @property
+    def key(self):
+        """PID primary key."""
+        return PersistentIdentifier.id
+
+    def _query(self, *columns):
+        return (
+            db.session.query(*columns)
+            .join(
+                RDMRecordMetadata,
+                RDMRecordMetadata.id == PersistentIdentifier.object_uuid,
+            )
+            .filter(PersistentIdentifier.pid_type == "recid")
         )
-        .filter(
+
+    def query(self):
+        """Registered and published records."""
+        return self._query(
+            PersistentIdentifier.id,
+            RDMRecordMetadata.updated,
+            PersistentIdentifier.pid_value,
+        ).filter(
             PersistentIdentifier.status == PIDStatus.REGISTERED,
-            PersistentIdentifier.pid_type == "recid",
             RDMRecordMetadata.deletion_status == "P",
         )
-    )
-
-    scheme = current_app.config["SITEMAP_URL_SCHEME"]
-    for pid_value, updated_at in q.yield_per(1000):
-        yield {
-            "loc": url_for(
-                "invenio_app_rdm_records.record_detail",
-                pid_value=pid_value,
-                _external=True,
-                _scheme=scheme,
-            ),
-            "lastmod": _sitemapdtformat(updated_at),
-        }
-
-
-def communities_generator():
+
+    def changed_query(self, since):
+        """Records updated, published or deleted since a time."""
+        return self._query(PersistentIdentifier.id).filter(
+            or_(
+                RDMRecordMetadata.updated >= since,
+                PersistentIdentifier.updated >= since,
+            )
+        )
+
+    def url_templates(self):
+        """Record detail page."""
+        return URLTemplate(
+            "invenio_app_rdm_records.record_detail",
+            "pid_value",
+            _external=True,
+            _scheme=current_app.config["SITEMAP_URL_SCHEME"],
+        )
+
+    def entries(self, row, urls):
+        """Record detail page."""
+        _, updated_at, pid_value = row
+        yield {"loc": urls(pid_value), "lastmod": _sitemapdtformat(updated_at)}
+
+
+class CommunitiesGenerator(SitemapGenerator):
     """Generate the communities links."""
-    q = db.session.query(CommunityMetadata.slug, CommunityMetadata.updated).filter(
-        CommunityMetadata.deletion_status == "P"
-    )
-    scheme = current_app.config["SITEMAP_URL_SCHEME"]
-    for comm_slug, updated_at in q.yield_per(1000):
-        yield {
-            "loc": url_for(
+
+    name = "communities"
+    entries_per_row = 2
+
+    @property
+    def key(self):
+        """Community ID."""
+        return CommunityMetadata.id
+
+    def query(self):
+        """Published communities."""
+        return db.session.query(
+            CommunityMetadata.id, CommunityMetadata.updated, CommunityMetadata.slug
+        ).filter(CommunityMetadata.deletion_status == "P")
+
+    def changed_query(self, since):
+        """Communities updated or deleted since a time."""
+        return db.session.query(CommunityMetadata.id).filter(
+            CommunityMetadata.updated >= since
+        )
+
+    def url_templates(self):
+        """Community detail and about pages."""
+        scheme = current_app.config["SITEMAP_URL_SCHEME"]
+        return [
+            URLTemplate(endpoint, "pid_value", _external=True, _scheme=scheme)
+            for endpoint in (
                 "invenio_app_rdm_communities.communities_detail",
-                pid_value=comm_slug,
-                _external=True,
-                _scheme=scheme,
-            ),
-            "lastmod": _sitemapdtformat(updated_at),
-        }
-        yield {
-            "loc": url_for(
                 "invenio_communities.communities_about",
-                pid_value=comm_slug,
-                _external=True,
-                _scheme=scheme,
-            ),
-            "lastmod": _sitemapdtformat(updated_at),
-        }
+            )
+        ]
+
+    def entries(self, row, urls):
+        """Community detail and about pages."""
+        _, updated_at, comm_slug = row
+        lastmod = _sitemapdtformat(updated_at)
+        for url in urls:
+            yield {"loc": url(comm_slug), "lastmod": lastmod}
+
 
+records_generator = RecordsGenerator()
+communities_generator = CommunitiesGenerator()
 
 generator_fns = [
     records_generator,
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023 CERN.
+#
+# ZenodoRDM is free software; you can redistribute it and/or modify
+# it under the terms of the MIT License; see LICENSE file for more details.
+
+"""Incremental generation of the sitemap pages.
+
+Each generator has its own pages, covering stable ranges of its keys. The state of
+the sitemap keeps the pages of each generator (i.e. their ID, first key, number of
+URLs and last modification time), and the time of the last update. An update only
+regenerates the pages with rows changed since the last update, and the index, in a
+new version of the sitemap, which is published once complete.
+
+The pages to regenerate are split into shards of consecutive key ranges, which
+can be rendered in parallel, and are merged once all of them are rendered.
+"""
+
+from bisect import bisect_right
+from datetime import datetime
+
+from flask import current_app, render_template, url_for
+
+from zenodo_rdm.sitemap.errors import SitemapUpdateError
+from zenodo_rdm.sitemap.generators import _sitemapdtformat
+
+
+def _new_page(sitemap, start):
+    """New page starting at a key, with a new ID."""
+    return {
+        "id": sitemap.allocate_page_id(),
+        "start": start,
+        "count": 0,
+        "lastmod": None,
+    }
+
+
+def _initial_pages(sitemap, generator, max_url_count):
+    """Pages of a generator without pages yet, split by its current rows."""
+    boundaries = generator.boundaries(max_url_count)
+    return [_new_page(sitemap, None)] + [
+        _new_page(sitemap, start) for start in boundaries[1:]
+    ]
+
+
+def _changed_pages(generator, pages, since):
+    """Indices of the pages with rows changed since a time."""
+    starts = [page["start"] for page in pages[1:]]
+    return {bisect_right(starts, key) for key in generator.changed(since)}
+
+
+def _render_pages(sitemap, writer, generator, urls, page, end, max_url_count, keys):
+    """Regenerate a page, covering the keys in ``[page["start"], end)``.
+
+    Pages that grew over ``max_url_count`` URLs are split, and the new pages start
+    at the key of their first row. The cache keys of the written pages are added
+    to ``keys``.
+
+    :returns: the regenerated pages.
+    """
+    pages = []
+    current, entries = dict(page, count=0, lastmod=None), []
+
+    def _store():
+        keys[current["id"]] = writer.set_page(
+            current["id"],
+            render_template("zenodo_sitemap/sitemap.xml", urlset=entries),
+        )
+        pages.append(dict(current, count=len(entries)))
+
+    for row in generator.rows(page["start"], end):
+        key, updated = row[0], row[1]
+        row_entries = list(generator.entries(row, urls))
+        if entries and len(entries) + len(row_entries) > max_url_count:
+            _store()
+            current, entries = _new_page(sitemap, key), []
+        entries.extend(row_entries)
+        if current["lastmod"] is None or updated > current["lastmod"]:
+            current["lastmod"] = updated
+    if entries or page["start"] is None:
+        _store()
+    return pages
+
+
+def _render_index(writer, sections):
+    """Render the sitemap index, of the pages with URLs."""
+    url_scheme = current_app.config["SITEMAP_URL_SCHEME"]
+    urlset = [
+        {
+            "loc": url_for(
+                "zenodo_sitemap.sitemappage",
+                page=page["id"],
+                _external=True,
+                _scheme=url_scheme,
+            ),
+            "lastmod": page["lastmod"] and _sitemapdtformat(page["lastmod"]),
+        }
+        for pages in sections.values()
+        for page in pages
+        if page["count"]
+    ]
+    return writer.set_page(
+        0,
+        render_template(
+            "zenodo_sitemap/sitemapindex.xml", urlset=urlset, url_scheme=url_scheme
+        ),
+    )
+
+
+def _split(jobs, shards):
+    """Split jobs into consecutive shards of about the same size."""
+    shards = max(1, min(shards, len(jobs)))
+    size, rest = divmod(len(jobs), shards)
+    result, start = [], 0
+    for i in range(shards):
+        end = start + size + (1 if i < rest else 0)
+        result.append(jobs[start:end])
+        start = end
+    return result
+
+
+def plan_update(full=False, max_url_count=None, shards=None):
+    """Plan an update of the sitemap, in a new version.
+
+    The pages to regenerate are split into shards, which are stored together with
+    the plan of the update, to be rendered by ``render_shard`` and merged by
+    ``publish_update``. The caller must hold the sitemap lock.
+
+    :param full: regenerate all the pages, e.g. to account for rows deleted from
+        the database.
+    :returns: the version and its number of shards.
+    """
+    sitemap = current_app.extensions["zenodo-sitemap"]
+    max_url_count = max_url_count or current_app.config["SITEMAP_MAX_URL_COUNT"]
+    shards = shards or current_app.config["SITEMAP_SHARDS"]
+    started = datetime.utcnow()
+
+    active = sitemap.get_active()
+    state = sitemap.get_state()
+    if not state or state["max_url_count"] != max_url_count:
+        full = True
+        state = {
+            "since": None,
+            "max_url_count": max_url_count,
+            "sections": (state or {}).get("sections", {}),
+        }
+    # unchanged pages are shared with the active version
+    previous_keys = active["pages"] if active else {}
+
+    sections, jobs = {}, []
+    for generator in sitemap.generators:
+        pages = state["sections"].get(generator.name)
+        if not pages:
+            pages = _initial_pages(sitemap, generator, max_url_count)
+            changed = set(range(len(pages)))
+        elif full:
+            changed = set(range(len(pages)))
+        else:
+            changed = _changed_pages(generator, pages, state["since"])
+        sections[generator.name] = []
+        for i, page in enumerate(pages):
+            if i not in changed and page["id"] in previous_keys:
+                sections[generator.name].append(("keep", page))
+                continue
+            end = pages[i + 1]["start"] if i + 1 < len(pages) else None
+            sections[generator.name].append(("render", page["id"]))
+            jobs.append((generator.name, page, end))
+
+    shard_jobs = _split(jobs, shards)
+    version = sitemap.begin_version(
+        ["main", *(f"shard-{n}" for n in range(len(shard_jobs)))]
+    )
+    writer = sitemap.page_writer(version)
+    for n, shard in enumerate(shard_jobs):
+        writer.set_cache(f"sitemap:{version}:shard:{n}", shard)
+    writer.set_cache(
+        f"sitemap:{version}:plan",
+        {
+            # rows committed during the update may have an earlier modification time
+            "since": started - current_app.config["SITEMAP_UPDATE_OVERLAP"],
+            "max_url_count": max_url_count,
+            "sections": sections,
+            "shards": len(shard_jobs),
+            "previous_keys": previous_keys,
+        },
+    )
+    return version, len(shard_jobs)
+
+
+def render_shard(version, shard):
+    """Render the pages of a shard of an update.
+
+    The URL templates of the generators are resolved once per shard.
+    """
+    sitemap = current_app.extensions["zenodo-sitemap"]
+    max_url_count = sitemap.get_cache(f"sitemap:{version}:plan")["max_url_count"]
+    generators = {generator.name: generator for generator in sitemap.generators}
+    writer = sitemap.page_writer(version, f"shard-{shard}")
+
+    urls, result = {}, {}
+    for name, page, end in sitemap.get_cache(f"sitemap:{version}:shard:{shard}"):
+        generator = generators[name]
+        if name not in urls:
+            urls[name] = generator.url_templates()
+        keys = {}
+        pages = _render_pages(
+            sitemap, writer, generator, urls[name], page, end, max_url_count, keys
+        )
+        result[page["id"]] = (pages, keys)
+    writer.set_cache(f"sitemap:{version}:shard:{shard}:result", result)
+
+
+def publish_update(version):
+    """Merge the rendered shards of an update, render the index and publish it.
+
+    :raises SitemapUpdateError: if a shard or a page of the update is not rendered.
+    """
+    sitemap = current_app.extensions["zenodo-sitemap"]
+    plan = sitemap.get_cache(f"sitemap:{version}:plan")
+    rendered = {}
+    for n in range(plan["shards"]):
+        result = sitemap.get_cache(f"sitemap:{version}:shard:{n}:result")
+        if result is None:
+            raise SitemapUpdateError(
+                f"Shard {n} of the sitemap version {version} was not rendered."
+            )
+        rendered.update(result)
+
+    sections, keys = {}, {}
+    for name, items in plan["sections"].items():
+        sections[name] = []
+        for action, item in items:
+            if action == "keep":
+                sections[name].append(item)
+                keys[item["id"]] = plan["previous_keys"][item["id"]]
+            elif item not in rendered:
+                raise SitemapUpdateError(
+                    f"Page {item} of the sitemap version {version} was not rendered."
+                )
+            else:
+                pages, page_keys = rendered[item]
+                sections[name].extend(pages)
+                keys.update(page_keys)
+
+    writer = sitemap.page_writer(version)
+    keys[0] = _render_index(writer, sections)
+    state = {
+        "since": plan["since"],
+        "max_url_count": plan["max_url_count"],
+        "sections": sections,
+    }
+    sitemap.publish(version, keys, state)
@@ -7,49 +7,72 @@
 
 """ZenodoRDM Sitemap tasks."""
 
-import itertools
+from contextlib import contextmanager
 
-from celery import shared_task
-from flask import current_app, render_template, url_for
+from celery import chord, shared_task
+from flask import current_app
 
+from zenodo_rdm.sitemap.pages import plan_update, publish_update, render_shard
 
-@shared_task(ignore_results=True)
-def update_sitemap_cache(urls=None, max_url_count=None):
-    """Update the Sitemap cache."""
+
+@contextmanager
+def _site_request_context():
+    """Request context of the site, to generate the external links."""
     # We need request context to properly generate the external link
     # using url_for. We fix base_url as we want to simulate a
     # request as it looks from an external client, instead of a task.
     siteurl = current_app.config["SITE_UI_URL"]
     with current_app.test_request_context(base_url=siteurl):
-        max_url_count = max_url_count or current_app.config["SITEMAP_MAX_URL_COUNT"]
-        sitemap = current_app.extensions["zenodo-sitemap"]
-        urls = iter(urls or sitemap._generate_all_urls())
-
-        url_scheme = current_app.config["SITEMAP_URL_SCHEME"]
-
-        urls_slice = list(itertools.islice(urls, max_url_count))
-        page_n = 0
-        sitemap.clear_cache()
-        while urls_slice:
-            page_n += 1
-            sitemap.set_cache(
-                f"sitemap:{page_n}", urls_slice
-            )  # Cache only the URLs and render the page on request
-            urls_slice = list(itertools.islice(urls, max_url_count))
-
-        urlset = [
-            {
-                "loc": url_for(
-                    "zenodo_sitemap.sitemappage",
-                    page=pn,
-                    _external=True,
-                    _scheme=url_scheme,
-                )
-            }
-            for pn in range(1, page_n + 1)
-        ]
-
-        index_page = render_template(
-            "zenodo_sitemap/sitemapindex.xml", urlset=urlset, url_scheme=url_scheme
-        )
-        sitemap.set_cache("sitemap:0", index_page)
+        yield
+
+
+@shared_task(ignore_results=True)
+def update_sitemap_cache(full=False, max_url_count=None):
+    """Update the Sitemap cache.
+
+    Only the pages with records or communities changed since the last update are
+    regenerated, unless ``full`` is set. The pages are rendered in parallel shards,
+    and the new version of the sitemap is published once all of them are rendered.
+    """
+    sitemap = current_app.extensions["zenodo-sitemap"]
+    if not sitemap.acquire_lock():
+        current_app.logger.warning("Sitemap update already running, skipping.")
+        return
+    try:
+        with _site_request_context():
+            version, shards = plan_update(full=full, max_url_count=max_url_count)
+            if shards == 1:
+                render_shard(version, 0)
+                publish_update(version)
+                sitemap.release_lock()
+                return
+        # the lock is released by the publication, or if a shard fails
+        publish = publish_sitemap.si(version)
+        publish.link_error(release_sitemap_lock.si())
+        chord(update_sitemap_shard.si(version, n) for n in range(shards))(publish)
+    except Exception:
+        sitemap.release_lock()
+        raise
+
+
+@shared_task
+def update_sitemap_shard(version, shard):
+    """Render a shard of the sitemap pages."""
+    with _site_request_context():
+        render_shard(version, shard)
+
+
+@shared_task(ignore_results=True)
+def publish_sitemap(version):
+    """Publish a sitemap version, once all its shards are rendered."""
+    try:
+        with _site_request_context():
+            publish_update(version)
+    finally:
+        current_app.extensions["zenodo-sitemap"].release_lock()
+
+
+@shared_task(ignore_results=True)
+def release_sitemap_lock():
+    """Release the sitemap lock, after a failed update."""
+    current_app.extensions["zenodo-sitemap"].release_lock()
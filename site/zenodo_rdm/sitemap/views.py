@@ -5,10 +5,12 @@
 # ZenodoRDM is free software; you can redistribute it and/or modify
 # it under the terms of the MIT License; see LICENSE file for more details.
 
-"""Redirects for legacy URLs."""
+"""Sitemap views."""
 
-from flask import Blueprint, abort, current_app, render_template
-from invenio_cache import current_cache
+import gzip
+from datetime import datetime, timezone
+
+from flask import Blueprint, abort, current_app, request
 
 blueprint = Blueprint(
     "zenodo_sitemap",
@@ -20,14 +22,27 @@ blueprint = Blueprint(
 
 
 def _get_cached_or_404(page):
-    data = current_cache.get("sitemap:" + str(page))
-    if page != 0:
-        data = render_template("zenodo_sitemap/sitemap.xml", urlset=filter(None, data))
-    if data:
-        return current_app.response_class(data, mimetype="text/xml")
-    else:
+    cached = current_app.extensions["zenodo-sitemap"].get_page(page)
+    if not cached:
         abort(404)
 
+    # Pages are stored compressed, and only decompressed for clients without gzip
+    etag = cached["etag"]
+    if request.accept_encodings["gzip"]:
+        response = current_app.response_class(cached["data"], mimetype="text/xml")
+        response.content_encoding = "gzip"
+        etag += "-gzip"
+    else:
+        response = current_app.response_class(
+            gzip.decompress(cached["data"]), mimetype="text/xml"
+        )
+    response.vary.add("Accept-Encoding")
+    response.set_etag(etag)
+    response.last_modified = datetime.fromtimestamp(
+        cached["last_modified"], tz=timezone.utc
+    )
+    return response.make_conditional(request)
+
 
 @blueprint.route(
     "/sitemap.xml",
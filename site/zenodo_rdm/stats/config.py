@@ -12,6 +12,15 @@ STATS_PIWIK_EXPORTER = {
     "url": "https://analytics.openaire.eu/piwik.php",
     "token_auth": "api-token",
     "chunk_size": 50,  # [max piwik payload size = 64k] / [max querystring size = 750]
+    "concurrency": 4,  # chunks submitted concurrently
+    "max_retries": 3,  # retries of failed requests, with exponential backoff
+    "backoff_factor": 1,
+    "timeout": 60,
+    "readers": 4,  # time slices of events read in parallel
+    "slice_minutes": 15,
+    "page_size": 1000,
+    "read_ahead": 10,  # pages buffered per time slice
+    "records_cache_size": 10000,  # records kept between chunks
 }
 
 STATS_PIWIK_EXPORT_ENABLED = False
@@ -8,19 +8,130 @@
 """ZenodoRDM stats exporters."""
 
 import json
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from queue import Full, Queue
 from urllib.parse import urlencode, urlsplit, urlunsplit
 
 import requests
 from dateutil.parser import parse as dateutil_parse
 from flask import current_app, url_for
 from invenio_cache import current_cache
-from invenio_pidstore.errors import PIDDeletedError
 from invenio_search import current_search_client
 from invenio_search.utils import build_alias_name
 from opensearch_dsl import Search
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from zenodo_rdm.stats.errors import PiwikExportRequestError
-from zenodo_rdm.stats.utils import chunkify, fetch_record
+from zenodo_rdm.stats.utils import chunkify, fetch_records
+
+BOOKMARK_KEY = "piwik_export:bookmark"
+
+LOCK_KEY = "piwik_export:lock"
+
+LOCK_TIMEOUT = 60 * 60 * 12
+
+_DONE = object()
+"""End of the events of a time slice."""
+
+
+def _time_slices(start, end, duration):
+    """Split a time range into consecutive slices, as range filters."""
+    slices = []
+    while True:
+        slice_end = start + duration
+        if slice_end >= end:
+            slices.append({"gte": start.isoformat(), "lte": end.isoformat()})
+            return slices
+        slices.append({"gte": start.isoformat(), "lt": slice_end.isoformat()})
+        start = slice_end
+
+
+def _put(queue, item, stop):
+    """Put an item in a bounded queue, unless the reading is stopped."""
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=1)
+            return True
+        except Full:
+            pass
+    return False
+
+
+def _read_slice(search, page_size, queue, stop):
+    """Read the events of a time slice in pages, with ``search_after``."""
+    try:
+        after = None
+        while True:
+            page = search.extra(size=page_size)
+            if after:
+                page = page.extra(search_after=after)
+            hits = page.execute().hits
+            if hits and not _put(queue, list(hits), stop):
+                return
+            if len(hits) < page_size:
+                break
+            after = list(hits[-1].meta.sort)
+        _put(queue, _DONE, stop)
+    except Exception as exc:
+        _put(queue, exc, stop)
+
+
+def read_events(start_date, end_date):
+    """Read the stats events of a time range, in timestamp order.
+
+    The range is split into time slices, which are read in parallel, each sorted
+    with ``search_after`` instead of a sorted scroll. The slices are consecutive,
+    so their events are merged in timestamp order by reading them one after the
+    other, while the next slices are read ahead.
+    """
+    config = current_app.config["STATS_PIWIK_EXPORTER"]
+    page_size = config.get("page_size", 1000)
+    readers = config.get("readers", 4)
+    slices = _time_slices(
+        start_date.replace(microsecond=0),
+        end_date.replace(microsecond=0),
+        timedelta(minutes=config.get("slice_minutes", 15)),
+    )
+    search = (
+        Search(
+            using=current_search_client._get_current_object(),
+            index=build_alias_name("events-stats-*"),
+        )
+        # the unique ID breaks the ties of events with the same timestamp
+        .sort({"timestamp": {"order": "asc"}}, {"unique_id": {"order": "asc"}}).params(
+            request_timeout=120
+        )
+    )
+
+    stop = threading.Event()
+    # the slices are read by the pool in order, each buffering up to a few pages
+    queues = [Queue(maxsize=config.get("read_ahead", 10)) for _ in slices]
+    executor = ThreadPoolExecutor(max_workers=readers)
+    try:
+        for time_range, queue in zip(slices, queues):
+            executor.submit(
+                _read_slice,
+                search.filter("range", timestamp=time_range),
+                page_size,
+                queue,
+                stop,
+            )
+        for queue in queues:
+            while True:
+                item = queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield from item
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
 
 
 class PiwikExporter:
@@ -29,118 +140,201 @@ class PiwikExporter:
     def run(self, start_date=None, end_date=None, update_bookmark=True):
         """Run export job."""
         if start_date is None:
-            bookmark = current_cache.get("piwik_export:bookmark")
+            bookmark = current_cache.get(BOOKMARK_KEY)
             if bookmark is None:
                 msg = "Bookmark not found, and no start date specified."
                 current_app.logger.warning(msg)
                 return
-            start_date = dateutil_parse(bookmark) if bookmark else None
+            start_date = dateutil_parse(bookmark)
 
-        time_range = {}
-        if start_date is not None:
-            time_range["gte"] = start_date.replace(microsecond=0).isoformat()
-        if end_date is not None:
-            time_range["lte"] = end_date.replace(microsecond=0).isoformat()
+        if end_date is None:
+            end_date = datetime.now(timezone.utc)
+            if start_date.tzinfo is None:
+                end_date = end_date.replace(tzinfo=None)
 
-        events = (
-            Search(
-                using=current_search_client, index=build_alias_name("events-stats-*")
-            )
-            .filter("range", timestamp=time_range)
-            .sort({"timestamp": {"order": "asc"}})
-            .params(preserve_order=True)
-            .scan()
+        # URLs are built in a single request context, and the records of each
+        # chunk are fetched at once (and the most recently used ones are kept).
+        # The events are closed explicitly, to stop their readers when the export
+        # stops early, e.g. at the bookmark or on a failed chunk.
+        siteurl = current_app.config["SITE_UI_URL"]
+        with closing(read_events(start_date, end_date)) as events:
+            with current_app.test_request_context(base_url=siteurl):
+                if not update_bookmark:
+                    self._export(events, update_bookmark)
+                    return
+                # Bail if another exporter is updating the bookmark, e.g. a
+                # duplicate task or a manual run of the exporter.
+                if not current_cache.add(LOCK_KEY, True, timeout=LOCK_TIMEOUT):
+                    current_app.logger.warning("Piwik export already running.")
+                    return
+                try:
+                    self._export(events, update_bookmark)
+                finally:
+                    current_cache.delete(LOCK_KEY)
+
+    @staticmethod
+    def _session(config):
+        """HTTP session, with a pool of keep-alive connections and retries.
+
+        Only the connection errors and the statuses of requests that were not
+        processed (429 and 503) are retried, as the events of a request that timed
+        out, or failed with another error status (e.g. a 504 gateway timeout), may
+        have been tracked already.
+        """
+        max_retries = config.get("max_retries", 3)
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            other=0,
+            backoff_factor=config.get("backoff_factor", 1),
+            status_forcelist=(429, 503),
+            allowed_methods=None,  # retry the POST requests as well
+            raise_on_status=False,
         )
+        adapter = HTTPAdapter(
+            pool_maxsize=config.get("concurrency", 1), max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
 
-        url = current_app.config["STATS_PIWIK_EXPORTER"].get("url", None)
-        token_auth = current_app.config["STATS_PIWIK_EXPORTER"].get("token_auth", None)
-        chunk_size = current_app.config["STATS_PIWIK_EXPORTER"].get("chunk_size", 0)
+    @staticmethod
+    def _post(session, url, payload, timeout):
+        res = session.post(url, json=payload, timeout=timeout)
+        return res.status_code, res.json() if res.ok else None
 
-        for event_chunk in chunkify(events, chunk_size):
-            query_strings = []
-            for event in event_chunk:
-                if "recid" not in event:
-                    continue
-                try:
-                    query_string = self._build_query_string(event)
-                    query_strings.append(query_string)
-                except PIDDeletedError:
-                    pass
-
-            # Check and bail if the bookmark has progressed, e.g. from another
-            # duplicate task or manual run of the exporter.
-            bookmark = current_cache.get("piwik_export:bookmark")
-            if event_chunk[-1].timestamp < bookmark:
-                return
+    def _build_chunk(self, event_chunk, records, max_records):
+        """Build the query strings of a chunk of events.
+
+        The records of the chunk are fetched at once, unless already in
+        ``records``, which keeps the ``max_records`` most recently used ones.
+        """
+        recids = {event.recid for event in event_chunk if "recid" in event}
+        missing = recids - records.keys()
+        fetched = fetch_records(missing)
+        for recid in missing:
+            records[recid] = fetched.get(recid)
+        for recid in recids:
+            records.move_to_end(recid)
+
+        query_strings = []
+        for event in event_chunk:
+            if "recid" not in event:
+                continue
+            # records without a registered PID (e.g. deleted) are skipped
+            record = records[event.recid]
+            if record is not None:
+                query_strings.append(self._build_query_string(event, record))
+
+        while len(records) > max_records:
+            records.popitem(last=False)
+        return query_strings
+
+    def _export(self, events, update_bookmark):
+        """Export the events, submitting chunks concurrently.
 
-            payload = {"requests": query_strings, "token_auth": token_auth}
-            res = requests.post(url, json=payload, timeout=60)
-
-            # Failure: not 200 or not "success"
-            content = res.json() if res.ok else None
-            if res.status_code == 200 and content.get("status") == "success":
-                if content.get("invalid") != 0:
-                    msg = "Invalid events in Piwik export request."
-                    info = {
-                        "begin_event_timestamp": event_chunk[0].timestamp,
-                        "end_event_timestamp": event_chunk[-1].timestamp,
-                        "invalid_events": content.get("invalid"),
-                    }
-                    current_app.logger.warning(msg, extra=info)
-                elif update_bookmark is True:
-                    current_cache.set(
-                        "piwik_export:bookmark", event_chunk[-1].timestamp, timeout=-1
-                    )
-            else:
+        Chunks are built ahead and submitted by a pool of workers, while their
+        responses are handled in order, so that the bookmark only advances past
+        the acknowledged chunks, up to the first pending or failed one.
+        """
+        config = current_app.config["STATS_PIWIK_EXPORTER"]
+        url = config.get("url", None)
+        token_auth = config.get("token_auth", None)
+        chunk_size = config.get("chunk_size", 0)
+        timeout = config.get("timeout", 60)
+        concurrency = config.get("concurrency", 1)
+        max_pending = concurrency * 2
+        max_records = config.get("records_cache_size", 10000)
+
+        bookmark = current_cache.get(BOOKMARK_KEY)
+        records = OrderedDict()
+        pending = deque()
+        session = self._session(config)
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            for event_chunk in chunkify(events, chunk_size):
+                # Bail if the chunk is before the bookmark
+                if bookmark and event_chunk[-1].timestamp < bookmark:
+                    break
+                payload = {
+                    "requests": self._build_chunk(event_chunk, records, max_records),
+                    "token_auth": token_auth,
+                }
+                future = executor.submit(self._post, session, url, payload, timeout)
+                pending.append((event_chunk, future))
+                while pending and (len(pending) >= max_pending or pending[0][1].done()):
+                    self._acknowledge(*pending.popleft(), update_bookmark)
+            while pending:
+                self._acknowledge(*pending.popleft(), update_bookmark)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            session.close()
+
+    def _acknowledge(self, event_chunk, future, update_bookmark):
+        """Handle the response of a submitted chunk, in order."""
+        status_code, content = future.result()
+        # Failure: not 200 or not "success"
+        if status_code == 200 and content.get("status") == "success":
+            if content.get("invalid") != 0:
                 msg = "Invalid events in Piwik export request."
                 info = {
                     "begin_event_timestamp": event_chunk[0].timestamp,
                     "end_event_timestamp": event_chunk[-1].timestamp,
+                    "invalid_events": content.get("invalid"),
                 }
-                raise PiwikExportRequestError(msg, export_info=info)
+                current_app.logger.warning(msg, extra=info)
+            elif update_bookmark is True:
+                current_cache.set(BOOKMARK_KEY, event_chunk[-1].timestamp, timeout=-1)
+        else:
+            msg = "Invalid events in Piwik export request."
+            info = {
+                "begin_event_timestamp": event_chunk[0].timestamp,
+                "end_event_timestamp": event_chunk[-1].timestamp,
+            }
+            raise PiwikExportRequestError(msg, export_info=info)
 
-    def _build_query_string(self, event):
-        siteurl = current_app.config["SITE_UI_URL"]
-        with current_app.test_request_context(base_url=siteurl):
-            id_site = current_app.config["STATS_PIWIK_EXPORTER"].get("id_site", None)
-            url = url_for(
-                "invenio_app_rdm_records.record_detail",
+    def _build_query_string(self, event, record):
+        id_site = current_app.config["STATS_PIWIK_EXPORTER"].get("id_site", None)
+        url = url_for(
+            "invenio_app_rdm_records.record_detail",
+            pid_value=event.recid,
+            scheme="https",
+            _external=True,
+        )
+        visitor_id = event.visitor_id[0:16]
+        oai, action_name = record["oai_id"], record["title"]
+        cvar = json.dumps({"1": ["oaipmhID", oai]})
+        urlref = None
+        if event.referrer:
+            try:
+                scheme, netloc, path, _, _ = urlsplit(event.referrer)
+                urlref = urlunsplit((scheme, netloc, path, None, None))
+            except Exception:
+                pass
+
+        params = dict(
+            idsite=id_site,
+            rec=1,
+            url=url,
+            _id=visitor_id,
+            cid=visitor_id,
+            cvar=cvar,
+            cdt=event.timestamp,
+            urlref=urlref,
+            action_name=action_name,
+        )
+
+        if event.to_dict().get("country"):
+            params["country"] = event.country.lower()
+        if event.to_dict().get("file_key"):
+            params["url"] = url_for(
+                "invenio_app_rdm_records.record_file_download",
                 pid_value=event.recid,
-                scheme="https",
-                _external=True,
-            )
-            visitor_id = event.visitor_id[0:16]
-            record = fetch_record(event.recid)
-            oai, action_name = record["oai_id"], record["title"]
-            cvar = json.dumps({"1": ["oaipmhID", oai]})
-            urlref = None
-            if event.referrer:
-                try:
-                    scheme, netloc, path, _, _ = urlsplit(event.referrer)
-                    urlref = urlunsplit((scheme, netloc, path, None, None))
-                except Exception:
-                    pass
-
-            params = dict(
-                idsite=id_site,
-                rec=1,
-                url=url,
-                _id=visitor_id,
-                cid=visitor_id,
-                cvar=cvar,
-                cdt=event.timestamp,
-                urlref=urlref,
-                action_name=action_name,
+                filename=event.file_key,
             )
+            params["download"] = params["url"]
 
-            if event.to_dict().get("country"):
-                params["country"] = event.country.lower()
-            if event.to_dict().get("file_key"):
-                params["url"] = url_for(
-                    "invenio_app_rdm_records.record_file_download",
-                    pid_value=event.recid,
-                    filename=event.file_key,
-                )
-                params["download"] = params["url"]
-
-            return "?{}".format(urlencode(params, "utf-8"))
+        return "?{}".format(urlencode(params, "utf-8"))
@@ -8,9 +8,10 @@
 """Statistics utilities."""
 
 import itertools
-from functools import lru_cache
 
-from invenio_rdm_records.proxies import current_rdm_records_service
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_rdm_records.records.models import RDMRecordMetadata
 
 
 def chunkify(iterable, n):
@@ -23,11 +24,31 @@ def chunkify(iterable, n):
         yield chunk
 
 
-@lru_cache(maxsize=1024)
-def fetch_record(recid):
-    """Cached record fetch."""
-    record = current_rdm_records_service.record_cls.pid.resolve(recid)
+def _record_info(record):
+    """OAI ID and title of a record."""
     return {
         "oai_id": record.get("oai", {}).get("identifier"),
         "title": record.get("metadata", {}).get("title")[:150],  # max 150 characters
     }
+
+
+def fetch_records(recids):
+    """Bulk fetch of records, in a single query.
+
+    :returns: a dictionary of the recids with a registered PID, and the OAI ID and
+        title of their record.
+    """
+    if not recids:
+        return {}
+    rows = (
+        db.session.query(PersistentIdentifier.pid_value, RDMRecordMetadata.json)
+        .join(
+            RDMRecordMetadata, RDMRecordMetadata.id == PersistentIdentifier.object_uuid
+        )
+        .filter(
+            PersistentIdentifier.pid_type == "recid",
+            PersistentIdentifier.pid_value.in_(list(recids)),
+            PersistentIdentifier.status == PIDStatus.REGISTERED,
+        )
+    )
+    return {pid_value: _record_info(json or {}) for pid_value, json in rows}